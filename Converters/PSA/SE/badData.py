@@ -0,0 +1,377 @@
+import os
+import re
+import sys
+import json
+import argparse
+from statistics import NormalDist
+from types import SimpleNamespace
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from core import dmodl, SymbolIndex, open_model
+from measurementGenerator import MeasurementGenerator, spec_path
+
+# Bad data detection for WLS models converted by matp2modlSE.py.
+#
+# The measurements are read from the WLSEs of the model ([w=w_inj] h(x) = P5_meas): the
+# measurement parameter, its weight and, in the complex domain, whether it is complex
+# (S measurements also have a conj() equation). The estimate of a measurement is its PostProc
+# output (P5_est) or, for voltage magnitudes, the magnitude of the bus state variables.
+# Deviations sigma of the measurements, Y-bus and measured branches come from the measurement
+# specification <model>_meas.json written by the converter (see measurementGenerator.py).
+# All output symbols are fetched with one getOutputSymbolValues call and the residuals of all
+# measurements (and of all steps of a time series) are computed at once:
+#   r = z - h(x),  J = sum((r / sigma)^2), compared with the chi-square limit for dof = equations - states
+# The normalized residual r_N = r / sqrt(Omega_ii) uses the residual covariance at the estimate. With the
+# Jacobian H of all equations (bus voltage angles and magnitudes, MeasurementGenerator.jacobian), their
+# weights W and R = diag(sigma^2) of the measurements:
+#   K = H E H^T W,  Omega = (I - K) R (I - K)^T,  E = (H^T W H)^-1
+# (with the zero injection ECs, E is the state block of the inverse of the constrained gain matrix).
+# The weights of the model need not be 1/sigma^2; with W = R^-1 this is Omega = R - H E H^T.
+# H E H^T comes from one factorization of the gain matrix G = H^T W H (+ slack and ZI rows), without its
+# inverse: the Cholesky factor G = L L^T gives H E H^T = F^T F with L F = H^T; the KKT system of the ZI
+# constraints is solved for the right-hand sides H^T.
+# Slack and weighted zero injection equations are rows of H without noise. The weight of an equation
+# in the measured quantity z is w (d equation / dz)^2: 4 |V|^2 w for |V|^2 = V_meas^2, and 2w per part
+# of a complex equation pair. Current variables (useCurrentVars) are taken as the sums they are defined by.
+# The measurement with the largest |r_N| is flagged as bad data if it exceeds the threshold; critical
+# measurements (Omega_ii below CRITICAL sigma^2, the residual is of the order of the solver tolerance)
+# have r_N = 0.
+# Omega depends on the state through H. By default it is computed for every snapshot; with fixed_gain it is
+# computed once at a reference state (the first evaluated snapshot, or set_reference) and reused for all
+# snapshots, which is exact as long as the operating point (and so the Jacobian) changes little.
+
+MEAS_SYMBOL = re.compile(r"\b(\w+_meas)\b")
+CRITICAL = 1e-6
+
+
+def chi2_limit(dof, alpha):
+    """Chi-square value exceeded with probability alpha (Wilson-Hilferty approximation)."""
+    if dof <= 0:
+        return 0.0
+    z = NormalDist().inv_cdf(1.0 - alpha)
+    c = 2.0 / (9.0 * dof)
+    return dof * (1.0 - c + z * np.sqrt(c)) ** 3
+
+
+def read_spec(model_file):
+    """Measurement specification of a model (<model>_meas.json written by matp2modlSE.py)."""
+    path = spec_path(model_file)
+    if not os.path.exists(path):
+        raise ValueError(f"Measurement specification {path} not found (convert the case again with matp2modlSE.py)")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class BadDataDetector:
+    """
+    Residual analysis of one SE model (see module comment).
+
+    text : model text (.dmodl written by matp2modlSE.py)
+    spec : measurement specification of the model (read_spec)
+    alpha : significance level of the chi-square test
+    threshold : limit of the largest normalized residual
+    fixed_gain : Omega of a reference state for all snapshots (see set_reference) instead of one per snapshot
+    After bind() (or bind_names()), evaluate() tests the output values of one snapshot (1D) or
+    of many snapshots (2D, one per row); check() tests the last solution of the bound model.
+    """
+
+    def __init__(self, text, spec, alpha=0.01, threshold=3.0, fixed_gain=False):
+        model = dmodl.parse(text).model
+        if model is None:
+            raise ValueError("The text has no Model")
+        self.complex_domain = model.domain == "cmplx"
+        self.alpha = alpha
+        self.threshold = threshold
+        self.fixed_gain = fixed_gain
+        self.reference_omega = None
+        self.generator = MeasurementGenerator(spec)
+        self.polar = spec["converter_type"] == "polar"
+
+        # Bus state variables (one line per bus, before the current variables of useCurrentVars)
+        self.bus_vars = {}
+        lines = {}
+        for decl in model.vars.values():
+            lines.setdefault(decl.line, []).append(decl.name)
+        for names in lines.values():
+            self.bus_vars.setdefault(names[0].rsplit("_", 1)[-1], names)
+        self.var_names = set(model.vars)
+        self.n_states = 2 * len(model.vars) if self.complex_domain else len(model.vars)
+
+        # Measurements in the order of the WLSEs; slack and zero injection equations have no *_meas symbol
+        wlses = list(model.statements("WLSEs"))
+        self.names, self.weight_symbols, complex_meas = [], [], set()
+        self.pseudo_symbols = {}
+        scale = {}
+        for wlse in wlses:
+            weight = wlse.attrs.get("w")
+            if weight is None:
+                continue
+            equation = f"{wlse.lhs} = {wlse.rhs}"
+            names = MEAS_SYMBOL.findall(equation)
+            if not names:
+                self.pseudo_symbols.setdefault("slack" if "_sl" in equation else "zi", weight)
+            for name in names:
+                if name not in self.names:
+                    self.names.append(name)
+                    self.weight_symbols.append(weight)
+                    scale[name] = 0.0 if f"{name}^2" in equation else (2.0 if re.search(rf"\b2\s*\*\s*{name}\b", equation) else 1.0)
+                if f"conj({name})" in equation:
+                    complex_meas.add(name)
+        if not self.names:
+            raise ValueError("The model has no measurements (no *_meas symbols in WLSEs)")
+        self.is_complex = np.array([self.complex_domain and name in complex_meas for name in self.names], dtype=bool)
+        # d equation / dz: constant, or 0 for squared measurements (2 |V| at the estimate)
+        self.scale = np.array([scale[name] for name in self.names])
+
+        # Every equation is one real scalar equation (complex ones come with their conj() equation)
+        n_ecs = sum(1 for _ in model.statements("ECs"))
+        self.zi_constraints = n_ecs > 0
+        self.n_equations = len(wlses) + n_ecs
+        self.dof = self.n_equations - self.n_states
+        self.chi2_limit = chi2_limit(self.dof, alpha)
+
+        # Scalar residuals: all measurements, then imaginary parts of the complex ones
+        self.scalar_names = ([f"{name}.re" if c else name for name, c in zip(self.names, self.is_complex)] +
+                             [f"{name}.im" for name, c in zip(self.names, self.is_complex) if c])
+
+        # Rows of the measurements in the specification and their deviations (both parts of S)
+        position = {name: k for k, name in enumerate(self.generator.names)}
+        missing = [name for name in self.names if name not in position]
+        if missing:
+            raise ValueError(f"Measurement '{missing[0]}' is not in the measurement specification of the model")
+        self.spec_rows = np.array([position[name] for name in self.names], dtype=int)
+        sigma = self.generator.sigma[self.spec_rows]
+        self.sigma = np.concatenate([sigma, sigma[self.is_complex]])
+
+    def estimate_symbols(self, name, out_names):
+        """Output symbols of the estimate of measurement name: [X_est] or the bus variables of a voltage."""
+        base = name[:-len("_meas")]
+        if f"{base}_est" in out_names:
+            return [f"{base}_est"]
+        if base in self.var_names:
+            return [base]
+        names = self.bus_vars.get(base.rsplit("_", 1)[-1])
+        if names is None:
+            raise ValueError(f"No estimate of measurement '{name}' among the output symbols")
+        return names
+
+    def bind_names(self, out_names, weights=None):
+        """
+        Positions of measurements and estimates in the output symbols out_names.
+        weights : dict weight symbol -> value (default: numeric weights only)
+        """
+        position = {name: k for k, name in enumerate(out_names)}
+        dummy = len(out_names)     # zero column appended to the values
+        self.meas_pos = np.empty(len(self.names), dtype=int)
+        self.est_pos = np.full((len(self.names), 2), dummy, dtype=int)
+        self.magnitude = np.zeros(len(self.names), dtype=bool)
+        for k, name in enumerate(self.names):
+            if name not in position:
+                raise ValueError(f"Measurement '{name}' is not an output symbol of the model")
+            self.meas_pos[k] = position[name]
+            symbols = self.estimate_symbols(name, position)
+            if len(symbols) > 2 or any(s not in position for s in symbols):
+                raise ValueError(f"No estimate of measurement '{name}' among the output symbols")
+            self.est_pos[k, :len(symbols)] = [position[s] for s in symbols]
+            self.magnitude[k] = not symbols[0].endswith("_est")
+        self.state_pos = np.full((self.generator.n, 2), dummy, dtype=int)
+        for k, bus in enumerate(self.generator.spec["buses"]):
+            names = self.bus_vars.get(str(bus), ())
+            if not names or any(s not in position for s in names):
+                raise ValueError(f"State variables of bus {bus} are not output symbols of the model")
+            self.state_pos[k, :len(names)] = [position[s] for s in names]
+
+        def value(symbol):
+            try:
+                return float(symbol)
+            except ValueError:
+                if weights is None or symbol not in weights:
+                    raise ValueError(f"Value of weight '{symbol}' is not known")
+                return weights[symbol]
+        w = np.array([value(symbol) for symbol in self.weight_symbols])
+        self.weights = np.concatenate([w, w[self.is_complex]])
+        self.pseudo_weights = {kind: value(symbol) for kind, symbol in self.pseudo_symbols.items()}
+
+    def bind(self, p_model, symbols=None):
+        """
+        Resolve output symbols and read the weights of an initialized model (once, before check).
+        symbols : SymbolIndex of the model (created if not given)
+        """
+        if symbols is None:
+            symbols = SymbolIndex.from_model(p_model)
+        self._out_indices = symbols.out_indices
+        weights = sorted({s for s in self.weight_symbols + list(self.pseudo_symbols.values()) if not re.match(r"^[-+.\d]", s)})
+        missing = symbols.missing(weights)
+        if missing:
+            raise ValueError(f"Weight '{missing[0]}' is not a parameter of the model")
+        values = p_model.getParameterValues(symbols.indices(weights)) if weights else []
+        self.bind_names(symbols.out_names, {s: float(np.real(v)) for s, v in zip(weights, values)})
+
+    def voltages(self, padded):
+        """Complex bus voltages (in the order of the specification) of padded output values."""
+        state = padded[..., self.state_pos]
+        if self.complex_domain:
+            return state[..., 0]
+        state = state.real
+        if self.polar:
+            return state[..., 1] * np.exp(1j * state[..., 0])
+        return state[..., 0] + 1j * state[..., 1]
+
+    def residual_variance(self, V):
+        """Diagonal of the residual covariance Omega at bus voltages V (scalar residuals, see module comment)."""
+        gen, n = self.generator, self.generator.n
+        c = self.is_complex
+        d_va, d_vm = (d[self.spec_rows] for d in gen.jacobian(V))
+        H = np.block([[d_va.real, d_vm.real], [d_va[c].imag, d_vm[c].imag]])
+        pair = 2.0 if self.complex_domain else 1.0
+        scale = np.where(self.scale == 0, 2 * np.abs(gen.quantities(V)[gen.source[self.spec_rows]]), self.scale)
+        w = np.concatenate([self.weights[:len(self.names)] * scale ** 2 * np.where(c, pair, 1.0), self.weights[len(self.names):] * pair])
+
+        # Slack equations: angle and magnitude (polar) or both parts of the voltage
+        slack = np.asarray(gen.spec["slack"], dtype=int)
+        k = np.arange(len(slack))
+        if self.polar:
+            d_va, d_vm = np.zeros((len(slack), n)), np.zeros((len(slack), n))
+            d_va[k, slack], d_vm[k, slack] = 1.0, 1.0
+            S = np.block([[d_va, np.zeros_like(d_va)], [np.zeros_like(d_vm), d_vm]])
+        else:
+            d_va, d_vm = np.zeros((len(slack), n), dtype=complex), np.zeros((len(slack), n), dtype=complex)
+            d_va[k, slack], d_vm[k, slack] = 1j * V[slack], V[slack] / np.abs(V[slack])
+            S = np.block([[d_va.real, d_vm.real], [d_va.imag, d_vm.imag]])
+        rows, row_weights = [S], [np.full(len(S), self.pseudo_weights.get("slack", 0.0) * pair)]
+
+        # Zero injections: both parts of the bus current
+        zi = np.asarray(gen.spec["zero_injection"], dtype=int)
+        C = None
+        if len(zi):
+            lookup = np.full(n, -1)
+            lookup[zi] = np.arange(len(zi))
+            k = lookup[gen.Y_row]
+            sel = k >= 0
+            d_va, d_vm = np.zeros((len(zi), n), dtype=complex), np.zeros((len(zi), n), dtype=complex)
+            cols = gen.Y_col[sel]
+            np.add.at(d_va, (k[sel], cols), gen.Y_val[sel] * 1j * V[cols])
+            np.add.at(d_vm, (k[sel], cols), gen.Y_val[sel] * V[cols] / np.abs(V[cols]))
+            Z = np.block([[d_va.real, d_vm.real], [d_va.imag, d_vm.imag]])
+            if self.zi_constraints:
+                C = Z
+            else:
+                rows.append(Z)
+                row_weights.append(np.full(len(Z), self.pseudo_weights.get("zi", 0.0) * pair))
+
+        A = np.vstack([H] + rows)
+        W = np.concatenate([w] + row_weights)
+        G = A.T @ (W[:, None] * A)
+        # H E H^T from one factorization of G (Cholesky) or of the KKT matrix of the ZI constraints
+        if C is None:
+            F = np.linalg.solve(np.linalg.cholesky(G), H.T)
+            HEH = F.T @ F
+        else:
+            KKT = np.block([[G, C.T], [C, np.zeros((len(C), len(C)))]])
+            HEH = H @ np.linalg.solve(KKT, np.vstack([H.T, np.zeros((len(C), len(H)))]))[:2 * n]
+        # diag((I - K) R (I - K)^T) as a sum of squares (never negative)
+        I_K = np.eye(len(H)) - HEH * w
+        return (I_K ** 2) @ self.sigma ** 2
+
+    def set_reference(self, V):
+        """Residual variances of fixed_gain mode at the bus voltages V of a reference state."""
+        self.reference_omega = self.residual_variance(V)
+
+    def evaluate(self, values, valid=None):
+        """
+        Residual tests for output values of one (1D) or many (2D) snapshots. Returns a namespace with
+        r, r_w (r / sigma), r_n (normalized residuals; all scalar, see scalar_names), J, chi2_ok,
+        largest (index of max |r_n|), largest_r_n and bad (largest |r_n| above the threshold).
+        valid : mask of the snapshots with a solution (default: all); the others get r_n = r / sigma
+        With fixed_gain the residual variances of the reference state are used for all snapshots (the first
+        valid snapshot is the reference if set_reference was not called).
+        """
+        values = np.asarray(values)
+        padded = np.concatenate([values, np.zeros(values.shape[:-1] + (1,), dtype=values.dtype)], axis=-1)
+        z = padded[..., self.meas_pos]
+        est = padded[..., self.est_pos]
+        h = np.where(self.magnitude, np.sqrt(np.sum(np.abs(est) ** 2, axis=-1)), est[..., 0])
+        r = z - h
+        r = np.concatenate([r.real, r.imag[..., self.is_complex]], axis=-1)
+        r_w = r / self.sigma
+        J = np.sum(r_w ** 2, axis=-1)
+        V = self.voltages(padded).reshape(-1, self.generator.n)
+        omega = np.tile(self.sigma ** 2, (len(V), 1))
+        steps = np.arange(len(V)) if valid is None else np.nonzero(np.reshape(valid, -1))[0]
+        if self.fixed_gain and len(steps):
+            if self.reference_omega is None:
+                self.set_reference(V[steps[0]])
+            omega[steps] = self.reference_omega
+        else:
+            for k in steps:
+                omega[k] = self.residual_variance(V[k])
+        omega = omega.reshape(r.shape)
+        r_n = np.divide(r, np.sqrt(np.maximum(omega, 0.0)), out=np.zeros_like(r), where=omega > CRITICAL * self.sigma ** 2)
+        largest = np.argmax(np.abs(r_n), axis=-1)
+        largest_r_n = np.take_along_axis(r_n, np.expand_dims(largest, -1), axis=-1)[..., 0]
+        return SimpleNamespace(r=r, r_w=r_w, r_n=r_n, J=J, chi2_ok=J <= self.chi2_limit, largest=largest,
+                               largest_r_n=largest_r_n, bad=np.abs(largest_r_n) > self.threshold)
+
+    def check(self, p_model):
+        """Residual tests of the last solution of the bound model (one bulk read of the outputs)."""
+        return self.evaluate(np.asarray(p_model.getOutputSymbolValues(self._out_indices)))
+
+
+def save_steps(file, t, converged, detector, res):
+    """Test results of converged steps as CSV: t, J, chi-square limit, largest normalized residual and its measurement."""
+    with open(file, "w", encoding="utf-8") as f_out:
+        f_out.write("t,J,chi2_limit,largest_r_N,measurement\n")
+        for k in np.nonzero(converged)[0]:
+            f_out.write(f"{t[k]},{res.J[k]},{detector.chi2_limit},{res.largest_r_n[k]},{detector.scalar_names[res.largest[k]]}\n")
+
+
+def run(model_file, alpha=0.01, threshold=3.0):
+    """Solve the SE model once and test its residuals. Returns (detector, residuals)."""
+    import dTwin
+    from timeSeries import read_model
+
+    text, domain = read_model(model_file, warm_start=False)
+    detector = BadDataDetector(text, read_spec(model_file), alpha, threshold)
+    p_model, startup = open_model(text, domain, dTwin.StaticProblem.WLS, source=model_file)
+    try:
+        detector.bind(p_model, startup.symbols)
+        solver = p_model.getSolverInterface()
+        if not solver:
+            raise RuntimeError("Cannot obtain solver interface")
+        if solver.solve() != dTwin.Solution.OK:
+            raise RuntimeError("State estimation did not converge")
+        return detector, detector.check(p_model)
+    finally:
+        p_model.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bad data detection (chi-square and largest normalized residual tests) for matp2modlSE.py models.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("model", help="SE model (.dmodl) converted by matp2modlSE.py.")
+    parser.add_argument("--alpha", type=float, default=0.01, help="Significance level of the chi-square test (default: 0.01).")
+    parser.add_argument("--threshold", type=float, default=3.0, help="Limit of the largest normalized residual (default: 3).")
+    parser.add_argument("-k", "--top", type=int, default=5, help="Number of largest normalized residuals to list (default: 5).")
+    args = parser.parse_args()
+
+    try:
+        detector, res = run(args.model, args.alpha, args.threshold)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"\nError: {e}")
+        sys.exit(1)
+
+    print(f"  > Measurements: {len(detector.scalar_names)}, degrees of freedom: {detector.dof}")
+    print(f"  > J = {res.J:.4f}, chi-square limit ({1 - args.alpha:g}): {detector.chi2_limit:.4f} -> "
+          f"{'passed' if res.chi2_ok else 'bad data suspected'}")
+    for k in np.argsort(-np.abs(res.r_n))[:args.top]:
+        print(f"    {detector.scalar_names[k]:<20} r = {res.r[k]: .6f}  r/sigma = {res.r_w[k]: .3f}  r_N = {res.r_n[k]: .3f}")
+    if res.bad:
+        print(f"Bad data: {detector.scalar_names[res.largest]} (r_N = {res.largest_r_n:.3f})")
+    else:
+        print("No bad data detected.")
+
+
+if __name__ == "__main__":
+    main()
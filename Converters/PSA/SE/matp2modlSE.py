@@ -1,11 +1,537 @@
-import re
 import numpy as np
-import xml.etree.ElementTree as ET
 import json
 import argparse 
 import os      
 import sys  
-import random     
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from observability import MeasurementDesign, ensure_observability
+from measurementGenerator import MeasurementGenerator, complex_dict, solve_power_flow, spec_path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from core import (load_config, read_variable_names, read_options, read_power_limits, read_zip_limits, read_budgets,
+                  compact_variable_names, resolve_case_path, load_case, save_name_map, build_ybus, resolve_seed,
+                  sample_sorted, place_consumption_curves, InjectionExpressions, BranchFlows, format_complex,
+                  format_values, write_admittances, write_node_equations, group_pv_buses, write_q_limits, write_q_postproc, update_path, finish_update, EmissionStats, report_emission,
+                  COMPRESSIONS, check_compression, model_file, open_output, describe_compression)
+
+class MeasurementSet:
+    """Measurement set of one generated model (one placement seed)."""
+
+    def __init__(self, seed, branches, voltage, pv_nodes, pq_nodes):
+        self.seed = seed
+        self.branches = branches            # measured branches as (measured end, other end, branch index)
+        self.branch_idx = {k for _, _, k in branches}   # indices of the randomly placed measured branches
+        self.voltage = set(voltage)         # bus ids with voltage magnitude measurement
+        self.pv_nodes = sorted(pv_nodes)    # PV bus ids with injection measurement
+        self.pq_nodes = sorted(pq_nodes)    # PQ bus ids with injection measurement
+        self.added = 0                      # measurements added by the observability check
+        self.observable = None
+        self.redundancy = None
+        self.ranks = None
+
+    @property
+    def injection(self):
+        return set(self.pv_nodes) | set(self.pq_nodes)
+
+    def summary(self):
+        return {"seed": self.seed, "voltage": len(self.voltage), "injection": len(self.pv_nodes) + len(self.pq_nodes),
+                "branch": len(self.branches), "added": self.added, "observable": self.observable,
+                "redundancy": round(self.redundancy, 4)}
+
+def place_measurements(rng, ctx, branch_meas, voltage_meas, inj_meas, seed=None):
+    """
+    Random measurement placement. The choices are drawn in fixed order from numpy Generator rng,
+    so the same seed gives the same measurement set. Case data are not modified.
+    """
+    # Measured branches and the end at which each one is measured
+    branch_idx = np.sort(rng.choice(len(ctx.branch_ends), size=int(len(ctx.branch_ends) * branch_meas), replace=False))
+    swap = rng.random(len(branch_idx)) < 0.5
+    branches = []
+    for k, do_swap in zip(branch_idx, swap):
+        from_bus, to_bus = ctx.branch_ends[k]
+        branches.append((to_bus, from_bus, int(k)) if do_swap else (from_bus, to_bus, int(k)))
+
+    # Voltage measurements
+    random_voltage = sample_sorted(rng, list(range(1, ctx.n + 1)), int(ctx.n * voltage_meas))
+    voltage = [ctx.index_to_bus_id[k - 1] for k in random_voltage]
+
+    # Injection measurements (non-zero injection nodes only)
+    eligible = ctx.eligible_injection_nodes
+    selected_nodes = sample_sorted(rng, eligible, int(len(eligible) * inj_meas))
+    pv_nodes_set = set(ctx.pv_nodes)
+    return MeasurementSet(seed, branches, voltage,
+                          [bus_id for bus_id in selected_nodes if bus_id in pv_nodes_set],
+                          [bus_id for bus_id in selected_nodes if bus_id not in pv_nodes_set])
+
+def check_observability(rng, ctx, meas, ensure_observable):
+    """
+    Observability check of meas (decoupled model on Y-bus structure, see observability.py).
+    If ensure_observable, random candidate measurements are added until observable.
+    """
+    design = MeasurementDesign(ctx.Y, ctx.index_to_bus_id, ctx.bus_id_map, ctx.slack, ctx.zi_nodes)
+    for bus_id in meas.voltage:
+        design.add("v", bus_id)
+    for bus_id in meas.pv_nodes:
+        design.add("pv", bus_id)
+    for bus_id in meas.pq_nodes:
+        design.add("pq", bus_id)
+    for ends in meas.branches:
+        design.add("branch", ends)
+    if ensure_observable and not design.observable:
+        free_branches = [k for k in range(len(ctx.branch_ends)) if k not in meas.branch_idx]
+        injection = meas.injection
+        candidates = [("v", ctx.index_to_bus_id[i_idx]) for i_idx in range(ctx.n) if ctx.index_to_bus_id[i_idx] not in meas.voltage]
+        candidates += [("pv" if bus_id in ctx.pv_nodes else "pq", bus_id) for bus_id in ctx.eligible_injection_nodes
+                       if bus_id not in injection]
+        candidates += [("branch", ctx.branch_ends[k] + (k,)) for k in free_branches]
+        added = ensure_observability(design, candidates, rng)
+        for kind, item in added:
+            if kind == "v":
+                meas.voltage.add(item)
+            elif kind == "pv":
+                meas.pv_nodes.append(item)
+            elif kind == "pq":
+                meas.pq_nodes.append(item)
+            else:
+                # Same random choice of the measured end as in place_measurements
+                meas.branches.append((item[1], item[0], item[2]) if rng.random() < 0.5 else item)
+        meas.pv_nodes.sort()
+        meas.pq_nodes.sort()
+        meas.added = len(added)
+    meas.observable = design.observable
+    meas.redundancy = design.redundancy
+    meas.ranks = (design.pt.rank, design.qv.rank)
+    return meas
+
+def design_measurement_set(ctx, seed, ensure_observable):
+    """Placement and observability check of the measurement set for one seed."""
+    rng = np.random.default_rng(seed)
+    meas = place_measurements(rng, ctx, ctx.branch_meas, ctx.voltage_meas, ctx.inj_meas, seed)
+    return check_observability(rng, ctx, meas, ensure_observable)
+
+def write_seed_header(file, meas):
+    """Comment header with the seed of the measurement placement."""
+    file.write(f"//Measurement placement seed: {meas.seed}\n")
+
+def measurement_list(ctx, meas):
+    """
+    Measurements of the set as (parameter name, kind, index, part, deviation) in model order.
+    kind: 'v' or 'inj' (index of the bus in Y-bus), 'br' (index in meas.branches);
+    part: measured part of the complex quantity ('abs', 're', 'im' or 'cplx').
+    """
+    converter_type, bus_id_map, flows = ctx.converter_type, ctx.bus_id_map, ctx.flows
+    dev_v, dev_inj, dev_br = ctx.deviations
+    items = []
+    for i_idx in range(ctx.n):
+        bus_id = ctx.index_to_bus_id[i_idx]
+        if bus_id in meas.voltage:
+            items.append((f"{ctx.v_cplx if converter_type == 'complex' else ctx.V_mag}_{bus_id}_meas", "v", i_idx, "abs", dev_v))
+    for bus_id in ctx.pq_nodes:
+        if bus_id in meas.injection:
+            i_idx = bus_id_map[bus_id]
+            if converter_type == "complex":
+                items.append((f"S{bus_id}_meas", "inj", i_idx, "cplx", dev_inj))
+            else:
+                items += [(f"P{bus_id}_meas", "inj", i_idx, "re", dev_inj), (f"Q{bus_id}_meas", "inj", i_idx, "im", dev_inj)]
+    for bus_id in ctx.pv_nodes:
+        if bus_id in meas.injection:
+            items.append((f"P{bus_id}_meas", "inj", bus_id_map[bus_id], "re", dev_inj))
+    for k, (m, o, b) in enumerate(meas.branches):
+        lbl = flows.label(m, o, b)
+        if converter_type == "complex":
+            items.append((f"S_{lbl}_meas", "br", k, "cplx", dev_br))
+        else:
+            items += [(f"P_{lbl}_meas", "br", k, "re", dev_br), (f"Q_{lbl}_meas", "br", k, "im", dev_br)]
+    return items
+
+def measurement_spec(ctx, meas, model_name=None):
+    """
+    Specification of the measurements for measurementGenerator.py and badData.py.
+    V (power flow solution) is only solved with <measurementNoise>python.
+    """
+    items = measurement_list(ctx, meas)
+    rows, cols = np.nonzero(ctx.Y)
+    y_mm, y_mo = ctx.flows.admittances(meas.branches) if meas.branches else ([], [])
+    return {
+        "model": model_name, "domain": "cmplx" if ctx.converter_type == "complex" else "real",
+        "converter_type": ctx.converter_type, "seed": meas.seed, "noise": ctx.noise_mode, "method": ctx.estimation_method,
+        "buses": [int(ctx.index_to_bus_id[i_idx]) for i_idx in range(ctx.n)],
+        "slack": [ctx.bus_id_map[b] for b in ctx.slack], "zero_injection": [ctx.bus_id_map[b] for b in ctx.zi_nodes],
+        **({"V": complex_dict(ctx.V_case)} if ctx.V_case is not None else {}),
+        "pf": {"S": complex_dict(ctx.P_inj + 1j * ctx.Q_inj), "V0": complex_dict(ctx.V_pf_init),
+               "pv": [ctx.bus_id_map[b] for b in ctx.pv_nodes], "pq": [ctx.bus_id_map[b] for b in ctx.pq_nodes]},
+        "Y": {"row": rows.tolist(), "col": cols.tolist(), **complex_dict(ctx.Y[rows, cols])},
+        "branches": {"m": [ctx.bus_id_map[m] for m, o, k in meas.branches], "o": [ctx.bus_id_map[o] for m, o, k in meas.branches],
+                     "y_mm": complex_dict(y_mm), "y_mo": complex_dict(y_mo)},
+        "measurements": {key: [item[k] for item in items] for k, key in enumerate(("name", "kind", "index", "part", "sigma"))},
+    }
+
+def measurement_defaults(ctx, meas):
+    """Noiseless values of the measurement parameters with <measurementNoise>python (empty otherwise)."""
+    if ctx.noise_mode != "python":
+        return {}
+    items = measurement_list(ctx, meas)
+    values = MeasurementGenerator(measurement_spec(ctx, meas)).true_values()
+    return {name: " = " + (format_complex(value) if part == "cplx" else str(float(np.real(value))))
+            for (name, _, _, part, _), value in zip(items, values)}
+
+def write_measurement_spec(model_path, ctx, meas):
+    """Sidecar <model>_meas.json of a model (measurement specification)."""
+    with open(spec_path(model_path), "w", encoding='utf-8') as f:
+        json.dump(measurement_spec(ctx, meas, os.path.basename(model_path)), f)
+
+class SegmentedOutput:
+    """
+    Model text split into invariant segments and measurement dependent parts.
+
+    Invariant text is written once; variant(writer) marks the place of a part generated by
+    writer(file, ctx, meas) (writer(file, meas) with uses_ctx=False) for each measurement set, so many
+    scenario models can be rendered without regenerating Y-bus parameters, the power flow SubModel and
+    the equations.
+    """
+
+    def __init__(self):
+        self.parts = [[]]
+        self.skipping = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write(self, text):
+        if not self.skipping:
+            self.parts[-1].append(text)
+
+    def variant(self, writer, uses_ctx=True):
+        if self.skipping:
+            return
+        self.parts.append((writer, uses_ctx))
+        self.parts.append([])
+
+    def skip(self, skipping=True):
+        """Drop text and variant parts written until skip(False) (sections left out of the model)."""
+        self.skipping = skipping
+
+    def freeze(self):
+        """Join invariant text (call once after writing)."""
+        self.parts = ["".join(part) if isinstance(part, list) else part for part in self.parts]
+
+    def render(self, file, ctx, meas):
+        for part in self.parts:
+            if isinstance(part, str):
+                file.write(part)
+            else:
+                writer, uses_ctx = part
+                if uses_ctx:
+                    writer(file, ctx, meas)
+                else:
+                    writer(file, meas)
+
+
+def write_current_vars(file, ctx, meas):
+    """
+    Vars: current variables of the main model (useCurrentVars); written at render time.
+    The PF SubModel, solved once to synthesize the measurements, keeps the inlined sums.
+    """
+    inj = ctx.injections
+    for bus_id in inj.current_buses:
+        file.write("\t" + "; ".join(f"{name} = 0" for name in inj.current_vars(bus_id)) + "\n")
+
+def write_measurement_params(file, ctx, meas):
+    """Params: measured branch flows, voltage and injection measurements (and their weights)."""
+    converter_type, n, index_to_bus_id, pq_nodes, pv_nodes = ctx.converter_type, ctx.n, ctx.index_to_bus_id, ctx.pq_nodes, ctx.pv_nodes
+    P_inj, Q_inj, V_mag, v_cplx, inj_weight = ctx.P_inj, ctx.Q_inj, ctx.V_mag, ctx.v_cplx, ctx.inj_weight
+    branch_weight, voltage_weight, zero_inj_weight = ctx.branch_weight, ctx.voltage_weight, ctx.zero_inj_weight
+    random_branches, measured_voltage, measured_injection = meas.branches, meas.voltage, meas.injection
+    flows = ctx.flows
+    value = measurement_defaults(ctx, meas)
+    # Adding random branches
+    for m, o, k in random_branches:
+        lbl = flows.label(m, o, k)
+        if converter_type == "complex":
+            file.write(f"\tS_{lbl}_meas{value.get(f'S_{lbl}_meas', '')} [out = true]\n")
+            file.write(f"\tS_{lbl}_est [out = true]\n")
+        else:
+            file.write(f"\tP_{lbl}_meas{value.get(f'P_{lbl}_meas', '')} [out = true]; ")
+            file.write(f"P_{lbl}_est [out = true]\n")
+            file.write(f"\tQ_{lbl}_meas{value.get(f'Q_{lbl}_meas', '')} [out = true]; ")
+            file.write(f"Q_{lbl}_est [out = true]\n")
+    flows.write_params(file, ctx, random_branches)
+
+    # Adding measuring params
+    for bus_id in range(1, n + 1):
+        real_bus_id = index_to_bus_id[bus_id - 1]
+        #if real_bus_id not in slack:
+        if real_bus_id not in measured_voltage:
+            continue
+        if converter_type == "complex":
+            file.write(f"\t{v_cplx}_{real_bus_id}_meas{value.get(f'{v_cplx}_{real_bus_id}_meas', '')} [type=real out=true]\n")
+        else:
+            file.write(f"\t{V_mag}_{real_bus_id}_meas{value.get(f'{V_mag}_{real_bus_id}_meas', '')} [out=true]\n")
+    if converter_type == "complex":
+        file.write(f"\tw_inj = {inj_weight} [type=real]\n")
+        file.write(f"\tw_br = {branch_weight} [type=real]\n")
+        file.write(f"\tw_v = {voltage_weight} [type=real]\n")
+        file.write(f"\tw_zi = {zero_inj_weight} [type=real]\n")
+    else:
+        file.write(f"\tw_inj = {inj_weight}\n")
+        file.write(f"\tw_br = {branch_weight}\n")
+        file.write(f"\tw_v = {voltage_weight}\n")
+        file.write(f"\tw_zi = {zero_inj_weight}\n")
+    for i_idx in range(n):
+        bus_id = index_to_bus_id[i_idx]
+        if converter_type == "complex":
+            # Write S for PQ nodes
+            if bus_id in pq_nodes:
+                if bus_id in measured_injection:
+                    file.write(f"\tS{bus_id}_meas{value.get(f'S{bus_id}_meas', '')} [out = true]\n\tS{bus_id}_est [out = true]\n")
+                elif P_inj[i_idx] != 0 or Q_inj[i_idx] != 0:
+                    file.write(f"\tS{bus_id}_est [out = true]\n")
+        elif converter_type == "polar" or converter_type == "rectangular":
+            if bus_id in pq_nodes:
+                if bus_id in measured_injection:
+                    file.write(f"\tP{bus_id}_meas{value.get(f'P{bus_id}_meas', '')} [out = true]; P{bus_id}_est [out = true]\n"
+                               f"\tQ{bus_id}_meas{value.get(f'Q{bus_id}_meas', '')} [out = true]; Q{bus_id}_est [out = true]\n")
+                elif P_inj[i_idx] != 0 or Q_inj[i_idx] != 0:
+                    file.write(f"\tP{bus_id}_est [out = true]\n\tQ{bus_id}_est [out = true]\n")
+        # Write P and Q for PV nodes
+        if bus_id in pv_nodes:
+            if P_inj[i_idx] != 0 and bus_id in measured_injection:
+                file.write(f"\tP{bus_id}_meas{value.get(f'P{bus_id}_meas', '')} [out = true]; P{bus_id}_est [out = true]\n\tQ{bus_id}_est [out = true]\n")
+            elif P_inj[i_idx] != 0:
+                file.write(f"\tP{bus_id}_est [out = true]\n\tQ{bus_id}_est [out = true]\n")
+
+def write_measurement_generation(file, ctx, meas):
+    """SubModel PostProc: measurements generated from the power flow solution (@main.*_meas)."""
+    converter_type, n, index_to_bus_id, pq_nodes, pv_nodes = ctx.converter_type, ctx.n, ctx.index_to_bus_id, ctx.pq_nodes, ctx.pv_nodes
+    V_mag, e_var, f_var, v_cplx = ctx.V_mag, ctx.e_var, ctx.f_var, ctx.v_cplx
+    random_branches, measured_voltage, measured_injection = meas.branches, meas.voltage, meas.injection
+    inj, flows = ctx.injections, ctx.flows
+    if converter_type == "complex":
+            for bus_id in range(1, n + 1):
+                real_bus_id = index_to_bus_id[bus_id - 1]
+                # Format the string exactly as requested
+                line = f"\t\t@main.{v_cplx}_{real_bus_id}_meas = abs({v_cplx}_{real_bus_id}) + real(rnd(g_v))\n"
+                if real_bus_id in measured_voltage:
+                    file.write(line)
+
+            for bus_id in pq_nodes:
+                if bus_id in measured_injection:
+                    current_sum_expr = inj.sum("current", bus_id)
+                    power_expression = f"{v_cplx}_{bus_id} * conj({current_sum_expr})"
+                    file.write(f"\t\t@main.S{bus_id}_meas = {power_expression} + rnd(g_inj)\n")
+
+            for bus_id in pv_nodes:
+                if bus_id in measured_injection:
+                    current_sum_expr = inj.sum("current", bus_id)
+                    power_expression = f"{v_cplx}_{bus_id} * conj({current_sum_expr})"
+                    file.write(f"\t\t@main.P{bus_id}_meas = real({power_expression}) + real(rnd(g_inj))\n")
+
+            for m, o, k in random_branches:
+                file.write(f"\t\t@main.S_{flows.label(m, o, k)}_meas = {v_cplx}_{m} * conj({flows.current(ctx, m, o, k)}) + rnd(g_br)\n")
+            #file.write("\n") # Add a newline for spacing
+    elif converter_type == "polar":
+            for bus_id in range(1, n + 1):
+                    real_bus_id = index_to_bus_id[bus_id - 1]
+                    # Format the string exactly as requested
+                    line = f"\t\t@main.{V_mag}_{real_bus_id}_meas = {V_mag}_{real_bus_id} + rnd(g_v)\n"
+                    if real_bus_id in measured_voltage:
+                        file.write(line)
+            for i in pq_nodes:
+                if i in measured_injection:
+                    sum_expression = inj.sum("q_polar", i)
+                    sum_expression1 = inj.sum("p_polar", i)
+                    file.write(f"\t\t@main.Q{i}_meas = {V_mag}_{i} * ({sum_expression}) + rnd(g_inj)\n")
+                    file.write(f"\t\t@main.P{i}_meas = {V_mag}_{i} * ({sum_expression1}) + rnd(g_inj)\n")
+            for i in pv_nodes:
+                if i in measured_injection:
+                    sum_expression1 = inj.sum("p_polar", i)
+                    #file.write(f"\t\t@main.Q{i}_meas = {V_mag}_{i} * ({sum_expression}) + rnd(g_inj)\n")
+                    file.write(f"\t\t@main.P{i}_meas = {V_mag}_{i} * ({sum_expression1}) + rnd(g_inj)\n")
+            for m, o, k in random_branches:
+                lbl = flows.label(m, o, k)
+                p_formula, q_formula = flows.powers(ctx, m, o, k)
+                file.write(f"\t\t@main.P_{lbl}_meas = {p_formula} + rnd(g_br)\n")
+                file.write(f"\t\t@main.Q_{lbl}_meas = {q_formula} + rnd(g_br)\n")
+    elif converter_type == "rectangular":
+            for bus_id in range(1, n + 1):
+                    real_bus_id = index_to_bus_id[bus_id - 1]
+                    # Format the string exactly as requested
+                    line = f"\t\t@main.{V_mag}_{real_bus_id}_meas = sqrt({e_var}_{real_bus_id}^2 + {f_var}_{real_bus_id}^2) + rnd(g_v)\n"
+                    if real_bus_id in measured_voltage:
+                        file.write(line)
+            for bus_id in pq_nodes:
+                if bus_id not in measured_injection:
+                    continue
+                p_sum_expression = inj.sum("p_rect", bus_id)
+                file.write(f"\t\t@main.P{bus_id}_meas = {p_sum_expression} + rnd(g_inj)\n")
+                q_sum_expression = inj.sum("q_rect", bus_id)
+                file.write(f"\t\t@main.Q{bus_id}_meas = {q_sum_expression} + rnd(g_inj)\n")
+                # Loop over the PV nodes to write P and Q equations in rectangular coorinates
+            for i in pv_nodes:
+                if i not in measured_injection:
+                    continue
+                p_sum_expression = inj.sum("p_rect_pv", i)
+                file.write(f"\t\t@main.P{i}_meas = {p_sum_expression} + rnd(g_inj)\n")
+                #file.write(f"\t\t@main.Q{i}_meas = {q_sum_expression} + real(rnd(g_inj))\n")
+            for m, o, k in random_branches:
+                lbl = flows.label(m, o, k)
+                p_formula, q_formula = flows.powers(ctx, m, o, k)
+                file.write(f"\t\t@main.P_{lbl}_meas = {p_formula} + rnd(g_br)\n")
+                file.write(f"\t\t@main.Q_{lbl}_meas = {q_formula} + rnd(g_br)\n")
+
+def write_measurement_equations(file, ctx, meas):
+    """WLSEs: measurement equations of the selected measurement set."""
+    converter_type, n, index_to_bus_id, pq_nodes, pv_nodes = ctx.converter_type, ctx.n, ctx.index_to_bus_id, ctx.pq_nodes, ctx.pv_nodes
+    slack, V_mag, e_var, f_var, v_cplx = ctx.slack, ctx.V_mag, ctx.e_var, ctx.f_var, ctx.v_cplx
+    random_branches, measured_voltage, measured_injection = meas.branches, meas.voltage, meas.injection
+    inj, flows = ctx.injections, ctx.flows
+    if converter_type == "complex":
+            for bus_id in range(1, n + 1):
+                    real_bus_id = index_to_bus_id[bus_id - 1]
+                    # Format the string exactly as requested
+                    if real_bus_id not in slack:
+                        line = f"\t[w=w_v] {v_cplx}_{real_bus_id}*conj({v_cplx}_{real_bus_id}) = {v_cplx}_{real_bus_id}_meas^2\n"
+                        if real_bus_id in measured_voltage:
+                            file.write(line)
+            for bus_id in pv_nodes:
+                    if bus_id in measured_injection:
+                        current_sum_expr = inj.current(bus_id)
+                        power_expression = f"{v_cplx}_{bus_id} * conj({current_sum_expr})"
+                        power_expression1 = f"conj({v_cplx}_{bus_id}) * ({current_sum_expr})"
+                        file.write(f"\t[w=w_inj] {power_expression} + {power_expression1} = 2 * P{bus_id}_meas\n")
+            for bus_id in pq_nodes:
+                    if bus_id in measured_injection:
+                        current_sum_expr = inj.current(bus_id)
+                        power_expression = f"{v_cplx}_{bus_id} * conj({current_sum_expr})"
+                        file.write(f"\t[w=w_inj] {power_expression} = S{bus_id}_meas\n")
+                        power_expression1 = f"conj({v_cplx}_{bus_id}) * ({current_sum_expr})"
+                        file.write(f"\t[w=w_inj] {power_expression1} = conj(S{bus_id}_meas)\n")
+            for m, o, k in random_branches:
+                lbl = flows.label(m, o, k)
+                current = flows.current(ctx, m, o, k)
+                file.write(f"\t[w=w_br] {v_cplx}_{m} * conj({current}) = S_{lbl}_meas\n")
+                file.write(f"\t[w=w_br] conj({v_cplx}_{m}) * ({current}) = conj(S_{lbl}_meas)\n")
+    elif converter_type == "polar":
+            for bus_id in range(1, n + 1):
+                    real_bus_id = index_to_bus_id[bus_id - 1]
+                    if real_bus_id not in slack:
+                        line = f"\t[w=w_v] {V_mag}_{real_bus_id} = {V_mag}_{real_bus_id}_meas\n"
+                        if real_bus_id in measured_voltage:
+                            file.write(line)
+            for i in pv_nodes:
+                if i in measured_injection:
+                    sum_expression1 = inj.power("p_polar", i)
+                    #file.write(f"\t\t@main.Q{i}_meas = {V_mag}_{i} * ({sum_expression}) + rnd(g_inj)\n")
+                    file.write(f"\t[w=w_inj] {V_mag}_{i} * ({sum_expression1}) = P{i}_meas\n")
+            for i in pq_nodes:
+                if i in measured_injection:
+                    sum_expression = inj.power("q_polar", i)
+                    sum_expression1 = inj.power("p_polar", i)
+                    file.write(f"\t[w=w_inj] {V_mag}_{i} * ({sum_expression}) = Q{i}_meas\n")
+                    file.write(f"\t[w=w_inj] {V_mag}_{i} * ({sum_expression1}) = P{i}_meas\n")
+            for m, o, k in random_branches:
+                lbl = flows.label(m, o, k)
+                p_formula, q_formula = flows.powers(ctx, m, o, k)
+                file.write(f"\t[w=w_br] {p_formula} = P_{lbl}_meas\n")
+                file.write(f"\t[w=w_br] {q_formula} = Q_{lbl}_meas\n")
+    elif converter_type == "rectangular":
+            for bus_id in range(1, n + 1):
+                    real_bus_id = index_to_bus_id[bus_id - 1]
+                    if real_bus_id not in slack:
+                        line = f"\t[w=w_v] {e_var}_{real_bus_id}^2 + {f_var}_{real_bus_id}^2 = {V_mag}_{real_bus_id}_meas^2\n"
+                        if real_bus_id in measured_voltage:
+                            file.write(line)
+            for i in pv_nodes:
+                if i not in measured_injection:
+                    continue
+                p_sum_expression = inj.power("p_rect_pv", i)
+                file.write(f"\t[w=w_inj] {p_sum_expression} = P{i}_meas\n")
+                #file.write(f"\t\t@main.Q{i}_meas = {q_sum_expression} + real(rnd(g_inj))\n")
+            for bus_id in pq_nodes:
+                if bus_id not in measured_injection:
+                    continue
+                p_sum_expression = inj.power("p_rect", bus_id)
+                file.write(f"\t[w=w_inj] {p_sum_expression} = P{bus_id}_meas\n")
+                q_sum_expression = inj.power("q_rect", bus_id)
+                file.write(f"\t[w=w_inj] {q_sum_expression} = Q{bus_id}_meas\n")
+            for m, o, k in random_branches:
+                lbl = flows.label(m, o, k)
+                p_formula, q_formula = flows.powers(ctx, m, o, k)
+                file.write(f"\t[w=w_br] {p_formula} = P_{lbl}_meas\n")
+                file.write(f"\t[w=w_br] {q_formula} = Q_{lbl}_meas\n")
+
+def write_branch_estimates(file, ctx, meas):
+    """PostProc: estimated flows of measured branches."""
+    converter_type, v_cplx, flows = ctx.converter_type, ctx.v_cplx, ctx.flows
+    random_branches = meas.branches
+    if converter_type == "complex":
+            for m, o, k in random_branches:
+                file.write(f"\tS_{flows.label(m, o, k)}_est = {v_cplx}_{m} * conj({flows.current(ctx, m, o, k)})\n")
+    elif converter_type == "polar":
+            for m, o, k in random_branches:
+                lbl = flows.label(m, o, k)
+                p_formula, q_formula = flows.powers(ctx, m, o, k)
+                file.write(f"\tP_{lbl}_est = {p_formula}\n")
+                file.write(f"\tQ_{lbl}_est = {q_formula}\n")
+    elif converter_type == "rectangular":
+            for m, o, k in random_branches:
+                lbl = flows.label(m, o, k)
+                p_formula, q_formula = flows.powers(ctx, m, o, k)
+                file.write(f"\tP_{lbl}_est = {p_formula}\n")
+                file.write(f"\tQ_{lbl}_est = {q_formula}\n")
+
+# Batch (Monte Carlo) generation: worker processes get the invariant model parts once
+_batch = {}
+
+def _init_batch_worker(output, ctx, ensure_observable, compression=None):
+    _batch.update(output=output, ctx=ctx, ensure_observable=ensure_observable, compression=compression)
+
+def _write_scenario(index, seed, path):
+    ctx = _batch["ctx"]
+    meas = design_measurement_set(ctx, seed, _batch["ensure_observable"])
+    with open_output(path, _batch["compression"]) as out, EmissionStats(out, ctx.budgets) as f:
+        _batch["output"].render(f, ctx, meas)
+    write_measurement_spec(path, ctx, meas)
+    info = {"index": index, "file": os.path.basename(path), "bytes": f.total_bytes, "warnings": f.warnings()}
+    if _batch["compression"]:
+        info["file_bytes"] = os.path.getsize(path)
+    info.update(meas.summary())
+    return info
+
+def write_batch(output, ctx, base_seed, count, jobs, out_base, ensure_observable, compression=None):
+    """
+    Write count scenario models that differ only in the measurement set (compressed with compression
+    if given). Scenario seeds are spawned from base_seed (numpy SeedSequence); a JSON manifest with
+    the seeds is written.
+    """
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(base_seed).spawn(count)]
+    paths = [model_file(f"{out_base}_{k:04d}", compression) for k in range(count)]
+    if jobs <= 1:
+        _init_batch_worker(output, ctx, ensure_observable, compression)
+        results = [_write_scenario(k, seeds[k], paths[k]) for k in range(count)]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker,
+                                 initargs=(output, ctx, ensure_observable, compression)) as pool:
+            results = list(pool.map(_write_scenario, range(count), seeds, paths))
+    manifest = {"base_seed": base_seed, "count": count, "converter_type": ctx.converter_type,
+                "estimation_method": ctx.estimation_method, "scenarios": results}
+    manifest_path = f"{out_base}_batch.json"
+    with open(manifest_path, "w", encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    n_unobservable = sum(1 for r in results if not r["observable"])
+    n_over_budget = sum(1 for r in results if r["warnings"])
+    print(f"  > Batch: {count} scenario models ({sum(r['bytes'] for r in results) / 1e6:.2f} MB), manifest {manifest_path}")
+    if compression:
+        print(f"  > Compressed ({compression}): {sum(r['file_bytes'] for r in results) / 1e6:.2f} MB on disk")
+    if n_unobservable:
+        print(f"Warning: {n_unobservable} scenario(s) are not observable.")
+    if n_over_budget:
+        print(f"Warning: {n_over_budget} scenario(s) exceed the model budgets (see warnings in the manifest).")
+    return manifest
+
 
 def main():
     # Set up command-line argument parser
@@ -31,11 +557,66 @@ def main():
         "-r", "--resPath",
         help="Path for the output .dmodl file. \nIf not specified, it will be created in the same directory as the input file with the same name (e.g., 'case9.m' -> 'case9.dmodl')."
     )
+
+    # Optional parameter-only update of a previous conversion
+    parser.add_argument(
+        "-u", "--update", action="store_true",
+        help="Update an existing output .dmodl file. \nIf only parameter values (loads, setpoints) change, the model is kept and the new values \nare written to <output>_params.json (apply with setParameterValues); otherwise the model is rewritten."
+    )
+
+    # Optional emission statistics for benchmarks
+    parser.add_argument(
+        "--stats", action="store_true",
+        help="Write statistics of the generated model (bytes per section, longest line, terms per equation, \nsymbols, budget warnings) to <output>_stats.json."
+    )
+
+    # Optional compact names
+    parser.add_argument(
+        "-c", "--compact", action="store_true",
+        help="Compact names: short ASCII variable names and bus ids 1..n (in the order of the case). \nThe map back to MATPOWER bus ids and configured names is written to <output>_names.json."
+    )
+
+    # Optional compressed output
+    parser.add_argument(
+        "-z", "--compress", choices=list(COMPRESSIONS),
+        help="Write the model compressed: <output>.dmodl.gz (gzip) or <output>.dmodl.zst (zstd, needs Python 3.14 \nor the zstandard package). The SE scripts and core read compressed models transparently."
+    )
+    
+    # Optional seed of the random measurement placement
+    parser.add_argument(
+        "-s", "--seed",
+        help="Seed for random measurement placement (integer or 'random'). \nOverrides <randomSeed> from config.xml; default is 0 (reproducible output)."
+    )
+
+    # Optional batch of scenario models differing only in the measurement set
+    parser.add_argument(
+        "-b", "--batch", type=int, default=0,
+        help="Number of scenario models to generate (Monte Carlo). \nScenario seeds are derived from --seed and listed in <output>_batch.json."
+    )
+    parser.add_argument(
+        "--base-seed",
+        help="Seed for random selection of consumption curve nodes (integer or 'random'); default is the seed. \nTo rebuild a scenario of a batch, pass its seed as --seed and base_seed of <output>_batch.json here."
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count(),
+        help="Number of processes used in batch mode and for the SubModel node equations of cases with 1000 buses or more (default: number of CPUs)."
+    )
     
     args = parser.parse_args()
+    if args.update and args.batch > 0:
+        print("\nError: --update cannot be used with --batch.")
+        sys.exit(1)
+    if args.base_seed is not None and args.batch > 0:
+        print("\nError: --base-seed cannot be used with --batch (the base seed of a batch is --seed).")
+        sys.exit(1)
+    try:
+        check_compression(args.compress)
+    except RuntimeError as e:
+        print(f"\nError: {e}")
+        sys.exit(1)
 
     # Extract input and config file paths from arguments
-    matpower_input_path = r"cases\{}".format(args.matpower_file)
+    matpower_input_path = resolve_case_path(args.matpower_file)
     config_file_path = "config.xml"           # Static path to XML config
     greek_symbols_path = "greek_symbols.json" # Static path to Greek symbols map
 
@@ -57,130 +638,34 @@ def main():
     print(f"  > Input MATPOWER file: {matpower_input_path}")
 
 
-    #   Error handling for file not found
-    try:
-        # Parsing configuration file for user options and variable naming
-        tree = ET.parse(config_file_path)
-        rootNode = tree.getroot()
-        root = rootNode.find('powerFlow')
-        rootES = rootNode.find('stateEstimation')
-        rootCommon = rootNode.find('common')
-        # Loading map of Greek symbols (used for variable name formatting)
-        with open(greek_symbols_path, 'r', encoding='utf-8') as f:
-            greek_map = json.load(f)
-    except FileNotFoundError as e:
-        print(f"\nError: A required file was not found.")
-        print(f"Details: {e}")
-        print("Please make sure the paths for the input, config, and greek symbols files are correct.")
-        sys.exit(1) # Exit with an error code
-
-    # Function to resolve variable name formatting
-    def resolve_variable(elem):
-        name = elem.attrib['name']
-        fmt = elem.attrib.get('format', 'name')
-        if fmt == 'symbol':
-            if name in greek_map:
-                return greek_map[name]
-            else:
-                print(f"Error: Symbol '{name}' not found in greek_map.")
-                sys.exit(1)
-        return name
+    # Parsing configuration file for user options and variable naming
+    rootNode, greek_map = load_config(config_file_path, greek_symbols_path)
+    root = rootNode.find('powerFlow')
+    rootES = rootNode.find('stateEstimation')
+    rootCommon = rootNode.find('common')
 
     # Extracting relevant variable names from XML config
-    variables = root.find('variables')
-    # --- Polar Coordinate Variables ---
-    V_mag   = resolve_variable(variables.find('voltage_magnitude'))
-    V_angle = resolve_variable(variables.find('voltage_angle'))
-    Y_mag   = resolve_variable(variables.find('line_admittance_magnitude'))
-    Y_angle = resolve_variable(variables.find('line_admittance_angle'))
-
-    # --- Rectangular Coordinate Variables ---
-    e_var   = resolve_variable(variables.find('real_voltage_component'))
-    f_var   = resolve_variable(variables.find('imaginary_voltage_component'))
-    G_var   = resolve_variable(variables.find('conductance'))
-    B_var   = resolve_variable(variables.find('susceptance'))
-
-    # --- Complex Coordinate Variables ---
-    v_cplx  = resolve_variable(variables.find('complex_voltage'))
-    Y_cplx  = resolve_variable(variables.find('complex_admittance'))
+    names = read_variable_names(root.find('variables'), greek_map)
+    if args.compact:
+        names, renamed = compact_variable_names(names)
+    V_mag, V_angle, Y_mag, Y_angle = names.V_mag, names.V_angle, names.Y_mag, names.Y_angle
+    e_var, f_var, G_var, B_var = names.e_var, names.f_var, names.G_var, names.B_var
+    v_cplx, Y_cplx, I_var = names.v_cplx, names.Y_cplx, names.I_var
 
     # Reading configuration options from XML
-    options = root.find('options')
-    converter_type_element = options.find('converter_type')
-    converter_type = converter_type_element.text.strip().lower() if converter_type_element is not None else 'polar'  # default 'polar' ako nije navedeno
-    include_limits = options.find('include_limits').text.strip().lower() == 'true'
-    comment_equations = options.find('comment_equations').text.strip().lower() == 'true'
-    comment_params = options.find('comment_params').text.strip().lower() == 'true'
-    zero_loads = options.find('zero_loads').text.strip().lower() == 'true'
-    zip_coeff = options.find('zip_coeff').text.strip().lower() == 'true'
-    zip_Kpone = options.find('zip_Kpone').text.strip().lower() == 'true'
-    calcQOfPVGensInEachIteration = options.find('calcQOfPVGensInEachIteration').text.strip().lower() == 'true'
-    useSumOfCurrentsForZI = options.find('useSumOfCurrentsForZI').text.strip().lower() == 'true'
-    convertLoadsToImpedance = options.find('convertLoadsToImpedance').text.strip().lower() == 'true'
-    
-    #print(f"  > Converter type set to: {converter_type}")
-
-    # Reading power limits for bus categorization (if any)
-    limits = root.find('limits')
-    power_limits = {}
-
-    if limits is not None:
-        last_value = -float('inf')  # Initialize to the smallest possible value
-        for category in limits.findall('category'):
-            group_name = category.attrib.get('name', '').strip()
-            max_value_raw = category.attrib.get('max', 'inf')
-            # Try to convert max value to float (handles 'inf' as well)
-            try:
-                max_value = float('inf') if max_value_raw.strip().lower() == 'inf' else float(max_value_raw)
-            except ValueError:
-                print(f"Warning: Invalid max value in group '{group_name}': {max_value_raw}")
-                continue
-            # Ensure max values are strictly increasing
-            if max_value <= last_value:
-                print(f"Error: Non-increasing max value for category '{group_name}' (value: {max_value})")
-                sys.exit(1)
-            last_value = max_value
-            power_limits[group_name] = max_value  # Store the valid limit
-
-
-    # Parsing ZIP model parameters
-    zip_limits = root.find('zip_limits')
-    zip_limits_data = {}
-
-    if zip_limits is not None:
-        last_value = -float('inf')  # Initialize to lowest possible to ensure increasing order
-        for category in zip_limits.findall('category'):
-            group_name = category.attrib.get('name', '').strip()
-            max_raw = category.attrib.get('max', 'inf')
-            # Parse and validate the max value
-            try:
-                max_val = float('inf') if max_raw.strip().lower() == 'inf' else float(max_raw)
-            except ValueError:
-                print(f"Warning: Invalid max value in '{group_name}': {max_raw}")
-                continue
-
-            if max_val <= last_value:
-                print(f"Error: Non-increasing max value for ZIP category '{group_name}' (value: {max_val})")
-                sys.exit(1)
-            last_value = max_val
-            # Extract ZIP coefficients
-            try:
-                Kz = float(category.attrib.get('Kz', 0.0))
-                Ki = float(category.attrib.get('Ki', 0.0))
-                Kp = float(category.attrib.get('Kp', 1.0))
-            except ValueError:
-                print(f"Warning: Invalid ZIP coefficient in group '{group_name}'")
-                continue
-            # Store ZIP category data
-            zip_limits_data[group_name] = {'max': max_val, 'Kz': Kz, 'Ki': Ki, 'Kp': Kp}
-
-    # Checking sum of ZIP coefficients
-    if zip_coeff:
-        for name, vals in zip_limits_data.items():
-            total = vals['Kz'] + vals['Ki'] + vals['Kp']
-            if abs(total - 1.0) > 1e-6:
-                print(f"Error: Kz + Ki + Kp for '{name}' is not 1 (got: {total})")
-                sys.exit(1)
+    opts = read_options(root.find('options'))
+    converter_type = opts.converter_type
+    include_limits, comment_equations, comment_params = opts.include_limits, opts.comment_equations, opts.comment_params
+    zero_loads, zip_coeff, zip_Kpone = opts.zero_loads, opts.zip_coeff, opts.zip_Kpone
+    calcQOfPVGensInEachIteration = opts.calcQOfPVGensInEachIteration
+    useSumOfCurrentsForZI = opts.useSumOfCurrentsForZI
+    convertLoadsToImpedance = opts.convertLoadsToImpedance
+    param_digits = opts.param_digits
+
+    # Power limits for bus categorization and ZIP model parameters
+    power_limits = read_power_limits(root.find('limits'))
+    zip_limits_data = read_zip_limits(root.find('zip_limits'), zip_coeff)
+    budgets = read_budgets(rootCommon.find('budgets'))
 
     # Parsing state estimation from config file
     optionsES = rootES.find('options')
@@ -190,6 +675,15 @@ def main():
     voltage_meas = float(optionsES.find('voltageMeasurements').text)
     branch_meas= float(optionsES.find('branchMeasurements').text)
     inj_meas = float(optionsES.find('injectionMeasurements').text)
+    ensure_observable_elem = optionsES.find('ensureObservability')
+    ensure_observable = ensure_observable_elem is None or ensure_observable_elem.text.strip().lower() == 'true'
+    use_current_vars_elem = optionsES.find('useCurrentVars')
+    use_current_vars = use_current_vars_elem is not None and use_current_vars_elem.text.strip().lower() == 'true'
+    noise_elem = optionsES.find('measurementNoise')
+    noise_mode = noise_elem.text.strip().lower() if noise_elem is not None else "model"
+    if noise_mode not in ("model", "python"):
+        print(f"\nError: invalid <measurementNoise> '{noise_elem.text.strip()}' (expected 'model' or 'python').")
+        sys.exit(1)
 
     weightsES = rootES.find('weightFactors')
     inj_weight = float(weightsES.find('injectionWeight').text)
@@ -206,169 +700,26 @@ def main():
     includeConsumptionCurves = rootCommon.find('includeConsumptionCurves').text.strip().lower() == 'true'
     numberOfLoadConsumptionCurves = int(rootCommon.find('numberOfLoadConsumptionCurves').text)
     numberOfGenConsumptionCurves = int(rootCommon.find('numberOfGenConsumptionCurves').text)
+    seed_elem = rootCommon.find('randomSeed')
+    seed = resolve_seed(args.seed, seed_elem.text if seed_elem is not None else None)
+    # Consumption curve nodes are drawn from their own generator, independent of the measurement placement,
+    # so all scenarios of a batch and a scenario rebuilt from its seed share them
+    curve_seed = seed if args.base_seed is None else resolve_seed(args.base_seed, None)
+    if includeConsumptionCurves and noise_mode == "python":
+        print("Warning: consumption curves are ignored with <measurementNoise>python (the model has no power flow SubModel).")
 
     eps=1e-14
-    number_pattern = re.compile(r'-?\d+\.?\d*(?:[eE][-+]?\d+)?')
-
-    def parse_matrix_block(lines, start_index):
-        data = []
-        i = start_index + 1 # Skip matrix header line
-        while i < len(lines):
-            line = lines[i].strip()
-            if line.startswith('%') or line == '':
-                i += 1
-                continue
-            if '];' in line:
-                break
-            row = line.split('%')[0].strip()
-            matches = number_pattern.findall(row)
-            if matches:
-                data.append([float(num) for num in matches])
-            i += 1
-        return data, i
-
-    # Initialize containers
-    bus, gen, branch = [], [], []
-    version = None
-    baseMVA = None
-
     # Read from the path provided by the command line
-    try:
-        with open(matpower_input_path, 'r') as file_handle:
-            lines = file_handle.readlines()
-    except FileNotFoundError:
-        print(f"\nError: The MATPOWER input file '{matpower_input_path}' was not found.")
-        sys.exit(1)
+    case = load_case(matpower_input_path)
+    if args.compact:
+        case = case.renumbered()
+    bus, gen, branch, baseMVA = case.bus, case.gen, case.branch, case.baseMVA
+    n, bus_id_map, index_to_bus_id = case.n, case.bus_id_map, case.index_to_bus_id
+    pq_nodes, pv_nodes, slack = case.pq_nodes, case.pv_nodes, case.slack
+    gen_by_bus = case.gen_by_bus
 
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        # Parse version string
-        if line.startswith("mpc.version"):
-            match = re.search(r"'(.*?)'", line)
-            if match:
-                version = match.group(1)
-            i += 1
-        # Parse baseMVA value
-        elif line.startswith("mpc.baseMVA"):
-            match = re.search(r"=\s*([0-9.]+);", line)
-            if match:
-                baseMVA = float(match.group(1))
-            i += 1
-        # Parse bus, gen, and branch matrices
-        elif line.startswith('mpc.bus'):
-            bus, i = parse_matrix_block(lines, i)
-        elif line.startswith('mpc.gen ='):
-            gen, i = parse_matrix_block(lines, i)
-        elif line.startswith('mpc.branch'):
-            branch, i = parse_matrix_block(lines, i)
-        elif bus and gen and branch:
-            break
-        else:
-            i += 1
-            
-    # Map bus indices for easier access
-    n = len(bus)
-    bus_id_map = {int(bus[i][0]): i for i in range(n)}
-    index_to_bus_id = {v: k for k, v in bus_id_map.items()}
-    pq_nodes, pv_nodes, slack = [], [], []
-
-    # Assign node type
-    for i in range(n):
-        bus_type = bus[i][1]
-        bus_id = int(bus[i][0])
-        if bus_type == 1:
-            pq_nodes.append(bus_id)
-        elif bus_type == 2:
-            pv_nodes.append(bus_id)
-        elif bus_type == 3:
-            slack.append(bus_id)
-
-    # Organizing generators and branches by bus_id
-    gen_by_bus = {}
-    for g in gen:
-        bus_index = int(g[0])
-        if bus_index not in gen_by_bus:
-            gen_by_bus[bus_index] = []
-        gen_by_bus[bus_index].append(g)
-
-    branch_by_bus = {}
-    for b in branch:
-        from_bus = int(b[0])
-        to_bus = int(b[1])
-        if from_bus not in branch_by_bus:
-            branch_by_bus[from_bus] = []
-        branch_by_bus[from_bus].append(b)
-        if to_bus not in branch_by_bus:
-            branch_by_bus[to_bus] = []
-        branch_by_bus[to_bus].append(b)
-
-    # Initialize the admittance matrix Y with zeros, shape (n x n), complex type
-    Y = np.zeros((n, n), dtype=complex)
-
-    # Create a set to track transformer connections
-    transformer_set = set()
-
-    # Loop over each row in the branch data to construct the admittance matrix
-    for row in branch:
-        f_bus = int(row[0])  # From bus
-        t_bus = int(row[1])  # To bus
-        r, x, b = row[2], row[3], row[4]  # Line resistance, reactance, and shunt susceptance
-        ratio = row[8] if row[8] != 0 else 1.0  # Tap ratio; default to 1 if zero
-        angle_deg = row[9]  # Phase shift angle in degrees
-        angle_rad = np.deg2rad(angle_deg)
-        a = ratio * np.exp(1j * angle_rad)  # Complex tap ratio for transformer
-
-        # Calculate series admittance and shunt admittance
-        y = 1 / complex(r, x) if r != 0 or x != 0 else 0
-        b_shunt = complex(0, b / 2)
-
-        # Map from bus IDs to matrix indices
-        f_idx = bus_id_map[f_bus]
-        t_idx = bus_id_map[t_bus]
-
-        # Identify transformer branches (with tap or phase shift)
-        if ratio != 0 and ratio != 1.0 or angle_deg != 0.0:
-            transformer_set.add((f_idx, t_idx))
-            transformer_set.add((t_idx, f_idx))
-
-        # Update admittance matrix using transformer model
-        Y[f_idx][f_idx] += (y + b_shunt) / (a * np.conj(a))
-        Y[t_idx][t_idx] += y + b_shunt
-        Y[f_idx][t_idx] -= y / np.conj(a)
-        Y[t_idx][f_idx] -= y / a
-
-    G = Y.real  # Conductance matrix
-    B = Y.imag  # Susceptance matrix
-
-    num_to_select = int(len(branch) * branch_meas)
-    random_branches = random.sample(branch, num_to_select)
-
-    # Generating random voltage measurements list
-    n = len(index_to_bus_id)
-    num_to_select = int(n * voltage_meas)
-    random_voltage = sorted(random.sample(range(1, n + 1), num_to_select))
-
-    # Generating random branches for measurement and randon direction
-    for b_row in random_branches:
-        original_f_bus = int(b_row[0])
-        original_t_bus = int(b_row[1])
-        # For each row, make a random 50/50 choice to swap them or not
-        if random.choice([True, False]):
-            # Keep the original order
-            b_row[0] = original_f_bus
-            b_row[1] = original_t_bus
-        else:
-            # Swap the order
-            b_row[0] = original_t_bus
-            b_row[1] = original_f_bus
-
-    # Add shunt conductance (gs) and susceptance (bs) from the bus data to diagonal elements of Y
-    for row in bus:
-        i_idx = bus_id_map[int(row[0])]
-        gs = row[4] / baseMVA
-        bs = row[5] / baseMVA
-        Y[i_idx][i_idx] += complex(gs, bs)
+    # Bus admittance matrix (G and B are views of the real and imaginary part of Y)
+    Y, G, B, transformer_set = build_ybus(case)
 
     # Set slack bus voltage magnitude and angle from generator data or default to bus data
     for real_bus_id in slack:
@@ -378,33 +729,25 @@ def main():
         v_angle = np.deg2rad(Va_deg)
     
     # Begin writing the dTwin .dmodl file
-    with open(dmodl_output_path + ".dmodl", "w", encoding='utf-8') as file:
+    # Measurement dependent parts are rendered per measurement set (see SegmentedOutput)
+    with SegmentedOutput() as file:
         # Write model header
         file.write("""Header:\n\tmaxIter=1000\n\treport=AllDetails\t//Solved - only final solved solution, All - shows solved and nonSolved with iterations, AllDetails - All + debug information\n\tmaxReps = -1\n\toutToTxt = false\nend\n""")
         file.write("//Generated by MATPOWER to dmodl coverter\n")
+        file.variant(write_seed_header, uses_ctx=False)
+        if includeConsumptionCurves and noise_mode != "python":
+            file.write(f"//Consumption curve seed: {curve_seed}\n")
+        model_title = "SE With PF SubModel" if noise_mode == "model" else "SE"
         if converter_type=="complex":
-            file.write(f"Model [type=WLS reInit=true eps=1e-5 maxIter=50 domain=cmplx name=\"SE With PF SubModel in complex domain\"]:\n")
+            file.write(f"Model [type=WLS reInit=true eps=1e-5 maxIter=50 domain=cmplx name=\"{model_title} in complex domain\"]:\n")
         else:
-            file.write(f"Model [type=WLS reInit=true eps=1e-5 maxIter=50 domain=real name=\"SE With PF SubModel in real domain\"]:\n")
+            file.write(f"Model [type=WLS reInit=true eps=1e-5 maxIter=50 domain=real name=\"{model_title} in real domain\"]:\n")
 
         # Declare variables for voltage angles and magnitudes (except slack bus)
         file.write("Vars [out=true]:\n")
         for bus_id in range(1, n + 1):
             real_bus_id = index_to_bus_id[bus_id - 1]
-            if real_bus_id not in slack:
-                row = bus[bus_id_map[real_bus_id]]
-                Vm = row[7]
-                Va_deg = row[8]
-                Va_rad = np.deg2rad(Va_deg)
-                # Setting voltage angles and magnitudes according to bus data
-                #file.write(f"\t{V_angle}_{real_bus_id} = {Va_rad}; ")
-                #file.write(f"{V_mag}_{real_bus_id} = {Vm}\n")
-
-                # Setting voltage angles and magnitudes according to initial values of 0 and 1 respectively
-                #file.write(f"\t{V_angle}_{real_bus_id} = {0}; ")
-                #file.write(f"{V_mag}_{real_bus_id} = {1}\n")
-
-                # Setting voltage angles and magnitudes according to slack values
+            # Setting voltage angles and magnitudes according to slack values (all buses are estimated)
             for real_bus_id1 in slack:
                 if converter_type == "polar":
                     file.write(f"\t{V_angle}_{real_bus_id} = {V_angle}_{real_bus_id1}_sl; ")
@@ -414,6 +757,7 @@ def main():
                     file.write(f"{f_var}_{real_bus_id} = {f_var}_{real_bus_id1}_sl\n")
                 elif converter_type == "complex":
                     file.write(f"\t{v_cplx}_{real_bus_id} = {v_cplx}_{real_bus_id1}_sl\n")
+        file.variant(write_current_vars)
 
 
         # Write ZIP model coefficients as parameters if enabled
@@ -484,13 +828,6 @@ def main():
             # Checking for ZI node
             if not (P_inj[i_idx] == 0 and Q_inj[i_idx] == 0):
                 eligible_injection_nodes.append(bus_id)
-        num_to_select = int(len(eligible_injection_nodes) * inj_meas)
-        selected_nodes = random.sample(eligible_injection_nodes, num_to_select)
-        pv_nodes_set = set(pv_nodes)
-        random_pv_nodes = [bus_id for bus_id in selected_nodes if bus_id in pv_nodes_set]
-        random_pq_nodes = [bus_id for bus_id in selected_nodes if bus_id not in pv_nodes_set]
-        random_pv_nodes.sort()
-        random_pq_nodes.sort()
 
         all_pq_nodes_with_load = []
         for bus_id in pq_nodes:
@@ -500,8 +837,6 @@ def main():
         if numberOfLoadConsumptionCurves > len(all_pq_nodes_with_load): 
             print(f"\nError: Number Of Load Consumption Curves ({numberOfLoadConsumptionCurves}) is larger than the number of available loads ({len(all_pq_nodes_with_load)}).")
             sys.exit(1)
-        selected_pq_nodes = random.sample(all_pq_nodes_with_load, int(numberOfLoadConsumptionCurves))
-        selected_pq_nodes.sort()
 
         if numberOfGenConsumptionCurves > len(pv_nodes): 
             print(f"\nError: Number Of Generator Consumption Curves ({numberOfGenConsumptionCurves}) is larger than the number of available loads ({len(pv_nodes)}).")
@@ -509,81 +844,91 @@ def main():
         if numberOfGenConsumptionCurves < 0 or numberOfLoadConsumptionCurves < 0: 
             print(f"\nError: Number of curves must be positive.")
             sys.exit(1)
-        selected_pv_nodes = random.sample(pv_nodes, int(numberOfGenConsumptionCurves))
-        selected_pv_nodes.sort()
 
-        # Write admittance matrix entries as parameters 
-        for i_idx in range(n):
-            for j_idx in range(n):
-                bus_i = index_to_bus_id[i_idx]
-                bus_j = index_to_bus_id[j_idx]
-                magnitude = abs(Y[i_idx, j_idx])
-                angle_rad = np.angle(Y[i_idx, j_idx])
+        # Admittances of all branches for the flow measurements
+        flows = BranchFlows(branch)
+        # Power flow solution (true values of measurements generated in Python); slack and
+        # PV magnitudes from generator set points, constant power injections
+        V_pf_init = np.array([row[7] * np.exp(1j * np.deg2rad(row[8])) for row in bus])
+        for bus_id in slack + pv_nodes:
+            if bus_id in gen_by_bus:
+                i_idx = bus_id_map[bus_id]
+                V_pf_init[i_idx] = gen_by_bus[bus_id][0][5] * np.exp(1j * np.angle(V_pf_init[i_idx]))
+        V_case = None
+        if noise_mode == "python":
+            try:
+                V_case = solve_power_flow(Y, P_inj + 1j * Q_inj, V_pf_init,
+                                          [bus_id_map[b] for b in pv_nodes], [bus_id_map[b] for b in pq_nodes])
+            except ValueError as e:
+                print(f"\nError: {e} (measurements for <measurementNoise>python).")
+                sys.exit(1)
 
-                if magnitude != 0: # write only if not zero
-                    if converter_type == "polar":
-                        file.write(f"\t{Y_mag}_{bus_i}_{bus_j} = {magnitude}; ")
-                        if angle_rad != 0:
-                            file.write(f"{Y_angle}_{bus_i}_{bus_j} = {angle_rad} ")
-                    elif converter_type == "rectangular":
-                        G_val = G[i_idx, j_idx]
-                        B_val = B[i_idx, j_idx]
-                        file.write(f"\t{G_var}_{bus_i}_{bus_j} = {0 if abs(G_val) < eps else G_val}; ")
-                        file.write(f"{B_var}_{bus_i}_{bus_j} = {0 if abs(B_val) < eps else B_val} ")
-                    elif converter_type == "complex":
-                        file.write(f"\t{Y_cplx}_{bus_i}_{bus_j} = ")
-                        if Y[i_idx, j_idx].real != 0:
-                            file.write(f"{Y[i_idx, j_idx].real} ")
-                            if Y[i_idx, j_idx].real != 0 and Y[i_idx, j_idx].imag > 0: 
-                                file.write(f"+ ")
-                        if Y[i_idx, j_idx].imag != 0:
-                            file.write(f"{Y[i_idx, j_idx].imag}i ")
-                    # Add comments to lines and transformers
-                    if comment_params:
-                        if bus_i != bus_j:
-                            if (i_idx, j_idx) in transformer_set:
-                                file.write(f"// transformer {bus_i}-{bus_j}\n")
-                            else:
-                                file.write(f"// line {bus_i}-{bus_j}\n")
-                        else:
-                            file.write(f"\n")
-                    else:
-                        file.write(f"\n")
+        # Data needed to write the measurement dependent parts of the model
+        ctx = SimpleNamespace(
+            converter_type=converter_type, estimation_method=estimation_method, budgets=budgets, n=n, eps=eps, Y=Y, G=G, B=B,
+            bus_id_map=bus_id_map, index_to_bus_id=index_to_bus_id, pq_nodes=pq_nodes, pv_nodes=pv_nodes, slack=slack,
+            P_inj=P_inj, Q_inj=Q_inj, V_mag=V_mag, V_angle=V_angle, Y_mag=Y_mag, Y_angle=Y_angle,
+            e_var=e_var, f_var=f_var, G_var=G_var, B_var=B_var, v_cplx=v_cplx, Y_cplx=Y_cplx, I_var=I_var,
+            inj_weight=inj_weight, branch_weight=branch_weight, voltage_weight=voltage_weight, zero_inj_weight=zero_inj_weight,
+            flows=flows, branch_ends=flows.ends,
+            noise_mode=noise_mode, deviations=(voltage_deviation, inj_deviation, branch_deviation), V_case=V_case, V_pf_init=V_pf_init,
+            eligible_injection_nodes=eligible_injection_nodes,
+            zi_nodes=[bus_id for bus_id in pq_nodes if P_inj[bus_id_map[bus_id]] == 0 and Q_inj[bus_id_map[bus_id]] == 0],
+            branch_meas=branch_meas, voltage_meas=voltage_meas, inj_meas=inj_meas)
+        # Current variables of the main model for all buses with nonzero injection
+        ctx.injections = InjectionExpressions(ctx, eligible_injection_nodes if use_current_vars else ())
+        inj = ctx.injections
+
+        if args.batch == 0:
+            # Random measurement placement (seeded) and observability check
+            meas = design_measurement_set(ctx, seed, ensure_observable)
+            if meas.added:
+                print(f"  > Observability: added {meas.added} measurement(s) to the random placement")
+            print(f"  > Measurements: {len(meas.voltage)} voltage, {len(meas.injection)} injection, {len(meas.branches)} branch; "
+                  f"redundancy {meas.redundancy:.2f}")
+            if not meas.observable:
+                print(f"Warning: measurement set is not observable (P-theta rank {meas.ranks[0]}/{n}, Q-V rank {meas.ranks[1]}/{n}).")
+        selected_pq_nodes, selected_pv_nodes = place_consumption_curves(
+            np.random.default_rng(curve_seed), all_pq_nodes_with_load, pv_nodes, numberOfLoadConsumptionCurves, numberOfGenConsumptionCurves)
+
+        # Write admittance matrix entries as parameters (nonzeros only, formatted at once)
+        write_admittances(file, ctx, transformer_set, comment_params, param_digits)
 
         # Write active and reactive injections (P_inj, Q_inj) to file
+        P_text, Q_text = format_values(P_inj, param_digits), format_values(Q_inj, param_digits)
         for i_idx in range(n):
             bus_id = index_to_bus_id[i_idx]
             if converter_type == "complex":
                 # Write S for PQ nodes
                 if bus_id in pq_nodes:
                     if P_inj[i_idx] != 0:
-                        file.write(f"\tS{bus_id}_inj = {P_inj[i_idx]}")
+                        file.write(f"\tS{bus_id}_inj = {P_text[i_idx]}")
                         if Q_inj[i_idx] > 0:
-                            file.write(f" + {Q_inj[i_idx]}i")
+                            file.write(f" + {Q_text[i_idx]}i")
                         elif Q_inj[i_idx] < 0:
-                            file.write(f" {Q_inj[i_idx]}i")
+                            file.write(f" {Q_text[i_idx]}i")
                     if P_inj[i_idx] == 0 and Q_inj[i_idx] != 0:
-                        file.write(f"\tS{bus_id}_inj = {Q_inj[i_idx]}i\n")
+                        file.write(f"\tS{bus_id}_inj = {Q_text[i_idx]}i\n")
                     elif P_inj[i_idx] != 0:
                         file.write(f" \n")
                 # Write P and Q for PV nodes
                 if bus_id in pv_nodes:
                     if P_inj[i_idx] != 0:
-                        file.write(f"\tP{bus_id}_inj = {P_inj[i_idx]}\n")
+                        file.write(f"\tP{bus_id}_inj = {P_text[i_idx]}\n")
                     if not calcQOfPVGensInEachIteration:
                         file.write(f"\tQ{bus_id}_inj [out = true]\n")
                     else: 
-                        file.write(f"\tQ{bus_id}_inj = {Q_inj[i_idx]} [out = true]\n")      
+                        file.write(f"\tQ{bus_id}_inj = {Q_text[i_idx]} [out = true]\n")      
             elif converter_type == "polar" or converter_type == "rectangular":
                 if P_inj[i_idx] != 0:
-                    file.write(f"\tP{bus_id}_inj = {P_inj[i_idx]}\n")
+                    file.write(f"\tP{bus_id}_inj = {P_text[i_idx]}\n")
                 if Q_inj[i_idx] != 0 and bus_id not in pv_nodes:
-                    file.write(f"\tQ{bus_id}_inj = {Q_inj[i_idx]}\n")
+                    file.write(f"\tQ{bus_id}_inj = {Q_text[i_idx]}\n")
                 if bus_id in pv_nodes:
                     if not calcQOfPVGensInEachIteration:
                         file.write(f"\tQ{bus_id}_inj [out = true]\n")
                     else: 
-                        file.write(f"\tQ{bus_id}_inj = {Q_inj[i_idx]} [out = true]\n")
+                        file.write(f"\tQ{bus_id}_inj = {Q_text[i_idx]} [out = true]\n")
 
         # If enabled, write PV node controls (voltage magnitude setpoint, limits) to file
         for pv_bus in pv_nodes:
@@ -595,54 +940,9 @@ def main():
                     file.write(f"\tQ{pv_bus}_inj_max = {g[3]/baseMVA}\n")
                 file.write(f"\tV_{pv_bus}_sp = {g[5]}\n")
 
-        # Adding random branches
-        for bus_id in random_branches:
-            from_bus=bus_id[0]
-            to_bus=bus_id[1]
-            if converter_type == "complex":
-                file.write(f"\tS_{int(from_bus)}_{int(to_bus)}_meas [out = true]\n")
-                file.write(f"\tS_{int(from_bus)}_{int(to_bus)}_est [out = true]\n")
-            else:
-                file.write(f"\tP_{int(from_bus)}_{int(to_bus)}_meas [out = true]; ")
-                file.write(f"P_{int(from_bus)}_{int(to_bus)}_est [out = true]\n")
-                file.write(f"\tQ_{int(from_bus)}_{int(to_bus)}_meas [out = true]; ")
-                file.write(f"Q_{int(from_bus)}_{int(to_bus)}_est [out = true]\n")
-        
-        # Adding measuring params
-        for bus_id in range(1, n + 1):
-            real_bus_id = index_to_bus_id[bus_id - 1]
-            #if real_bus_id not in slack:
-            row = bus[bus_id_map[real_bus_id]]
-            if converter_type == "complex":
-                file.write(f"\t{v_cplx}_{real_bus_id}_meas [type=real out=true]\n")
-            else:
-                file.write(f"\t{V_mag}_{real_bus_id}_meas [out=true]\n")
-        if converter_type == "complex":
-            file.write(f"\tw_inj = {inj_weight} [type=real]\n")
-            file.write(f"\tw_br = {branch_weight} [type=real]\n")
-            file.write(f"\tw_v = {voltage_weight} [type=real]\n")
-            file.write(f"\tw_zi = {zero_inj_weight} [type=real]\n")
-        else:
-            file.write(f"\tw_inj = {inj_weight}\n")
-            file.write(f"\tw_br = {branch_weight}\n")
-            file.write(f"\tw_v = {voltage_weight}\n")
-            file.write(f"\tw_zi = {zero_inj_weight}\n")
-        for i_idx in range(n):
-            bus_id = index_to_bus_id[i_idx]
-            if converter_type == "complex":
-                # Write S for PQ nodes
-                if bus_id in pq_nodes:
-                    if P_inj[i_idx] != 0 or Q_inj[i_idx] != 0:
-                        file.write(f"\tS{bus_id}_meas [out = true]\n\tS{bus_id}_est [out = true]\n")
-            elif converter_type == "polar" or converter_type == "rectangular":
-                if bus_id in pq_nodes:
-                    if P_inj[i_idx] != 0 or Q_inj[i_idx] != 0:
-                        file.write(f"\tP{bus_id}_meas [out = true]; P{bus_id}_est [out = true]\n\tQ{bus_id}_meas [out = true]; Q{bus_id}_est [out = true]\n")
-            # Write P and Q for PV nodes
-            if bus_id in pv_nodes:
-                if P_inj[i_idx] != 0:
-                    file.write(f"\tP{bus_id}_meas [out = true]; P{bus_id}_est [out = true]\n\tQ{bus_id}_est [out = true]\n")
-        if includeConsumptionCurves:
+        file.variant(write_measurement_params)
+        # Consumption curves scale the loads of the power flow SubModel (not written with python noise)
+        if includeConsumptionCurves and noise_mode != "python":
             for bus_id in selected_pq_nodes:
                 i_idx = bus_id_map[bus_id]
                 if converter_type == "complex":
@@ -655,6 +955,8 @@ def main():
                     file.write(f"\tk{bus_id}_gen = 1 [type=real]\n")
                 elif converter_type == "polar" or converter_type == "rectangular":    
                     file.write(f"\tk{bus_id}_gen = 1\n")
+        # Measurements set from Python (measurementGenerator.py) do not need the power flow SubModel
+        file.skip(noise_mode == "python")
         # SUBMODEL ----------------------------------------------> Writing submodel in model 
         if converter_type=="complex":
             file.write("SubModel [type=NL alwaysOn=true eps=1e-4 maxIter=200 domain=cmplx copyPars=3000 alwaysOn=false name=\"Solving power flow\"]:\n")
@@ -697,1064 +999,166 @@ def main():
 
         # Begin writing the nonlinear equations (NLEs) section
         file.write("\tNLEs:\n")
-        S_mag_by_bus = {}
 
-        # Loop over all PQ nodes to write power balance equations
-        for bus_id in pq_nodes:
-            if comment_equations:
-                file.write(f"\t\t// node {bus_id} - PQ\n")
-            i_idx = bus_id_map[bus_id]
-
-            # Calculate real and reactive power in system units (MW, MVar)
-            p_val = P_inj[i_idx]*baseMVA
-            q_val = Q_inj[i_idx]*baseMVA
-            s_magnitude = np.sqrt(p_val**2 + q_val**2)  # Apparent power magnitude
-
-            # Write real power balance equation for PQ node
-            if converter_type == "polar":
-                file.write("\t\t") # Start the line             
-                if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0:
-                    # This formulation comes from P_i = Re(V_i * I_i_conj), where I_i is the sum of currents
-                    # P_i = V_mag_i * (cos(V_angle_i) * Real(I_i) + sin(V_angle_i) * Imag(I_i))
-                    # Real(I_i) = Sum_j [Y_mag_ij * V_mag_j * cos(V_angle_j + Y_angle_ij)]
-                    # Imag(I_i) = Sum_j [Y_mag_ij * V_mag_j * sin(V_angle_j + Y_angle_ij)]
-                    real_current_terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        aY = abs(Y[i_idx][j_idx])
-                        if aY == 0:
-                            continue
-                        theta = np.angle(Y[i_idx][j_idx])
-                        theta_term = f" + {Y_angle}_{bus_id}_{j_bus_id}" if theta != 0 else ""
-                        real_term = f"{Y_mag}_{bus_id}_{j_bus_id} * {V_mag}_{j_bus_id} * cos({V_angle}_{j_bus_id}{theta_term})"
-                        real_current_terms.append(real_term)
-                    real_sum = " + ".join(real_current_terms)
-                    file.write(f"{real_sum} ")
-                else:
-                    # Sum of Powers formulation
-                    file.write(f"{V_mag}_{bus_id} * (")
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        aY = abs(Y[i_idx][j_idx])
-                        if aY == 0:
-                            continue
-                        theta = np.angle(Y[i_idx][j_idx])
-                        theta_term = f" - {Y_angle}_{bus_id}_{j_bus_id}" if theta != 0 else ""
-                        term = f"{Y_mag}_{bus_id}_{j_bus_id} * {V_mag}_{j_bus_id} * cos({V_angle}_{bus_id}{theta_term} - {V_angle}_{j_bus_id})"
-                        terms.append(term)
-                    file.write(" + ".join(terms))
-                    file.write(") ")
-            elif converter_type == "rectangular":
-                if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0: # sum of currents
-                    file.write(f"\t\t")
-                    real_terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                            continue
-                        term = f"{G_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}"
-                        real_terms.append(term)
-                    file.write(" + ".join(real_terms))
-                else: # powers
-                    file.write(f"\t\t")  
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                            continue
-                        term = f"{e_var}_{bus_id} * ({G_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}) + {f_var}_{bus_id} * ({B_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id})"
-                        terms.append(term)
-                    file.write(" + ".join(terms))
-            elif converter_type == "complex": 
-                if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0: #sum of currents
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(Y[i_idx][j_idx]) < eps:
-                            continue
-                        terms.append(f"{Y_cplx}_{bus_id}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                    current_summation = " + ".join(terms)
-                    file.write(f"\t\tconj({current_summation}")
-                else: # power
-                    file.write(f"\t\t{v_cplx}_{bus_id} * conj(")
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(Y[i_idx][j_idx]) < eps:
-                            continue
-                        terms.append(f"{Y_cplx}_{bus_id}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                    file.write(" - ".join(terms) if len(terms) == 1 else " + ".join(terms))
-                if P_inj[i_idx] == 0 and Q_inj[i_idx] == 0:
-                    file.write(") = 0\n")
-                else:
-                    # Writing complex ZIP if included
-                    if zip_coeff:
-                        for group_name, data in zip_limits_data.items():
-                                if s_magnitude < data['max']:
-                                    Vm = np.array([row[7] for row in bus])
-                                    if Vm[i_idx] != 1:
-                                        file.write(f") = S{bus_id}_inj*(Kz_{group_name}*({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})/{Vm[i_idx]}^2) + Ki_{group_name}*(sqrt({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id}))/{Vm[i_idx]}) + Kp_{group_name}) \n")
-                                    else:
-                                        file.write(f") = S{bus_id}_inj*(Kz_{group_name}*({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})) + Ki_{group_name}*sqrt({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})) + Kp_{group_name}) \n")
-                                    break
-                    else:
-                        if includeConsumptionCurves and bus_id in selected_pq_nodes:
-                            file.write(f") = S{bus_id}_inj * k{bus_id}_load\n")
-                        else:
-                            file.write(f") = S{bus_id}_inj\n")
-            # Handle optional ZIP load model or default power injection form
-            if converter_type != "complex":
-                if P_inj[i_idx] == 0:
-                    file.write(" = 0\n")
-                else:
-                    if zip_coeff:
-                        if converter_type == "polar":
-                            for group_name, data in zip_limits_data.items():
-                                if s_magnitude < data['max']:
-                                    Vm = np.array([row[7] for row in bus])
-                                    if Vm[i_idx] != 1:
-                                        file.write(f" = P{bus_id}_inj*(Kz_{group_name}*({V_mag}_{bus_id}/{Vm[i_idx]})^2 + Ki_{group_name}*({V_mag}_{bus_id}/{Vm[i_idx]}) + Kp_{group_name}) \n")
-                                    else:
-                                        file.write(f" = P{bus_id}_inj*(Kz_{group_name}*({V_mag}_{bus_id})^2 + Ki_{group_name}*{V_mag}_{bus_id} + Kp_{group_name}) \n")
-                                    break
-                        elif converter_type == "rectangular":
-                            for group_name, data in zip_limits_data.items():
-                                if s_magnitude < data['max']:
-                                    Vm = np.array([row[7] for row in bus])
-                                    if Vm[i_idx] != 1:
-                                        file.write(f" = P{bus_id}_inj*(Kz_{group_name}*(({e_var}_{bus_id}^2+{f_var}_{bus_id}^2)/{Vm[i_idx]}^2) + Ki_{group_name}*(sqrt({e_var}_{bus_id}^2+{f_var}_{bus_id}^2)/{Vm[i_idx]}) + Kp_{group_name}) \n")
-                                    else:
-                                        file.write(f" = P{bus_id}_inj*(Kz_{group_name}*({e_var}_{bus_id}^2+{f_var}_{bus_id}^2) + Ki_{group_name}*sqrt({e_var}_{bus_id}^2+{f_var}_{bus_id}^2) + Kp_{group_name}) \n")
-                                    break
-                    else:
-                        if includeConsumptionCurves and bus_id in selected_pq_nodes:
-                            file.write(f" = P{bus_id}_inj * k{bus_id}_load\n")
-                        else:
-                            file.write(f" = P{bus_id}_inj\n")
-
-            # Write reactive power balance equation for PQ node or KL1 if injected power is zero
-            if converter_type == "polar":
-                if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0:
-                    # This formulation comes from Q_i = Im(V_i * I_i_conj)
-                    # Q_i = V_mag_i * (sin(V_angle_i) * Real(I_i) - cos(V_angle_i) * Imag(I_i))                    
-                    imag_current_terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(Y[i_idx][j_idx]) == 0:
-                            continue
-                        theta = np.angle(Y[i_idx][j_idx])
-                        theta_term = f" + {Y_angle}_{bus_id}_{j_bus_id}" if theta != 0 else ""
-                        imag_term = f"{Y_mag}_{bus_id}_{j_bus_id} * {V_mag}_{j_bus_id} * sin({V_angle}_{j_bus_id}{theta_term})"
-                        imag_current_terms.append(imag_term)
-                    imag_sum = " + ".join(imag_current_terms)
-                    file.write(f"\t\t{imag_sum} ")
-                else:
-                    file.write(f"\t\t{V_mag}_{bus_id} * (")
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        aY = abs(Y[i_idx][j_idx])
-                        if aY == 0:
-                            continue
-                        theta = np.angle(Y[i_idx][j_idx])
-                        theta_term = f" - {Y_angle}_{bus_id}_{j_bus_id}" if theta != 0 else ""
-                        term = f"{Y_mag}_{bus_id}_{j_bus_id} * {V_mag}_{j_bus_id} * sin({V_angle}_{bus_id}{theta_term} - {V_angle}_{j_bus_id})"
-                        terms.append(term)
-                    file.write(" + ".join(terms))
-                    file.write(") ")
-            elif converter_type == "rectangular":
-                if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0:                   
-                    file.write(f"\t\t")
-                    imag_terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                            continue
-                        term = f"{B_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}"
-                        imag_terms.append(term)
-                    file.write(" + ".join(imag_terms))
-                else:
-                    file.write(f"\t\t") 
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                            continue
-                        term = (f"{f_var}_{bus_id} * ({G_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}) - {e_var}_{bus_id} * ({B_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id})")
-                        terms.append(term)
-                    file.write(" + ".join(terms))
-            elif converter_type == "complex": 
-                if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0:
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(Y[i_idx][j_idx]) < eps:
-                            continue
-                        terms.append(f"{Y_cplx}_{bus_id}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                    current_summation = " + ".join(terms)
-                    file.write(f"\t\t({current_summation}")
-                else:                 
-                    v_i = f"{v_cplx}_{bus_id}"
-                    conj_vi = f"conj({v_i})"
-                    sum_terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(Y[i_idx][j_idx]) < eps:
-                            continue
-                        v_j = f"{v_cplx}_{j_bus_id}"
-                        Y_sym = f"{Y_cplx}_{bus_id}_{j_bus_id}"
-                        term = f"{Y_sym} * {v_j}"
-                        sum_terms.append(term)
-
-                    rhs = f"conj(S{bus_id}_inj)"
-                    file.write(f"\t\t{conj_vi} * (")
-                    file.write(" + ".join(sum_terms))
-                if P_inj[i_idx] == 0 and Q_inj[i_idx] == 0:
-                    rhs = f"0"
-                else:
-                    if zip_coeff:
-                        for group_name, data in zip_limits_data.items():
-                                if s_magnitude < data['max']:
-                                    Vm = np.array([row[7] for row in bus])
-                                    if Vm[i_idx] != 1:
-                                        rhs = f" conj(S{bus_id}_inj)*(Kz_{group_name}*({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})/{Vm[i_idx]}^2) + Ki_{group_name}*(sqrt({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id}))/{Vm[i_idx]}) + Kp_{group_name}) \n"
-                                    else:
-                                        rhs = f" conj(S{bus_id}_inj)*(Kz_{group_name}*({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})) + Ki_{group_name}*sqrt({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})) + Kp_{group_name}) \n"
-                                    break
-                    else:
-                        if includeConsumptionCurves and bus_id in selected_pq_nodes:
-                            rhs = f"conj(S{bus_id}_inj * k{bus_id}_load)"
-                        else:
-                            rhs = f"conj(S{bus_id}_inj)"
-                file.write(f") = {rhs}\n")
-            # Add Q if not complex domain
-            if converter_type != "complex":
-                if Q_inj[i_idx] == 0:
-                    file.write(" = 0\n")
-                else:
-                    if zip_coeff:
-                        if converter_type == "polar":
-                            for group_name, data in zip_limits_data.items():
-                                if s_magnitude < data['max']:
-                                    Vm = np.array([row[7] for row in bus])
-                                    if Vm[i_idx] != 1:
-                                        file.write(f" = Q{bus_id}_inj*(Kz_{group_name}*({V_mag}_{bus_id}/{Vm[i_idx]})^2 + Ki_{group_name}*({V_mag}_{bus_id}/{Vm[i_idx]}) + Kp_{group_name}) \n")
-                                    else:
-                                        file.write(f" = Q{bus_id}_inj*(Kz_{group_name}*({V_mag}_{bus_id})^2 + Ki_{group_name}*{V_mag}_{bus_id} + Kp_{group_name}) \n")
-                                    break
-                        elif converter_type == "rectangular":
-                            for group_name, data in zip_limits_data.items():
-                                if s_magnitude < data['max']:
-                                    Vm = np.array([row[7] for row in bus])
-                                    if Vm[i_idx] != 1:
-                                        file.write(f" = Q{bus_id}_inj*(Kz_{group_name}*(({e_var}_{bus_id}^2+{f_var}_{bus_id}^2)/{Vm[i_idx]}^2) + Ki_{group_name}*(sqrt({e_var}_{bus_id}^2+{f_var}_{bus_id}^2)/{Vm[i_idx]}) + Kp_{group_name}) \n")
-                                    else:
-                                        file.write(f" = Q{bus_id}_inj*(Kz_{group_name}*({e_var}_{bus_id}^2+{f_var}_{bus_id}^2) + Ki_{group_name}*sqrt({e_var}_{bus_id}^2+{f_var}_{bus_id}^2) + Kp_{group_name}) \n")
-                                    break
-                    else:
-                        if includeConsumptionCurves and bus_id in selected_pq_nodes:
-                            file.write(f" = Q{bus_id}_inj * k{bus_id}_load\n")
-                        else:
-                            file.write(f" = Q{bus_id}_inj\n")
-
-        # Loop over all PV nodes to write real power balance and voltage control
-        for i in pv_nodes:
-            if comment_equations:
-                file.write(f"\t\t// node {i} - PV\n\t\t")
-            i_idx = bus_id_map[i]
-
-            # Write real power balance equation for PV node
-            if converter_type == "polar":
-                file.write(f"{V_mag}_{i} * (")
-                terms = []
-                for j_idx in range(n):
-                    j = index_to_bus_id[j_idx]
-                    aY = abs(Y[i_idx][j_idx])
-                    if aY == 0:
-                        continue
-                    theta = np.angle(Y[i_idx][j_idx])
-                    theta_term = f" - {Y_angle}_{i}_{j}" if theta != 0 else ""
-                    term = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * cos({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                    terms.append(term)
-                file.write(" + ".join(terms))
-                file.write(f") ")
-            elif converter_type == "rectangular":
-                terms = []
-                for j_idx in range(n):
-                    j = index_to_bus_id[j_idx]
-                    if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                        continue
-                    term = f"{e_var}_{i}*({G_var}_{i}_{j} * {e_var}_{j} - {B_var}_{i}_{j} * {f_var}_{j}) + {f_var}_{i} * ({G_var}_{i}_{j} * {f_var}_{j} + {B_var}_{i}_{j} * {e_var}_{j})"
-                    terms.append(term)
-                file.write(" + ".join(terms))
-            elif converter_type == "complex":
-                expr = []
-                for j_idx in range(n):
-                    j_bus_id = index_to_bus_id[j_idx]
-                    if abs(Y[i_idx, j_idx]) > eps:  
-                        expr.append(f"{Y_cplx}_{i}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                current_expr = " + ".join(expr)
-                file.write(f"{v_cplx}_{i} * conj({current_expr}) + conj({v_cplx}_{i}) * ({current_expr}) ")
-                if P_inj[i_idx] == 0:
-                    file.write(" = 0\n")
-                else:
-                    if includeConsumptionCurves and i in selected_pv_nodes:
-                        file.write(f" = 2*P{i}_inj * k{i}_gen\n")
-                    else:
-                        file.write(f" = 2*P{i}_inj \n")
-            if converter_type != "complex":
-                if P_inj[i_idx] == 0:
-                    file.write(" = 0\n")
-                else:
-                    if includeConsumptionCurves and i in selected_pv_nodes:
-                        file.write(f" = P{i}_inj * k{i}_gen\n")
-                    else:
-                        file.write(f" = P{i}_inj \n")
-
-            # Voltage control for PV node (setpoint enforcement or reactive control under limits)
-            if include_limits:
-                file.write(f"\tif cGen{i}Reg:\n\t")
-
-            # Voltage equation
-            if converter_type == "polar":
-                file.write(f"\t\t{V_mag}_{i} = {V_mag}_{i}_sp \n")
-            elif converter_type == "rectangular":
-                file.write(f"\t\t{e_var}_{i}^2 + {f_var}_{i}^2 = V_{i}_sp^2 \n")
-            elif converter_type == "complex":
-                file.write(f"\t\t{v_cplx}_{i} * conj({v_cplx}_{i}) = V_{i}_sp^2 \n")
-
-            # Q equation
-            if include_limits:
-                file.write(f"\telse:\n")
-                terms = []
-                if converter_type == "polar":
-                    file.write(f"\t\t{V_mag}_{i} * (")
-                    for j_idx in range(n):
-                        j = index_to_bus_id[j_idx]
-                        aY = abs(Y[i_idx][j_idx])
-                        if aY == 0:
-                            continue
-                        theta = np.angle(Y[i_idx][j_idx])
-                        theta_term = f" - {Y_angle}_{i}_{j}" if theta != 0 else ""
-                        term = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * sin({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        terms.append(term)
-                    file.write(" + ".join(terms))
-                elif converter_type == "rectangular":
-                    file.write(f"\t\t(")
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                            continue
-                        term = (f"{f_var}_{i}*({G_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} - {B_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id}) - "
-                                f"{e_var}_{i}*({B_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} + {G_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id})")
-                        terms.append(term)
-                    file.write(" + ".join(terms))
-                elif converter_type == "complex":
-                    expr_inner = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        y_ij = Y[i_idx, j_idx]
-                        # Sign always plus, minus accounted for in Y matrix
-                        if abs(y_ij) > eps:
-                            if j_bus_id == i:
-                                expr_inner.append(f"+ {Y_cplx}_{i}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                            else:
-                                expr_inner.append(f"+ {Y_cplx}_{i}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                    inner_expr = " ".join(expr_inner)
-                    file.write(f"\t\t{v_cplx}_{i} * conj({inner_expr}) - conj({v_cplx}_{i}) * ({inner_expr}) ")
-                    if P_inj[i_idx] == 0:
-                        file.write(" = 0\n\tend\n")
-                    else:
-                        file.write(f" = 2i*Q{i}_inj \n\tend\n")
-                if converter_type != "complex":
-                    file.write(f") = Q{i}_inj \n")
-                    file.write("\tend\n")
-                
-        # Compute apparent power magnitude for each PV bus by injected
-        '''
-        S_mag_by_bus = {}
-        for bus_id in pv_nodes:
-            Pg = P_inj[bus_id_map[bus_id]] * baseMVA
-            Qg = Q_inj[bus_id_map[bus_id]] * baseMVA
-            S_mag_by_bus[bus_id] = np.sqrt(Pg**2 + Qg**2)
-            print("S", bus_id, " = ", S_mag_by_bus[bus_id], "\n")
-
-        # Group buses by power limits
-        group_to_buses = {name: [] for name in power_limits.keys()}
-        group_names_sorted = sorted(power_limits.items(), key=lambda x: x[1])
-
-        for bus_id, S in S_mag_by_bus.items():
-            for name, max_val in group_names_sorted:
-                if S <= max_val:
-                    group_to_buses[name].append(bus_id)
-                    break
-        '''
-
-        # Compute apparent power magnitude for each PV bus bu Qmax and Pmax in MATPOWER
-        pmax_by_bus = {}
-        for g in gen:
-            bus_id = int(g[0])
-            pmax = g[8]  # Column 9 (index 8) is Pmax in MW
-            qmax=g[3]
-            if bus_id in pmax_by_bus:
-                pmax_by_bus[bus_id] += (np.sqrt(pmax**2+qmax**2))
-            else:
-                pmax_by_bus[bus_id] = (np.sqrt(pmax**2+qmax**2))
-
-        # Group buses by their total Pmax and Qmax
-        group_to_buses = {name: [] for name in power_limits.keys()}
-        group_names_sorted = sorted(power_limits.items(), key=lambda x: x[1])
-
-        # Only iterate over PV nodes that have generation attached
-        for bus_id in pv_nodes:
-            if bus_id in pmax_by_bus:
-                pmax_val = pmax_by_bus[bus_id]
-                
-                # Find the correct group for this bus based on its Pmax
-                for name, max_val_config in group_names_sorted:
-                    if pmax_val <= max_val_config:
-                        group_to_buses[name].append(bus_id)
-                        break
-
-        # Voltage/reactive power limits for PV buses (if enabled)
-        if include_limits: 
-            if calcQOfPVGensInEachIteration:
-                # IterPostP for default reactive power calculation with limits
-                file.write(f"IterPostP:\n")
-                for group_name, bus_list in group_to_buses.items():
-                    if not bus_list:
-                        continue
-                    for i in bus_list:
-                        i_idx = bus_id_map[i]
-                        file.write(f"\tQ{i}_inj = ")
-                        if converter_type == "polar":
-                            file.write(f"{V_mag}_{i} * (")
-                            terms = []
-                            for j_idx in range(n):
-                                j = index_to_bus_id[j_idx]
-                                aY = abs(Y[i_idx][j_idx])
-                                if aY == 0:
-                                    continue
-                                theta = np.angle(Y[i_idx][j_idx])
-                                theta_term = f" - {Y_angle}_{i}_{j}" if theta != 0 else ""
-                                term = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * sin({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                                terms.append(term)
-                            file.write(" + ".join(terms))
-                            file.write(")\n")
-                        elif converter_type == "rectangular":
-                            terms = []
-                            for j_idx in range(n):
-                                j_bus_id = index_to_bus_id[j_idx]
-                                if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                                    continue
-                                term = (f"{f_var}_{i}*({G_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} - {B_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id}) - "
-                                        f"{e_var}_{i}*({B_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} + {G_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id})")
-                                terms.append(term)
-                            file.write(" + ".join(terms))
-                            file.write("\n")
-                        elif converter_type == "complex":
-                            terms = []
-                            for j_idx in range(n):
-                                j_bus_id = index_to_bus_id[j_idx]
-                                y_ij = Y[i_idx, j_idx]
-                                if abs(y_ij) > eps:
-                                    term = f"{Y_cplx}_{i}_{j_bus_id} * {v_cplx}_{j_bus_id}"
-                                    terms.append(term)
-                            inner_expr = " + ".join(terms)
-                            file.write(f"imag({v_cplx}_{i} * conj({inner_expr}))\n")
-
-            # Write constraints for limits in the model file
-            file.write("Limits:\n")
-            for group_name, bus_list in group_to_buses.items():
-                if not bus_list:
-                    continue
-
-                file.write(f"\tgroup [name=\"{group_name}\" enabled=true]:\n")
-                for i in bus_list:
-                    file.write(f"\t\tif cGen{i}Reg:\n")
-
-                    # Write reactive power in limits, not the default setting
-                    if not calcQOfPVGensInEachIteration:
-                        i_idx = bus_id_map[i]
-                        file.write(f"\t\t\tQ{i}_inj = ")
-                        if converter_type == "polar":
-                            file.write(f"{V_mag}_{i} * (")
-                            terms = []
-                            for j_idx in range(n):
-                                j = index_to_bus_id[j_idx]
-                                aY = abs(Y[i_idx][j_idx])
-                                if aY == 0:
-                                    continue
-                                theta = np.angle(Y[i_idx][j_idx])
-                                theta_term = f" - {Y_angle}_{i}_{j}" if theta != 0 else ""
-                                term = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * sin({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                                terms.append(term)
-                            file.write(" + ".join(terms))
-                            file.write(")\n")
-                        elif converter_type == "rectangular":
-                            terms = []
-                            for j_idx in range(n):
-                                j_bus_id = index_to_bus_id[j_idx]
-                                if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                                    continue
-                                term = (f"{f_var}_{i}*({G_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} - {B_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id}) - "
-                                        f"{e_var}_{i}*({B_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} + {G_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id})")
-                                terms.append(term)
-                            file.write(" + ".join(terms))
-                            file.write("\n")
-                        elif converter_type == "complex":
-                            terms = []
-                            for j_idx in range(n):
-                                j_bus_id = index_to_bus_id[j_idx]
-                                y_ij = Y[i_idx, j_idx]
-                                if abs(y_ij) > eps:
-                                    term = f"{Y_cplx}_{i}_{j_bus_id} * {v_cplx}_{j_bus_id}"
-                                    terms.append(term)                                
-                            inner_expr = " + ".join(terms)
-                            file.write(f"imag({v_cplx}_{i} * conj({inner_expr}))\n")
-                    # Check and enforce lower limit
-                    file.write(f"\t\t\tif Q{i}_inj<=Q{i}_inj_min [signal=TooLow]:\n")
-                    file.write(f"\t\t\t\t cGen{i}Reg=false\n")
-                    file.write(f"\t\t\t\t Q{i}_inj=Q{i}_inj_min\n")
-
-                    # Check and enforce upper limit
-                    file.write("\t\t\telse:\n")
-                    file.write(f"\t\t\t\tif Q{i}_inj>=Q{i}_inj_max [signal=TooHigh]:\n")
-                    file.write(f"\t\t\t\t\t cGen{i}Reg=false\n")
-                    file.write(f"\t\t\t\t\t Q{i}_inj=Q{i}_inj_max\n")
-
-                    file.write("\t\t\t\tend\n")
-                    file.write("\t\t\tend\n")
-                    file.write(f"\t\tend\n")
-                file.write(f"\tend\n")
-
-        # Add PostProc if complex domain to calculate Qinj
+        # Loop over all PQ nodes to write power balance equations, then over all PV nodes to write real power
+        # balance and voltage control, with the shared writers of the PF converter (block-parallel with --jobs)
+        eq_ctx = SimpleNamespace(converter_type=converter_type, injections=inj, bus_id_map=bus_id_map, bus=bus,
+                                 P_inj=P_inj, Q_inj=Q_inj, baseMVA=baseMVA, V_mag=V_mag, V_angle=V_angle, e_var=e_var,
+                                 f_var=f_var, v_cplx=v_cplx, comment_equations=comment_equations, include_limits=include_limits,
+                                 useSumOfCurrentsForZI=useSumOfCurrentsForZI, zip_coeff=zip_coeff, zip_limits_data=zip_limits_data,
+                                 zi_current_parts=True, load_curves=set(selected_pq_nodes if includeConsumptionCurves else ()),
+                                 gen_curves=set(selected_pv_nodes if includeConsumptionCurves else ()),
+                                 calcQOfPVGensInEachIteration=calcQOfPVGensInEachIteration, indent="\t\t")
+        write_node_equations(file, eq_ctx, pq_nodes, pv_nodes, args.jobs)
+
+        # Group the PV buses by their generation, then Q limits (if enabled) and PostProc of the SubModel
+        group_to_buses = group_pv_buses(gen, pv_nodes, power_limits)
+        write_q_limits(file, eq_ctx, group_to_buses)
         file.write("\tPostProc:\n")
-        if converter_type == "complex":
-            for group_name, bus_list in group_to_buses.items():
-                if not bus_list:
-                    continue
-                for i in bus_list:
-                    i_idx = bus_id_map[i]
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        y_ij = Y[i_idx, j_idx]
-                        if abs(y_ij) > eps:
-                            term = f"{Y_cplx}_{i}_{j_bus_id} * {v_cplx}_{j_bus_id}"
-                            terms.append(term)                                
-                    inner_expr = " + ".join(terms)
-                    file.write(f"\t\tQ{i}_inj = imag({v_cplx}_{i} * conj({inner_expr}))\n")
-            for bus_id in range(1, n + 1):
-                real_bus_id = index_to_bus_id[bus_id - 1]
-                # Format the string exactly as requested
-                line = f"\t\t@main.{v_cplx}_{real_bus_id}_meas = abs({v_cplx}_{real_bus_id}) + real(rnd(g_v))\n"
-                file.write(line)
-
-            for bus_id in pq_nodes:
-                i_idx = bus_id_map[bus_id]
-                if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(Y[i_idx, j_idx]) > eps:
-                            terms.append(f"{Y_cplx}_{bus_id}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                    current_sum_expr = " + ".join(terms)
-                    power_expression = f"{v_cplx}_{bus_id} * conj({current_sum_expr})"
-                    file.write(f"\t\t@main.S{bus_id}_meas = {power_expression} + rnd(g_inj)\n")
-
-            for bus_id in pv_nodes:
-                i_idx = bus_id_map[bus_id]
-                if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(Y[i_idx, j_idx]) > eps:
-                            terms.append(f"{Y_cplx}_{bus_id}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                    current_sum_expr = " + ".join(terms)
-                    power_expression = f"{v_cplx}_{bus_id} * conj({current_sum_expr})"
-                    file.write(f"\t\t@main.P{bus_id}_meas = real({power_expression}) + real(rnd(g_inj))\n")
-
-            for bus in random_branches:
-                file.write(f"\t\t@main.S_{bus[0]}_{bus[1]}_meas = {v_cplx}_{bus[0]} * conj({v_cplx}_{bus[0]} - {v_cplx}_{bus[1]}) * conj(-{Y_cplx}_{bus[0]}_{bus[1]}) + rnd(g_br)\n")
-            #file.write("\n") # Add a newline for spacing
-        elif converter_type == "polar":
-            for bus_id in range(1, n + 1):
-                    real_bus_id = index_to_bus_id[bus_id - 1]
-                    # Format the string exactly as requested
-                    line = f"\t\t@main.{V_mag}_{real_bus_id}_meas = {V_mag}_{real_bus_id} + rnd(g_v)\n"
-                    file.write(line)
-            for i in pq_nodes:
-                i_idx = bus_id_map[i]
-                if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                    terms = []
-                    terms1 = []
-                    for j_idx in range(n):
-                        j = index_to_bus_id[j_idx]
-                        aY = abs(Y[i_idx][j_idx])
-                        if aY == 0:
-                            continue
-                        theta = np.angle(Y[i_idx][j_idx])
-                        theta_term = f" - {Y_angle}_{i}_{j}" if theta != 0 else ""
-                        term = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * sin({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        term1 = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * cos({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        terms.append(term)
-                        terms1.append(term1)
-                    sum_expression = " + ".join(terms)
-                    sum_expression1 = " + ".join(terms1)
-                    file.write(f"\t\t@main.Q{i}_meas = {V_mag}_{i} * ({sum_expression}) + rnd(g_inj)\n")
-                    file.write(f"\t\t@main.P{i}_meas = {V_mag}_{i} * ({sum_expression1}) + rnd(g_inj)\n")
-            for i in pv_nodes:
-                i_idx = bus_id_map[i]
-                if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                    terms = []
-                    terms1 = []
-                    for j_idx in range(n):
-                        j = index_to_bus_id[j_idx]
-                        aY = abs(Y[i_idx][j_idx])
-                        if aY == 0:
-                            continue
-                        theta = np.angle(Y[i_idx][j_idx])
-                        theta_term = f" - {Y_angle}_{i}_{j}" if theta != 0 else ""
-                        term = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * sin({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        term1 = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * cos({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        terms.append(term)
-                        terms1.append(term1)
-                    sum_expression = " + ".join(terms)
-                    sum_expression1 = " + ".join(terms1)
-                    #file.write(f"\t\t@main.Q{i}_meas = {V_mag}_{i} * ({sum_expression}) + rnd(g_inj)\n")
-                    file.write(f"\t\t@main.P{i}_meas = {V_mag}_{i} * ({sum_expression1}) + rnd(g_inj)\n")
-            for bus in random_branches:
-                p_formula = (f"{V_mag}_{bus[0]}^2 * {Y_mag}_{bus[0]}_{bus[0]} * cos ({Y_angle}_{bus[0]}_{bus[0]}) - {V_mag}_{bus[0]} * {Y_mag}_{bus[0]}_{bus[1]} * {V_mag}_{bus[1]} * cos ({V_angle}_{bus[0]} - {Y_angle}_{bus[0]}_{bus[1]} - {V_angle}_{bus[1]})")
-                q_formula = (f"- {V_mag}_{bus[0]}^2 * {Y_mag}_{bus[0]}_{bus[0]} * sin ({Y_angle}_{bus[0]}_{bus[0]}) - {V_mag}_{bus[0]} * {Y_mag}_{bus[0]}_{bus[1]} * {V_mag}_{bus[1]} * sin ({V_angle}_{bus[0]} - {Y_angle}_{bus[0]}_{bus[1]} - {V_angle}_{bus[1]})")
-                file.write(f"\t\t@main.P_{bus[0]}_{bus[1]}_meas = {p_formula} + rnd(g_br)\n")
-                file.write(f"\t\t@main.Q_{bus[0]}_{bus[1]}_meas = {q_formula} + rnd(g_br)\n")
-        elif converter_type == "rectangular":
-            for bus_id in range(1, n + 1):
-                    real_bus_id = index_to_bus_id[bus_id - 1]
-                    # Format the string exactly as requested
-                    line = f"\t\t@main.{V_mag}_{real_bus_id}_meas = sqrt({e_var}_{real_bus_id}^2 + {f_var}_{real_bus_id}^2) + rnd(g_v)\n"
-                    file.write(line)
-            for bus_id in pq_nodes:
-                i_idx = bus_id_map[bus_id]
-                if P_inj[i_idx] == 0 and Q_inj[i_idx] == 0:
-                    continue
-                p_terms = []
-                q_terms = []
-                for j_idx in range(n):
-                    j_bus_id = index_to_bus_id[j_idx]
-                    if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                        continue
-                    p_term = f"{e_var}_{bus_id} * ({G_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}) + {f_var}_{bus_id} * ({B_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id})"
-                    p_terms.append(p_term)
-                    q_term = f"{f_var}_{bus_id} * ({G_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}) - {e_var}_{bus_id} * ({B_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id})"
-                    q_terms.append(q_term)
-                p_sum_expression = " + ".join(p_terms)
-                file.write(f"\t\t@main.P{bus_id}_meas = {p_sum_expression} + rnd(g_inj)\n")
-                q_sum_expression = " + ".join(q_terms)
-                file.write(f"\t\t@main.Q{bus_id}_meas = {q_sum_expression} + rnd(g_inj)\n")
-                # Loop over the PV nodes to write P and Q equations in rectangular coorinates
-            for i in pv_nodes:
-                i_idx = bus_id_map[i]
-                p_terms = []
-                q_terms = []
-                for j_idx in range(n):
-                    j_bus_id = index_to_bus_id[j_idx]
-                    if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                        continue
-                    p_term = f"{e_var}_{i}*({G_var}_{i}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{i}_{j_bus_id} * {f_var}_{j_bus_id}) + {f_var}_{i}*({B_var}_{i}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{i}_{j_bus_id} * {f_var}_{j_bus_id})"
-                    p_terms.append(p_term)
-                    q_term = f"{f_var}_{i}*({G_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} - {B_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id}) - {e_var}_{i}*({B_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} + {G_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id})"
-                    q_terms.append(q_term)
-                p_sum_expression = " + ".join(p_terms)
-                file.write(f"\t\t@main.P{i}_meas = {p_sum_expression} + rnd(g_inj)\n")
-                q_sum_expression = " + ".join(q_terms)
-                #file.write(f"\t\t@main.Q{i}_meas = {q_sum_expression} + real(rnd(g_inj))\n")
-            for bus in random_branches:
-                p_formula = (f"({e_var}_{bus[0]}^2 + {f_var}_{bus[0]}^2) * {G_var}_{bus[0]}_{bus[0]} - "
-                    f"({e_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]} + {B_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]}) + "
-                    f"{f_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]} - {B_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]}))")
-                q_formula = ( f"-({e_var}_{bus[0]}^2 + {f_var}_{bus[0]}^2) * {B_var}_{bus[0]}_{bus[0]} - "
-                    f"({f_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]} + {B_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]}) - "
-                    f"{e_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]} - {B_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]}))")
-                file.write(f"\t\t@main.P_{bus[0]}_{bus[1]}_meas = {p_formula} + rnd(g_br)\n")
-                file.write(f"\t\t@main.Q_{bus[0]}_{bus[1]}_meas = {q_formula} + rnd(g_br)\n")
+        write_q_postproc(file, eq_ctx, group_to_buses)
+        file.variant(write_measurement_generation)
         file.write("end\n")
         # ---------------------------------------------> END OF SUBMODEL
+        file.skip(False)
         file.write("WLSEs:\n")
         if converter_type == "complex":
             # Writing wls eqs
             for bus_id in slack:
                 file.write(f"\t[w=w_v] {v_cplx}_{bus_id} = {v_cplx}_{bus_id}_sl\n")       
                 file.write(f"\t[w=w_v] conj({v_cplx}_{bus_id}) = conj({v_cplx}_{bus_id}_sl)\n") 
-            for bus_id in range(1, n + 1):
-                    real_bus_id = index_to_bus_id[bus_id - 1]
-                    # Format the string exactly as requested
-                    if real_bus_id not in slack:
-                        line = f"\t[w=w_v] {v_cplx}_{real_bus_id}*conj({v_cplx}_{real_bus_id}) = {v_cplx}_{real_bus_id}_meas^2\n"
-                        file.write(line)
-            for bus_id in pv_nodes:
-                    i_idx = bus_id_map[bus_id]
-                    if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                        terms = []
-                        for j_idx in range(n):
-                            j_bus_id = index_to_bus_id[j_idx]
-                            if abs(Y[i_idx, j_idx]) > eps:
-                                terms.append(f"{Y_cplx}_{bus_id}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                        current_sum_expr = " + ".join(terms)
-                        power_expression = f"{v_cplx}_{bus_id} * conj({current_sum_expr})"
-                        power_expression1 = f"conj({v_cplx}_{bus_id}) * ({current_sum_expr})"
-                        file.write(f"\t[w=w_inj] {power_expression} + {power_expression1} = 2 * P{bus_id}_meas\n")
-            for bus_id in pq_nodes:
-                    i_idx = bus_id_map[bus_id]
-                    if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                        terms = []
-                        for j_idx in range(n):
-                            j_bus_id = index_to_bus_id[j_idx]
-                            if abs(Y[i_idx, j_idx]) > eps:
-                                terms.append(f"{Y_cplx}_{bus_id}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                        current_sum_expr = " + ".join(terms)
-                        power_expression = f"{v_cplx}_{bus_id} * conj({current_sum_expr})"
-                        file.write(f"\t[w=w_inj] {power_expression} = S{bus_id}_meas\n")
-                        power_expression1 = f"conj({v_cplx}_{bus_id}) * ({current_sum_expr})"
-                        file.write(f"\t[w=w_inj] {power_expression1} = conj(S{bus_id}_meas)\n")
-            for bus in random_branches:
-                file.write(f"\t[w=w_br] {v_cplx}_{bus[0]} * conj({v_cplx}_{bus[0]} - {v_cplx}_{bus[1]}) * conj(-{Y_cplx}_{bus[0]}_{bus[1]}) = S_{bus[0]}_{bus[1]}_meas\n")
-                file.write(f"\t[w=w_br] conj({v_cplx}_{bus[0]}) * ({v_cplx}_{bus[0]} - {v_cplx}_{bus[1]}) * (-{Y_cplx}_{bus[0]}_{bus[1]}) = conj(S_{bus[0]}_{bus[1]}_meas)\n")
-            if estimation_method == "NE":
+        elif converter_type == "polar":
+            for bus_id in slack:
+                file.write(f"\t[w=w_v] {V_mag}_{bus_id} = {V_mag}_{bus_id}_sl\n")       
+                file.write(f"\t[w=w_v] {V_angle}_{bus_id} = {V_angle}_{bus_id}_sl\n") 
+        elif converter_type == "rectangular":
+            for bus_id in slack:
+                file.write(f"\t[w=w_v] {e_var}_{bus_id} = {e_var}_{bus_id}_sl\n")       
+                file.write(f"\t[w=w_v] {f_var}_{bus_id} = {f_var}_{bus_id}_sl\n") 
+        file.variant(write_measurement_equations)
+        if estimation_method == "NE":
+            if converter_type == "complex":
                 for bus_id in pq_nodes:
                     i_idx = bus_id_map[bus_id]
                     if P_inj[i_idx]==0 and Q_inj[i_idx]==0: #sum of currents
-                            terms = []
-                            for j_idx in range(n):
-                                j_bus_id = index_to_bus_id[j_idx]
-                                if abs(Y[i_idx][j_idx]) < eps:
-                                    continue
-                                terms.append(f"{Y_cplx}_{bus_id}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                            current_summation = " + ".join(terms)
+                            current_summation = inj.sum("current", bus_id)
                             file.write(f"\t[w=w_zi] {current_summation} = 0\n")
                             file.write(f"\t[w=w_zi] conj({current_summation}) = 0\n")
-        elif converter_type == "polar":
-            for bus_id in slack:
-                file.write(f"\t[w=w_v] {V_mag}_{bus_id} = {V_mag}_{bus_id}_sl\n")       
-                file.write(f"\t[w=w_v] {V_angle}_{bus_id} = {V_angle}_{bus_id}_sl\n") 
-            for bus_id in range(1, n + 1):
-                    real_bus_id = index_to_bus_id[bus_id - 1]
-                    if real_bus_id not in slack:
-                        line = f"\t[w=w_v] {V_mag}_{real_bus_id} = {V_mag}_{real_bus_id}_meas\n"
-                        file.write(line)
-            for i in pv_nodes:
-                i_idx = bus_id_map[i]
-                if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                    terms = []
-                    terms1 = []
-                    for j_idx in range(n):
-                        j = index_to_bus_id[j_idx]
-                        aY = abs(Y[i_idx][j_idx])
-                        if aY == 0:
-                            continue
-                        theta = np.angle(Y[i_idx][j_idx])
-                        theta_term = f" - {Y_angle}_{i}_{j}" if theta != 0 else ""
-                        term = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * sin({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        term1 = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * cos({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        terms.append(term)
-                        terms1.append(term1)
-                    sum_expression = " + ".join(terms)
-                    sum_expression1 = " + ".join(terms1)
-                    #file.write(f"\t\t@main.Q{i}_meas = {V_mag}_{i} * ({sum_expression}) + rnd(g_inj)\n")
-                    file.write(f"\t[w=w_inj] {V_mag}_{i} * ({sum_expression1}) = P{i}_meas\n")
-            for i in pq_nodes:
-                i_idx = bus_id_map[i]
-                if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                    terms = []
-                    terms1 = []
-                    for j_idx in range(n):
-                        j = index_to_bus_id[j_idx]
-                        aY = abs(Y[i_idx][j_idx])
-                        if aY == 0:
-                            continue
-                        theta = np.angle(Y[i_idx][j_idx])
-                        theta_term = f" - {Y_angle}_{i}_{j}" if theta != 0 else ""
-                        term = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * sin({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        term1 = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * cos({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        terms.append(term)
-                        terms1.append(term1)
-                    sum_expression = " + ".join(terms)
-                    sum_expression1 = " + ".join(terms1)
-                    file.write(f"\t[w=w_inj] {V_mag}_{i} * ({sum_expression}) = Q{i}_meas\n")
-                    file.write(f"\t[w=w_inj] {V_mag}_{i} * ({sum_expression1}) = P{i}_meas\n")
-            for bus in random_branches:
-                p_formula = (f"{V_mag}_{bus[0]}^2 * {Y_mag}_{bus[0]}_{bus[0]} * cos ({Y_angle}_{bus[0]}_{bus[0]}) - {V_mag}_{bus[0]} * {Y_mag}_{bus[0]}_{bus[1]} * {V_mag}_{bus[1]} * cos ({V_angle}_{bus[0]} - {Y_angle}_{bus[0]}_{bus[1]} -{V_angle}_{bus[1]})")
-                q_formula = (f"- {V_mag}_{bus[0]}^2 * {Y_mag}_{bus[0]}_{bus[0]} * sin ({Y_angle}_{bus[0]}_{bus[0]}) - {V_mag}_{bus[0]} * {Y_mag}_{bus[0]}_{bus[1]} * {V_mag}_{bus[1]} * sin ({V_angle}_{bus[0]} - {Y_angle}_{bus[0]}_{bus[1]} -{V_angle}_{bus[1]})")
-                file.write(f"\t[w=w_br] {p_formula} = P_{bus[0]}_{bus[1]}_meas\n")
-                file.write(f"\t[w=w_br] {q_formula} = Q_{bus[0]}_{bus[1]}_meas\n")
-            if estimation_method == "NE":
+            elif converter_type == "polar":
                 for bus_id in pq_nodes:
                     i_idx = bus_id_map[bus_id]
                     if P_inj[i_idx]==0 and Q_inj[i_idx]==0: #sum of currents
-                        real_current_terms = []
-                        imag_current_terms = []
-                        for j_idx in range(n):
-                            j_bus_id = index_to_bus_id[j_idx]
-                            aY = abs(Y[i_idx][j_idx])
-                            if aY == 0:
-                                continue
-                            theta = np.angle(Y[i_idx][j_idx])
-                            theta_term = f" + {Y_angle}_{bus_id}_{j_bus_id}" if theta != 0 else ""
-                            real_term = f"{Y_mag}_{bus_id}_{j_bus_id} * {V_mag}_{j_bus_id} * cos({V_angle}_{j_bus_id}{theta_term})"
-                            real_current_terms.append(real_term)
-                            imag_term = f"{Y_mag}_{bus_id}_{j_bus_id} * {V_mag}_{j_bus_id} * sin({V_angle}_{j_bus_id}{theta_term})"
-                            imag_current_terms.append(imag_term)
-                        real_sum = " + ".join(real_current_terms)
+                        real_sum = inj.sum("re_polar", bus_id)
                         file.write(f"\t[w=w_zi] {real_sum} = 0\n")
-                        imag_sum = " + ".join(imag_current_terms)
+                        imag_sum = inj.sum("im_polar", bus_id)
                         file.write(f"\t[w=w_zi] {imag_sum} = 0\n")
-        elif converter_type == "rectangular":
-            for bus_id in slack:
-                file.write(f"\t[w=w_v] {e_var}_{bus_id} = {e_var}_{bus_id}_sl\n")       
-                file.write(f"\t[w=w_v] {f_var}_{bus_id} = {f_var}_{bus_id}_sl\n") 
-            for bus_id in range(1, n + 1):
-                    real_bus_id = index_to_bus_id[bus_id - 1]
-                    if real_bus_id not in slack:
-                        line = f"\t[w=w_v] {e_var}_{real_bus_id}^2 + {f_var}_{real_bus_id}^2 = {V_mag}_{real_bus_id}_meas^2\n"
-                        file.write(line)
-            for i in pv_nodes:
-                i_idx = bus_id_map[i]
-                p_terms = []
-                q_terms = []
-                for j_idx in range(n):
-                    j_bus_id = index_to_bus_id[j_idx]
-                    if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                        continue
-                    p_term = f"{e_var}_{i}*({G_var}_{i}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{i}_{j_bus_id} * {f_var}_{j_bus_id}) + {f_var}_{i}*({B_var}_{i}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{i}_{j_bus_id} * {f_var}_{j_bus_id})"
-                    p_terms.append(p_term)
-                    q_term = f"{f_var}_{i}*({G_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} - {B_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id}) - {e_var}_{i}*({B_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} + {G_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id})"
-                    q_terms.append(q_term)
-                p_sum_expression = " + ".join(p_terms)
-                file.write(f"\t[w=w_inj] {p_sum_expression} = P{i}_meas\n")
-                q_sum_expression = " + ".join(q_terms)
-                #file.write(f"\t\t@main.Q{i}_meas = {q_sum_expression} + real(rnd(g_inj))\n")
-            for bus_id in pq_nodes:
-                i_idx = bus_id_map[bus_id]
-                if P_inj[i_idx] == 0 and Q_inj[i_idx] == 0:
-                    continue
-                p_terms = []
-                q_terms = []
-                for j_idx in range(n):
-                    j_bus_id = index_to_bus_id[j_idx]
-                    if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                        continue
-                    p_term = f"{e_var}_{bus_id} * ({G_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}) + {f_var}_{bus_id} * ({B_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id})"
-                    p_terms.append(p_term)
-                    q_term = f"{f_var}_{bus_id} * ({G_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}) - {e_var}_{bus_id} * ({B_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id})"
-                    q_terms.append(q_term)
-                p_sum_expression = " + ".join(p_terms)
-                file.write(f"\t[w=w_inj] {p_sum_expression} = P{bus_id}_meas\n")
-                q_sum_expression = " + ".join(q_terms)
-                file.write(f"\t[w=w_inj] {q_sum_expression} = Q{bus_id}_meas\n")
-            for bus in random_branches:
-                p_formula = (f"({e_var}_{bus[0]}^2 + {f_var}_{bus[0]}^2) * {G_var}_{bus[0]}_{bus[0]} - "
-                    f"({e_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]} + {B_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]}) + "
-                    f"{f_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]} - {B_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]}))")
-                q_formula = ( f"-({e_var}_{bus[0]}^2 + {f_var}_{bus[0]}^2) * {B_var}_{bus[0]}_{bus[0]} - "
-                    f"({f_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]} + {B_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]}) - "
-                    f"{e_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]} - {B_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]}))")
-                file.write(f"\t[w=w_br] {p_formula} = P_{bus[0]}_{bus[1]}_meas\n")
-                file.write(f"\t[w=w_br] {q_formula} = Q_{bus[0]}_{bus[1]}_meas\n")
-            if estimation_method == "NE":
+            elif converter_type == "rectangular":
                 for bus_id in pq_nodes:
                     i_idx = bus_id_map[bus_id]
                     if P_inj[i_idx]==0 and Q_inj[i_idx]==0: #sum of currents
-                        real_terms = []
-                        imag_terms = []
-                        for j_idx in range(n):
-                            j_bus_id = index_to_bus_id[j_idx]
-                            if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                                continue
-                            real_term = f"{G_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}"
-                            real_terms.append(real_term)
-                            imag_term = f"{B_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}"
-                            imag_terms.append(imag_term)
-                        real_sum_expression = " + ".join(real_terms)
+                        real_sum_expression = inj.sum("re_rect", bus_id)
                         file.write(f"\t[w=w_zi] {real_sum_expression} = 0 \n")
-                        imag_sum_expression = " + ".join(imag_terms)
+                        imag_sum_expression = inj.sum("im_rect", bus_id)
                         file.write( f"\t[w=w_zi] {imag_sum_expression} = 0 \n")
+            for bus_id in inj.current_buses:
+                for lhs, rhs in inj.current_definitions(bus_id):
+                    file.write(f"\t[w=w_zi] {lhs} = {rhs}\n")
         if estimation_method == "EC":
             file.write("ECs:\n")
             if converter_type == "complex":
                 for bus_id in pq_nodes:
                     i_idx = bus_id_map[bus_id]
                     if P_inj[i_idx]==0 and Q_inj[i_idx]==0: #sum of currents
-                            terms = []
-                            for j_idx in range(n):
-                                j_bus_id = index_to_bus_id[j_idx]
-                                if abs(Y[i_idx][j_idx]) < eps:
-                                    continue
-                                terms.append(f"{Y_cplx}_{bus_id}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                            current_summation = " + ".join(terms)
+                            current_summation = inj.sum("current", bus_id)
                             file.write(f"\t{current_summation} = 0\n")
                             file.write(f"\tconj({current_summation}) = 0\n")
             elif converter_type == "polar":
                 for bus_id in pq_nodes:
                     i_idx = bus_id_map[bus_id]
                     if P_inj[i_idx]==0 and Q_inj[i_idx]==0: #sum of currents
-                        real_current_terms = []
-                        imag_current_terms = []
-                        for j_idx in range(n):
-                            j_bus_id = index_to_bus_id[j_idx]
-                            aY = abs(Y[i_idx][j_idx])
-                            if aY == 0:
-                                continue
-                            theta = np.angle(Y[i_idx][j_idx])
-                            theta_term = f" + {Y_angle}_{bus_id}_{j_bus_id}" if theta != 0 else ""
-                            real_term = f"{Y_mag}_{bus_id}_{j_bus_id} * {V_mag}_{j_bus_id} * cos({V_angle}_{j_bus_id}{theta_term})"
-                            real_current_terms.append(real_term)
-                            imag_term = f"{Y_mag}_{bus_id}_{j_bus_id} * {V_mag}_{j_bus_id} * sin({V_angle}_{j_bus_id}{theta_term})"
-                            imag_current_terms.append(imag_term)
-                        real_sum = " + ".join(real_current_terms)
+                        real_sum = inj.sum("re_polar", bus_id)
                         file.write(f"\t{real_sum} = 0\n")
-                        imag_sum = " + ".join(imag_current_terms)
+                        imag_sum = inj.sum("im_polar", bus_id)
                         file.write(f"\t{imag_sum} = 0\n")
             elif converter_type == "rectangular":
                 for bus_id in pq_nodes:
                     i_idx = bus_id_map[bus_id]
                     if P_inj[i_idx]==0 and Q_inj[i_idx]==0: #sum of currents
-                        real_terms = []
-                        imag_terms = []
-                        for j_idx in range(n):
-                            j_bus_id = index_to_bus_id[j_idx]
-                            if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                                continue
-                            real_term = f"{G_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}"
-                            real_terms.append(real_term)
-                            imag_term = f"{B_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}"
-                            imag_terms.append(imag_term)
-                        real_sum_expression = " + ".join(real_terms)
+                        real_sum_expression = inj.sum("re_rect", bus_id)
                         file.write(f"\t{real_sum_expression} = 0 \n")
-                        imag_sum_expression = " + ".join(imag_terms)
+                        imag_sum_expression = inj.sum("im_rect", bus_id)
                         file.write( f"\t{imag_sum_expression} = 0 \n")
+            for bus_id in inj.current_buses:
+                for lhs, rhs in inj.current_definitions(bus_id):
+                    file.write(f"\t{lhs} = {rhs}\n")
 
         file.write("PostProc:\n")
         if converter_type == "complex":
             for bus_id in pq_nodes:
                 i_idx = bus_id_map[bus_id]
                 if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(Y[i_idx, j_idx]) > eps:
-                            terms.append(f"{Y_cplx}_{bus_id}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                    current_sum_expr = " + ".join(terms)
+                    current_sum_expr = inj.current(bus_id)
                     power_expression = f"{v_cplx}_{bus_id} * conj({current_sum_expr})"
                     file.write(f"\tS{bus_id}_est = {power_expression}\n")
             for bus_id in pv_nodes:
                 i_idx = bus_id_map[bus_id]
                 if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                    terms = []
-                    for j_idx in range(n):
-                        j_bus_id = index_to_bus_id[j_idx]
-                        if abs(Y[i_idx, j_idx]) > eps:
-                            terms.append(f"{Y_cplx}_{bus_id}_{j_bus_id} * {v_cplx}_{j_bus_id}")
-                    current_sum_expr = " + ".join(terms)
+                    current_sum_expr = inj.current(bus_id)
                     power_expression = f"{v_cplx}_{bus_id} * conj({current_sum_expr})"
                     file.write(f"\tP{bus_id}_est = real({power_expression})\n")
                     file.write(f"\tQ{bus_id}_est = imag({power_expression})\n")
-            for bus in random_branches:
-                file.write(f"\tS_{bus[0]}_{bus[1]}_est = {v_cplx}_{bus[0]} * conj({v_cplx}_{bus[0]} - {v_cplx}_{bus[1]}) * conj(-{Y_cplx}_{bus[0]}_{bus[1]})\n")
         elif converter_type == "polar":
             for i in pv_nodes:
                 i_idx = bus_id_map[i]
                 if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                    terms = []
-                    terms1 = []
-                    for j_idx in range(n):
-                        j = index_to_bus_id[j_idx]
-                        aY = abs(Y[i_idx][j_idx])
-                        if aY == 0:
-                            continue
-                        theta = np.angle(Y[i_idx][j_idx])
-                        theta_term = f" - {Y_angle}_{i}_{j}" if theta != 0 else ""
-                        term = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * sin({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        term1 = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * cos({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        terms.append(term)
-                        terms1.append(term1)
-                    sum_expression = " + ".join(terms)
-                    sum_expression1 = " + ".join(terms1)
+                    sum_expression = inj.power("q_polar", i)
+                    sum_expression1 = inj.power("p_polar", i)
                     file.write(f"\tQ{i}_est = {V_mag}_{i} * ({sum_expression})\n")
                     file.write(f"\tP{i}_est = {V_mag}_{i} * ({sum_expression1})\n")
             for i in pq_nodes:
                 i_idx = bus_id_map[i]
                 if P_inj[i_idx]!=0 or Q_inj[i_idx]!=0:
-                    terms = []
-                    terms1 = []
-                    for j_idx in range(n):
-                        j = index_to_bus_id[j_idx]
-                        aY = abs(Y[i_idx][j_idx])
-                        if aY == 0:
-                            continue
-                        theta = np.angle(Y[i_idx][j_idx])
-                        theta_term = f" - {Y_angle}_{i}_{j}" if theta != 0 else ""
-                        term = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * sin({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        term1 = f"{Y_mag}_{i}_{j} * {V_mag}_{j} * cos({V_angle}_{i}{theta_term} - {V_angle}_{j})"
-                        terms.append(term)
-                        terms1.append(term1)
-                    sum_expression = " + ".join(terms)
-                    sum_expression1 = " + ".join(terms1)
+                    sum_expression = inj.power("q_polar", i)
+                    sum_expression1 = inj.power("p_polar", i)
                     file.write(f"\tQ{i}_est = {V_mag}_{i} * ({sum_expression})\n")
                     file.write(f"\tP{i}_est = {V_mag}_{i} * ({sum_expression1})\n")
-            for bus in random_branches:
-                p_formula = (f"{V_mag}_{bus[0]}^2 * {Y_mag}_{bus[0]}_{bus[0]} * cos ({Y_angle}_{bus[0]}_{bus[0]}) - {V_mag}_{bus[0]} * {Y_mag}_{bus[0]}_{bus[1]} * {V_mag}_{bus[1]} * cos ({V_angle}_{bus[0]} - {Y_angle}_{bus[0]}_{bus[1]} -{V_angle}_{bus[1]})")
-                q_formula = (f"- {V_mag}_{bus[0]}^2 * {Y_mag}_{bus[0]}_{bus[0]} * sin ({Y_angle}_{bus[0]}_{bus[0]}) - {V_mag}_{bus[0]} * {Y_mag}_{bus[0]}_{bus[1]} * {V_mag}_{bus[1]} * sin ({V_angle}_{bus[0]} - {Y_angle}_{bus[0]}_{bus[1]} -{V_angle}_{bus[1]})")
-                file.write(f"\tP_{bus[0]}_{bus[1]}_est = {p_formula}\n")
-                file.write(f"\tQ_{bus[0]}_{bus[1]}_est = {q_formula}\n")       
         elif converter_type == "rectangular":
             for i in pv_nodes:
                 i_idx = bus_id_map[i]
-                p_terms = []
-                q_terms = []
-                for j_idx in range(n):
-                    j_bus_id = index_to_bus_id[j_idx]
-                    if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                        continue
-                    p_term = f"{e_var}_{i}*({G_var}_{i}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{i}_{j_bus_id} * {f_var}_{j_bus_id}) + {f_var}_{i}*({B_var}_{i}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{i}_{j_bus_id} * {f_var}_{j_bus_id})"
-                    p_terms.append(p_term)
-                    q_term = f"{f_var}_{i}*({G_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} - {B_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id}) - {e_var}_{i}*({B_var}_{i}_{j_bus_id}*{e_var}_{j_bus_id} + {G_var}_{i}_{j_bus_id}*{f_var}_{j_bus_id})"
-                    q_terms.append(q_term)
-                p_sum_expression = " + ".join(p_terms)
+                p_sum_expression = inj.power("p_rect_pv", i)
                 file.write(f"\tP{i}_est = {p_sum_expression}\n")
-                q_sum_expression = " + ".join(q_terms)
+                q_sum_expression = inj.power("q_rect_pv", i)
                 file.write(f"\tQ{i}_est = {q_sum_expression}\n")
             for bus_id in pq_nodes:
                 i_idx = bus_id_map[bus_id]
                 if P_inj[i_idx] == 0 and Q_inj[i_idx] == 0:
                     continue
-                p_terms = []
-                q_terms = []
-                for j_idx in range(n):
-                    j_bus_id = index_to_bus_id[j_idx]
-                    if abs(G[i_idx][j_idx]) < eps and abs(B[i_idx][j_idx]) < eps:
-                        continue
-                    p_term = f"{e_var}_{bus_id} * ({G_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}) + {f_var}_{bus_id} * ({B_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id})"
-                    p_terms.append(p_term)
-                    q_term = f"{f_var}_{bus_id} * ({G_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} - {B_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id}) - {e_var}_{bus_id} * ({B_var}_{bus_id}_{j_bus_id} * {e_var}_{j_bus_id} + {G_var}_{bus_id}_{j_bus_id} * {f_var}_{j_bus_id})"
-                    q_terms.append(q_term)
-                p_sum_expression = " + ".join(p_terms)
+                p_sum_expression = inj.power("p_rect", bus_id)
                 file.write(f"\tP{bus_id}_est = {p_sum_expression}\n")
-                q_sum_expression = " + ".join(q_terms)
+                q_sum_expression = inj.power("q_rect", bus_id)
                 file.write(f"\tQ{bus_id}_est = {q_sum_expression}\n")
-            for bus in random_branches:
-                p_formula = (f"({e_var}_{bus[0]}^2 + {f_var}_{bus[0]}^2) * {G_var}_{bus[0]}_{bus[0]} - "
-                    f"({e_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]} + {B_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]}) + "
-                    f"{f_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]} - {B_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]}))")
-                q_formula = ( f"-({e_var}_{bus[0]}^2 + {f_var}_{bus[0]}^2) * {B_var}_{bus[0]}_{bus[0]} - "
-                    f"({f_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]} + {B_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]}) - "
-                    f"{e_var}_{bus[0]}*({G_var}_{bus[0]}_{bus[1]}*{f_var}_{bus[1]} - {B_var}_{bus[0]}_{bus[1]}*{e_var}_{bus[1]}))")
-                file.write(f"\tP_{bus[0]}_{bus[1]}_est = {p_formula}\n")
-                file.write(f"\tQ_{bus[0]}_{bus[1]}_est = {q_formula}\n")
+        file.variant(write_branch_estimates)
         file.write("end\n")
 
+    file.freeze()
+    if args.batch > 0:
+        write_batch(file, ctx, seed, args.batch, args.jobs, dmodl_output_path, ensure_observable, args.compress)
+    else:
+        model_path = model_file(dmodl_output_path, args.compress)
+        write_path = update_path(model_path, args.update)
+        with open_output(write_path, args.compress) as out, EmissionStats(out, budgets) as f:
+            file.render(f, ctx, meas)
+        report_emission(f, dmodl_output_path + "_stats.json" if args.stats else None, case=matpower_input_path,
+                        converter_type=converter_type, estimation_method=estimation_method)
+        if args.compress:
+            print(f"  > Compressed ({args.compress}): {describe_compression(write_path, f.total_bytes)}")
+        if write_path != model_path:
+            print(f"  > {finish_update(model_path, write_path).summary}")
+        write_measurement_spec(model_path, ctx, meas)
+    if args.compact:
+        save_name_map(dmodl_output_path + "_names.json", case, renamed,
+                      None if args.batch > 0 else os.path.basename(model_file(dmodl_output_path, args.compress)))
+        print(f"  > Name map written to: {dmodl_output_path}_names.json")
+
     print("\nConversion successful!")
     print(f"Output written to: {dmodl_output_path}")
 
@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from core import SymbolIndex, ModelCache, open_model, model_stem
+
+# Measurement generation on the Python side for SE models converted with
+# <measurementNoise>python</measurementNoise>.
+#
+# Such models have no power flow SubModel and no rnd() generators: measurements are plain
+# parameters (initialized with noiseless values) and the converter writes a sidecar
+# <model>_meas.json with everything needed to compute them: bus voltages of a power flow
+# solution, Y-bus, two-port admittances of measured branches and the list of measurements
+# with their deviations. The bus voltages come from a Newton-Raphson power flow (numpy, constant
+# power injections) solved by the converter; the specification also holds its inputs, so the
+# power flow can be solved again for other injections. True values are computed with a few
+# vectorized numpy operations,
+# noise of many snapshots is drawn at once, and each snapshot is pushed to the model with
+# one setParameterValues call.
+# The sidecar is also written for <measurementNoise>model (without the solution V, see "noise"):
+# badData.py takes the measurement deviations and the network from it. The measurements of such
+# models are synthesized by their power flow SubModel, so snapshots are not pushed to them.
+
+# Part of the complex quantity (bus voltage, bus power injection or branch flow) that is measured
+PARTS = ("abs", "re", "im", "cplx")
+
+
+def complex_array(data):
+    return np.asarray(data["re"], dtype=float) + 1j * np.asarray(data["im"], dtype=float)
+
+
+def complex_dict(values):
+    values = np.asarray(values, dtype=complex)
+    return {"re": values.real.tolist(), "im": values.imag.tolist()}
+
+
+def spec_path(model_file):
+    """Measurement specification (sidecar) of a model: <model>_meas.json."""
+    return model_stem(model_file) + "_meas.json"
+
+
+def solve_power_flow(Y, S, V0, pv, pq, tol=1e-10, max_iter=30):
+    """
+    Newton-Raphson power flow in polar coordinates with a dense Jacobian.
+
+    Y : complex bus admittance matrix (n x n)
+    S : specified complex injections (only P is used at PV buses)
+    V0 : initial voltages with slack voltages and PV magnitudes already set
+    pv, pq : indices of PV and PQ buses (the others are slack buses)
+    Returns the bus voltages; raises ValueError if the iterations do not converge.
+    """
+    Y = np.asarray(Y, dtype=complex)
+    V = np.asarray(V0, dtype=complex).copy()
+    Vm, Va = np.abs(V), np.angle(V)
+    pv, pq = np.asarray(pv, dtype=int), np.asarray(pq, dtype=int)
+    pvpq = np.concatenate([pv, pq])
+    for _ in range(max_iter):
+        I = Y @ V
+        mismatch = V * np.conj(I) - S
+        F = np.concatenate([mismatch.real[pvpq], mismatch.imag[pq]])
+        if np.max(np.abs(F), initial=0.0) < tol:
+            return V
+        # Derivatives of the injections w.r.t. angles and magnitudes
+        dS_dVa = 1j * V[:, None] * np.conj(np.diag(I) - Y * V[None, :])
+        dS_dVm = V[:, None] * np.conj(Y * (V / Vm)[None, :]) + np.diag(np.conj(I) * V / Vm)
+        J = np.block([[dS_dVa[np.ix_(pvpq, pvpq)].real, dS_dVm[np.ix_(pvpq, pq)].real],
+                      [dS_dVa[np.ix_(pq, pvpq)].imag, dS_dVm[np.ix_(pq, pq)].imag]])
+        dx = np.linalg.solve(J, -F)
+        Va[pvpq] += dx[:len(pvpq)]
+        Vm[pq] += dx[len(pvpq):]
+        V = Vm * np.exp(1j * Va)
+    raise ValueError(f"Power flow did not converge in {max_iter} iterations")
+
+
+class MeasurementGenerator:
+    """
+    Measurements of one SE model, computed from the sidecar specification (see module comment).
+
+    Quantities are evaluated for all buses and measured branches at once and the measurement
+    vector is gathered from them: voltages V, bus injections S = V * conj(Y V) and branch flows
+    S = V_m * conj(Y_mm * V_m + Y_mo * V_o).
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.complex_domain = spec["domain"] == "cmplx"
+        self.V = complex_array(spec["V"]) if "V" in spec else None
+        self.n = n = len(spec["buses"])
+        Y = spec["Y"]
+        self.Y_row = np.asarray(Y["row"], dtype=int)
+        self.Y_col = np.asarray(Y["col"], dtype=int)
+        self.Y_val = complex_array(Y)
+        br = spec["branches"]
+        self.m = np.asarray(br["m"], dtype=int)
+        self.o = np.asarray(br["o"], dtype=int)
+        self.y_mm = complex_array(br["y_mm"])
+        self.y_mo = complex_array(br["y_mo"])
+
+        meas = spec["measurements"]
+        self.names = list(meas["name"])
+        offset = {"v": 0, "inj": n, "br": 2 * n}
+        self.source = np.array([offset[kind] + index for kind, index in zip(meas["kind"], meas["index"])], dtype=int)
+        self.part = np.array([PARTS.index(part) for part in meas["part"]], dtype=int)
+        self.sigma = np.asarray(meas["sigma"], dtype=float)
+        self.is_complex = self.part == PARTS.index("cplx")
+
+    def power_flow(self, S=None):
+        """Bus voltages of the power flow for injections S (default: injections of the case)."""
+        pf = self.spec["pf"]
+        n = self.n
+        Y = np.zeros((n, n), dtype=complex)
+        Y[self.Y_row, self.Y_col] = self.Y_val
+        S = complex_array(pf["S"]) if S is None else np.asarray(S, dtype=complex)
+        return solve_power_flow(Y, S, complex_array(pf["V0"]), pf["pv"], pf["pq"])
+
+    @classmethod
+    def from_file(cls, file):
+        with open(file, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __len__(self):
+        return len(self.names)
+
+    def quantities(self, V):
+        """Complex quantities [V | bus injections | branch flows] for bus voltages V."""
+        n = len(V)
+        flow = self.Y_val * V[self.Y_col]
+        I = np.bincount(self.Y_row, flow.real, n) + 1j * np.bincount(self.Y_row, flow.imag, n)
+        S_br = V[self.m] * np.conj(self.y_mm * V[self.m] + self.y_mo * V[self.o])
+        return np.concatenate([V, V * np.conj(I), S_br])
+
+    def voltages(self, V=None):
+        """Bus voltages V, by default those of the specification (solved if it has none)."""
+        if V is not None:
+            return np.asarray(V, dtype=complex)
+        if self.V is None:
+            self.V = self.power_flow()
+        return self.V
+
+    def true_values(self, V=None):
+        """Noiseless measurements (complex in the complex domain, real otherwise)."""
+        q = self.quantities(self.voltages(V))[self.source]
+        values = np.select([self.part == 0, self.part == 1, self.part == 2], [np.abs(q), q.real, q.imag], q)
+        return values if self.complex_domain else values.real
+
+    def jacobian(self, V=None):
+        """
+        Derivatives of the measurements with respect to bus voltage angles and magnitudes at bus voltages V:
+        dense (measurements x buses) arrays dVa, dVm. Parts are taken as in true_values (complex for S).
+        The injection derivatives are those of solve_power_flow, evaluated on the nonzeros of the Y-bus.
+        """
+        V = self.voltages(V)
+        n, n_br = len(V), len(self.m)
+        U = V / np.abs(V)
+        flow = self.Y_val * V[self.Y_col]
+        I = np.bincount(self.Y_row, flow.real, n) + 1j * np.bincount(self.Y_row, flow.imag, n)
+        I_br = self.y_mm * V[self.m] + self.y_mo * V[self.o]
+        bus, br = np.arange(n), 2 * n + np.arange(n_br)
+        # Nonzero derivatives of the quantities [V | bus injections | branch flows]: (row, bus, d/dVa, d/dVm)
+        row = np.concatenate([bus, n + self.Y_row, n + bus, br, br])
+        col = np.concatenate([bus, self.Y_col, bus, self.m, self.o])
+        d_va = np.concatenate([1j * V, -1j * V[self.Y_row] * np.conj(flow), 1j * V * np.conj(I),
+                               1j * V[self.m] * np.conj(self.y_mo * V[self.o]), -1j * V[self.m] * np.conj(self.y_mo * V[self.o])])
+        d_vm = np.concatenate([U, V[self.Y_row] * np.conj(self.Y_val * U[self.Y_col]), U * np.conj(I),
+                               U[self.m] * np.conj(I_br) + V[self.m] * np.conj(self.y_mm * U[self.m]),
+                               V[self.m] * np.conj(self.y_mo * U[self.o])])
+        # Entries of the measured quantities, grouped by measurement
+        order = np.argsort(row, kind="stable")
+        counts = np.bincount(row, minlength=2 * n + n_br)
+        starts = np.cumsum(counts) - counts
+        size = counts[self.source]
+        meas = np.repeat(np.arange(len(self)), size)
+        entries = order[np.repeat(starts[self.source] - np.cumsum(size) + size, size) + np.arange(size.sum())]
+        dq_va = np.zeros((len(self), n), dtype=complex)
+        dq_vm = np.zeros((len(self), n), dtype=complex)
+        np.add.at(dq_va, (meas, col[entries]), d_va[entries])
+        np.add.at(dq_vm, (meas, col[entries]), d_vm[entries])
+        # Parts: d|q| = Re(conj(q) dq) / |q|
+        q = self.quantities(V)[self.source][:, None]
+        part = self.part[:, None]
+        return tuple(np.select([part == 0, part == 1, part == 2], [np.real(np.conj(q) * d) / np.abs(q), d.real, d.imag], d)
+                     for d in (dq_va, dq_vm))
+
+    def sample(self, rng, count=1, V=None):
+        """
+        count noisy snapshots (one per row): true values plus Gaussian noise N(0, sigma).
+        Complex measurements (S) get independent noise in the real and imaginary part.
+        """
+        values = self.true_values(V)
+        noise = rng.standard_normal((count, len(self))) * self.sigma
+        if self.complex_domain and self.is_complex.any():
+            noise = noise + 1j * (rng.standard_normal((count, len(self))) * np.where(self.is_complex, self.sigma, 0.0))
+        return values + noise
+
+    def bind(self, p_model, symbols=None):
+        """
+        Resolve parameter indices of the measurements in p_model (once, before push).
+        symbols : SymbolIndex of the model (created if not given)
+        """
+        import dTwin
+        if symbols is None:
+            symbols = SymbolIndex.from_model(p_model)
+        missing = symbols.missing(self.names)
+        if missing:
+            raise ValueError(f"Measurement '{missing[0]}' is not a parameter of the model")
+        self._indices = symbols.indices(self.names)
+        self._vector = dTwin.ComplexVector if self.complex_domain else dTwin.DoubleVector
+
+    def push(self, p_model, snapshot):
+        """Set all measurements of one snapshot with a single setParameterValues call."""
+        return p_model.setParameterValues(self._indices, self._vector(np.asarray(snapshot).tolist()))
+
+
+def run(spec_file, count, seed=None, solve=False, warm_start=True, cache=None):
+    """
+    Draw count snapshots. With solve, each snapshot is pushed to the model of the specification
+    and the SE is solved (results.startup: ModelStart, cache: ModelCache of the model).
+    Returns (generator, snapshots, results or None, generation time, solve time).
+    """
+    generator = MeasurementGenerator.from_file(spec_file)
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    snapshots = generator.sample(rng, count)
+    t_generate = time.perf_counter() - start
+    if not solve:
+        return generator, snapshots, None, t_generate, 0.0
+
+    if generator.spec.get("noise", "python") != "python":
+        raise ValueError("The measurements of this model come from its power flow SubModel (<measurementNoise>model); "
+                         "--solve needs a model converted with <measurementNoise>python")
+    import dTwin
+    from timeSeries import read_model, ResultBuffer
+
+    model_file = os.path.join(os.path.dirname(os.path.abspath(spec_file)), generator.spec["model"])
+    text, domain = read_model(model_file, warm_start)
+    p_model, startup = open_model(text, domain, dTwin.StaticProblem.WLS, cache, source=model_file)
+    try:
+        symbols = startup.symbols
+        generator.bind(p_model, symbols)
+        out_indices = symbols.out_indices
+        out_names = symbols.out_names
+        solver = p_model.getSolverInterface()
+        if not solver:
+            raise RuntimeError("Cannot obtain solver interface")
+        results = ResultBuffer(out_names, count, 1.0, complex if domain == "cmplx" else float)
+        results.startup = startup
+        if warm_start and startup.x0 is not None:
+            p_model.setVariableValues(startup.x0)
+        start = time.perf_counter()
+        for k in range(count):
+            generator.push(p_model, snapshots[k])
+            if solver.solve() == dTwin.Solution.OK:
+                results.store(k, p_model.getOutputSymbolValues(out_indices))
+                startup.save_state(p_model)
+        t_solve = time.perf_counter() - start
+        return generator, snapshots, results, t_generate, t_solve
+    finally:
+        p_model.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Noisy measurement snapshots for SE models converted with <measurementNoise>python.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("spec", help="Measurement specification written by matp2modlSE.py (<model>_meas.json).")
+    parser.add_argument("-n", "--snapshots", type=int, default=1, help="Number of noisy snapshots (default: 1).")
+    parser.add_argument("-s", "--seed", type=int, help="Seed of the noise (default: random).")
+    parser.add_argument("--solve", action="store_true",
+                        help="Push every snapshot to the model and solve the SE (requires dTwin).")
+    parser.add_argument("--cold", action="store_true", help="With --solve: no warm start between snapshots.")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="With --solve: cache folder for the symbol index and initial state of the model.")
+    parser.add_argument("-o", "--output",
+                        help="Output file. Snapshots: .npz (one array per measurement). \nWith --solve: estimates (.bin/.dbin, .npz or text).")
+    args = parser.parse_args()
+
+    try:
+        generator, snapshots, results, t_generate, t_solve = run(
+            args.spec, args.snapshots, args.seed, args.solve, warm_start=not args.cold,
+            cache=ModelCache(args.cache) if args.cache else None)
+    except (OSError, ValueError, KeyError, RuntimeError) as e:
+        print(f"\nError: {e}")
+        sys.exit(1)
+
+    base = args.spec[:-len("_meas.json")] if args.spec.endswith("_meas.json") else os.path.splitext(args.spec)[0]
+    print(f"  > Measurements: {len(generator)}, snapshots: {args.snapshots}")
+    print(f"  > Generation: {t_generate:.4f} s ({args.snapshots / max(t_generate, 1e-9):.0f} snapshots/s)")
+    if results is None:
+        output = args.output or base + "_snapshots.npz"
+        np.savez(output, **{name: snapshots[:, k] for k, name in enumerate(generator.names)})
+    else:
+        output = args.output or base + "_est.bin"
+        results.save(output)
+        n_failed = args.snapshots - int(results.converged.sum())
+        print(f"  > Model: {results.startup.describe()}")
+        print(f"  > Solve: {t_solve:.3f} s ({args.snapshots / max(t_solve, 1e-9):.1f} snapshots/s), not converged: {n_failed}")
+    print(f"Results written to: {output}")
+
+
+if __name__ == "__main__":
+    main()
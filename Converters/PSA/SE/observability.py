@@ -0,0 +1,165 @@
+import numpy as np
+
+# Observability check of the measurement set used by matp2modlSE.py.
+#
+# The check uses the decoupled linearized measurement model on the Y-bus structure:
+#   P-theta part: active injections, active branch flows, zero injections and slack angle
+#   Q-V part:     voltage magnitudes, reactive injections (PQ nodes), reactive flows,
+#                 zero injections and slack voltage
+# The model is observable if both parts have full rank (number of buses).
+# Rank is tracked incrementally by sparse Gaussian elimination, so measurements can be
+# added one by one and each addition costs only the elimination of one sparse row.
+
+
+class IncrementalRank:
+    """Rank of a growing set of sparse rows (dict column -> value)."""
+
+    def __init__(self, n_cols, tol=1e-9):
+        self.n_cols = n_cols
+        self.tol = tol
+        self.pivots = {}   # pivot column -> reduced row (pivot is the smallest column of the row)
+
+    @property
+    def rank(self):
+        return len(self.pivots)
+
+    @property
+    def full(self):
+        return len(self.pivots) == self.n_cols
+
+    def _reduce(self, row):
+        row = {c: v for c, v in row.items() if v != 0}
+        if not row:
+            return row, 0.0
+        # Entries below tol relative to the original row are cancellation noise
+        drop = self.tol * max(abs(v) for v in row.values())
+        while row:
+            c = min(row)
+            pivot_row = self.pivots.get(c)
+            if pivot_row is None:
+                return row, max(abs(v) for v in row.values())
+            factor = row[c] / pivot_row[c]
+            for k, v in pivot_row.items():
+                new = row.get(k, 0.0) - factor * v
+                if abs(new) <= drop:
+                    row.pop(k, None)
+                else:
+                    row[k] = new
+        return row, 0.0
+
+    def independent(self, row):
+        """Check if row would increase the rank (without adding it)."""
+        reduced, _ = self._reduce(row)
+        return bool(reduced)
+
+    def add(self, row):
+        """Add row. Returns True if the rank increased."""
+        reduced, scale = self._reduce(row)
+        if not reduced:
+            return False
+        self.pivots[min(reduced)] = {c: v / scale for c, v in reduced.items()}
+        return True
+
+
+class MeasurementDesign:
+    """
+    Measurement set of the state estimator with incremental observability check.
+
+    Y : complex bus admittance matrix (dense, n x n)
+    index_to_bus_id, bus_id_map : mapping between matrix index and MATPOWER bus id
+    slack : slack bus ids (angle and magnitude references)
+    zi_nodes : zero injection bus ids (modeled as constraints or heavy weighted equations)
+    """
+
+    def __init__(self, Y, index_to_bus_id, bus_id_map, slack, zi_nodes, tol=1e-9):
+        self.n = len(index_to_bus_id)
+        self.bus_id_map = bus_id_map
+        self.pt = IncrementalRank(self.n, tol)
+        self.qv = IncrementalRank(self.n, tol)
+        self.n_meas = 0      # number of scalar measurement equations
+        # Weighted neighbourhood of each bus (off-diagonal Y-bus structure)
+        absY = np.abs(Y)
+        self.neighbours = []
+        for i_idx in range(self.n):
+            cols = np.nonzero(absY[i_idx])[0]
+            self.neighbours.append({int(j): float(absY[i_idx, j]) for j in cols if j != i_idx})
+
+        for bus_id in slack:
+            i_idx = bus_id_map[bus_id]
+            self.pt.add({i_idx: 1.0})
+            self.qv.add({i_idx: 1.0})
+            self.n_meas += 2     # slack angle and magnitude equations
+        for bus_id in zi_nodes:
+            row = self._injection_row(bus_id_map[bus_id])
+            self.pt.add(row)
+            self.qv.add(row)
+
+    def _injection_row(self, i_idx):
+        row = {j: -w for j, w in self.neighbours[i_idx].items()}
+        row[i_idx] = sum(self.neighbours[i_idx].values()) or 1.0
+        return row
+
+    def _branch_row(self, f_idx, t_idx):
+        w = self.neighbours[f_idx].get(t_idx, 1.0)
+        return {f_idx: w, t_idx: -w}
+
+    @property
+    def observable(self):
+        return self.pt.full and self.qv.full
+
+    def rows(self, kind, bus):
+        """Rows (P-theta, Q-V) of a measurement; None where the measurement has no equation."""
+        if kind == "v":
+            return None, {self.bus_id_map[bus]: 1.0}
+        if kind == "pv":     # PV node: only active injection is measured
+            return self._injection_row(self.bus_id_map[bus]), None
+        if kind == "pq":
+            row = self._injection_row(self.bus_id_map[bus])
+            return row, row
+        if kind == "branch":
+            row = self._branch_row(self.bus_id_map[bus[0]], self.bus_id_map[bus[1]])
+            return row, row
+        raise ValueError(f"Unknown measurement type '{kind}'")
+
+    def add(self, kind, bus):
+        """Add measurement; returns True if it improved observability."""
+        pt_row, qv_row = self.rows(kind, bus)
+        gain = False
+        if pt_row is not None:
+            gain |= self.pt.add(pt_row)
+            self.n_meas += 1
+        if qv_row is not None:
+            gain |= self.qv.add(qv_row)
+            self.n_meas += 1
+        return gain
+
+    def improves(self, kind, bus):
+        pt_row, qv_row = self.rows(kind, bus)
+        return ((pt_row is not None and not self.pt.full and self.pt.independent(pt_row)) or
+                (qv_row is not None and not self.qv.full and self.qv.independent(qv_row)))
+
+    @property
+    def redundancy(self):
+        """Measurement redundancy: scalar measurement equations per state variable."""
+        return self.n_meas / (2 * self.n)
+
+
+def ensure_observability(design, candidates, rng):
+    """
+    Greedily add candidate measurements (in random order drawn from rng) that increase
+    the rank, until the design is observable.
+
+    candidates : list of (kind, bus) not yet in the design
+    Returns list of added (kind, bus).
+    """
+    added = []
+    if design.observable:
+        return added
+    for k in rng.permutation(len(candidates)):
+        kind, bus = candidates[k]
+        if design.improves(kind, bus):
+            design.add(kind, bus)
+            added.append((kind, bus))
+            if design.observable:
+                break
+    return added
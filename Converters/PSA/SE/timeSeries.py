@@ -0,0 +1,281 @@
+import os
+import re
+import sys
+import time
+import argparse
+import numpy as np
+from badData import BadDataDetector, read_spec, save_steps
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from core import ModelCache, open_model, read_text
+
+# Time-series state estimation with models converted by matp2modlSE.py.
+#
+# With <includeConsumptionCurves> the SE model gets scaling parameters k{bus}_load and
+# k{bus}_gen (copied to the power flow SubModel that generates the measurements).
+# The runner drives them from load/generation profiles: at every step the parameters are
+# set with setParameterValues, the WLS model is solved again from its initial values
+# (reInit=true, as written by the converter), and the output symbols are stored in a
+# preallocated columnar result buffer.
+# The measurements (*_meas outputs) come from the SubModel, so a step is only valid if the
+# SubModel is solved again with the new parameters. --warm starts each step from the previous
+# estimate (reInit=false); it is only valid if the solver still solves the SubModel at every
+# solve of a model with reInit=false. With --warm the *_meas outputs of the first two solved
+# steps with different profile values are compared and the run stops if they are equal.
+#
+# Profiles are CSV files (header with parameter names, optional time column) or NumPy
+# files (.npz with one array per parameter, .npy structured array with named fields).
+# Profiles shorter than the study (e.g. 24 hourly values of a day) are repeated cyclically,
+# so daily curves can drive an 8760 hour study.
+# With --bad-data the residuals of all steps are tested at the end (badData.py) from the
+# stored outputs and the measurement specification <model>_meas.json, so the test costs no model calls.
+# The residual covariance of the normalized residuals is computed at the first solved step and reused
+# for all steps (fixed gain matrix); --exact-omega computes it at the estimate of every step.
+
+TIME_COLUMNS = ("t", "time", "hour")
+
+# Model header of the main (WLS) model; SubModel headers are not matched
+MODEL_HEADER = re.compile(r"^Model\s*\[([^\]]*)\]", re.M)
+SUBMODEL_HEADER = re.compile(r"^SubModel\s*\[", re.M)
+
+
+def read_profiles(file):
+    """Read one profile file. Returns dict parameter name -> 1D array of values."""
+    name = file.lower()
+    if name.endswith(".npz"):
+        with np.load(file) as data:
+            return {key: np.asarray(data[key], dtype=float).ravel() for key in data.files}
+    if name.endswith(".npy"):
+        data = np.load(file)
+        if data.dtype.names is None:
+            raise ValueError(f"{file}: profiles in .npy files must be structured arrays (field names are parameter names)")
+        return {key: np.asarray(data[key], dtype=float).ravel() for key in data.dtype.names}
+    data = np.atleast_1d(np.genfromtxt(file, delimiter=",", names=True, deletechars="", autostrip=True))
+    if data.dtype.names is None:
+        raise ValueError(f"{file}: header with parameter names is missing")
+    return {key: np.asarray(data[key], dtype=float) for key in data.dtype.names}
+
+
+def load_profiles(files):
+    """Merge profiles of all files (time columns are skipped). Returns dict name -> values."""
+    profiles = {}
+    for file in files:
+        for key, values in read_profiles(file).items():
+            if key.lower() in TIME_COLUMNS:
+                continue
+            if key in profiles:
+                raise ValueError(f"Profile '{key}' is given in more than one file")
+            if len(values) == 0 or np.isnan(values).any():
+                raise ValueError(f"{file}: profile '{key}' is empty or has missing values")
+            profiles[key] = values
+    if not profiles:
+        raise ValueError("No profiles found in " + ", ".join(files))
+    return profiles
+
+
+def expand_profiles(profiles, n_steps):
+    """Profile values of all steps (shorter profiles repeat cyclically). Returns (names, values[n_steps, n])."""
+    names = list(profiles)
+    return names, np.column_stack([np.resize(profiles[key], n_steps) for key in names])
+
+
+def read_model(file, warm_start=False):
+    """
+    Model text (plain or compressed file) and domain ('real' or 'cmplx').
+    The converter writes the WLS model with reInit=true (every solve starts from the initial
+    values); for warm start it is switched to reInit=false, so each step starts from the
+    estimate of the previous one. Models with a power flow SubModel are only valid with warm start
+    if the SubModel is still solved at every solve (see run).
+    """
+    text = read_text(file)
+    header = MODEL_HEADER.search(text)
+    if header is None:
+        raise ValueError(f"{file}: Model header not found")
+    attrs = header.group(1)
+    domain = "cmplx" if re.search(r"\bdomain\s*=\s*cmplx\b", attrs) else "real"
+    if warm_start:
+        attrs = re.sub(r"\breInit\s*=\s*true\b", "reInit=false", attrs)
+        text = text[:header.start(1)] + attrs + text[header.end(1):]
+    return text, domain
+
+
+class ResultBuffer:
+    """
+    Estimates of all steps, preallocated and stored by column (one column per output symbol),
+    so a single symbol over the whole study is a contiguous array.
+    Steps that did not converge stay NaN and are flagged in converged.
+    """
+
+    def __init__(self, names, n_steps, dt=1.0, dtype=float):
+        self.names = list(names)
+        self.t = np.arange(n_steps) * dt
+        missing = complex(np.nan, np.nan) if dtype is complex else np.nan
+        self.data = np.full((n_steps, len(self.names)), missing, dtype=dtype, order="F")
+        self.converged = np.zeros(n_steps, dtype=bool)
+
+    def store(self, step, values):
+        self.data[step, :] = np.asarray(values, dtype=self.data.dtype)
+        self.converged[step] = True
+
+    def column(self, name):
+        return self.data[:, self.names.index(name)]
+
+    def _real_columns(self):
+        """Column names and real data (complex symbols are split into _re and _im columns)."""
+        if not np.iscomplexobj(self.data):
+            return self.names, self.data
+        names = [f"{name}{part}" for name in self.names for part in ("_re", "_im")]
+        data = np.empty((len(self.t), 2 * len(self.names)))
+        data[:, 0::2], data[:, 1::2] = self.data.real, self.data.imag
+        return names, data
+
+    def save(self, file):
+        """
+        Save results. Format by extension:
+          .npz        - one array per symbol, plus t and converged
+          .bin, .dbin - binary table of plotTable.py (header line, little-endian float64 rows)
+          other       - space separated text table (plotTable.py)
+        """
+        lower = file.lower()
+        if lower.endswith(".npz"):
+            np.savez(file, t=self.t, converged=self.converged,
+                     **{name: self.data[:, k] for k, name in enumerate(self.names)})
+            return
+        names, data = self._real_columns()
+        table = np.column_stack([self.t, data])
+        if lower.endswith((".bin", ".dbin")):
+            with open(file, "wb") as f_out:
+                f_out.write((" ".join(["t"] + names) + "\n").encode("utf-8"))
+                f_out.write(np.ascontiguousarray(table, dtype="<f8").tobytes())
+        else:
+            np.savetxt(file, table, header=" ".join(["t"] + names), comments="")
+
+
+def run(model_file, profile_files, n_steps=None, dt=1.0, warm_start=False, bad_data=False, cache=None, exact_omega=False):
+    """
+    Solve the SE model for every step of the profiles.
+    n_steps defaults to the length of the longest profile. Returns ResultBuffer with the start-up
+    of the model (startup: ModelStart); with bad_data it also holds the detector and the residual
+    tests of all steps (detector, residuals). cache : ModelCache (symbol index and initial state).
+    exact_omega : residual covariance of the bad data test at every step (default: at the first solved step)
+    warm_start : start each step from the previous estimate (reInit=false). Only valid if the solver
+                 solves the power flow SubModel again at every solve; run stops if the measurements
+                 of two steps with different profile values are equal.
+    """
+    import dTwin
+
+    profiles = load_profiles(profile_files)
+    if n_steps is None:
+        n_steps = max(len(values) for values in profiles.values())
+    names, values = expand_profiles(profiles, n_steps)
+    text, domain = read_model(model_file, warm_start)
+    if SUBMODEL_HEADER.search(text) is None:
+        raise ValueError(f"{model_file} has no power flow SubModel, so the profiles cannot change its measurements "
+                         "(convert the case with <measurementNoise>model)")
+    detector = BadDataDetector(text, read_spec(model_file), fixed_gain=not exact_omega) if bad_data else None
+
+    if domain == "cmplx":
+        values = values.astype(complex)
+    p_model, startup = open_model(text, domain, dTwin.StaticProblem.WLS, cache, source=model_file)
+    try:
+        symbols = startup.symbols
+        missing = symbols.missing(names)
+        if missing:
+            raise ValueError(f"Profile '{missing[0]}' is not a parameter of {model_file} "
+                             "(convert the case with <includeConsumptionCurves>true)")
+        param_indices = symbols.indices(names)
+        param_values = p_model.getParameterValues(param_indices)
+
+        out_indices = symbols.out_indices
+        out_names = symbols.out_names
+        solver = p_model.getSolverInterface()
+        if not solver:
+            raise RuntimeError("Cannot obtain solver interface")
+
+        results = ResultBuffer(out_names, n_steps, dt, complex if domain == "cmplx" else float)
+        if detector is not None:
+            detector.bind(p_model, symbols)
+        if warm_start and startup.x0 is not None:
+            p_model.setVariableValues(startup.x0)
+        last_good = p_model.getVariableValues()
+        # Warm start: measurements are compared between solved steps until they are seen to follow the profiles
+        meas_columns = [k for k, name in enumerate(out_names) if name.endswith("_meas")]
+        verify, last_step = warm_start and bool(meas_columns), None
+        for step in range(n_steps):
+            for k in range(len(names)):
+                param_values[k] = values[step, k]
+            p_model.setParameterValues(param_indices, param_values)
+            if solver.solve() == dTwin.Solution.OK:
+                results.store(step, p_model.getOutputSymbolValues(out_indices))
+                if verify and last_step is not None and not np.array_equal(values[step], values[last_step]):
+                    if np.array_equal(results.data[step, meas_columns], results.data[last_step, meas_columns]):
+                        raise RuntimeError(f"Measurements of {model_file} did not change between steps {last_step} and {step} "
+                                           "with different profile values (the power flow SubModel was not solved again "
+                                           "with reInit=false); run without --warm")
+                    verify = False
+                last_step = step
+                startup.save_state(p_model)
+                if warm_start:
+                    last_good = p_model.getVariableValues()
+            else:
+                # Do not start the next step from a diverged state
+                p_model.setVariableValues(last_good)
+        if detector is not None:
+            results.detector = detector
+            results.residuals = detector.evaluate(results.data, results.converged)
+        results.startup = startup
+        return results
+    finally:
+        p_model.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time-series state estimation: drives k*_load/k*_gen parameters of a matp2modlSE.py model from profiles.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("model", help="SE model (.dmodl) converted with <includeConsumptionCurves>true.")
+    parser.add_argument("profiles", nargs="+",
+                        help="Profile files (.csv with header, .npz, structured .npy). \nColumn names are model parameters (e.g. k5_load, k2_gen).")
+    parser.add_argument("-n", "--steps", type=int,
+                        help="Number of steps (e.g. 8760). Shorter profiles are repeated cyclically. \nDefault: length of the longest profile.")
+    parser.add_argument("--dt", type=float, default=1.0, help="Time between steps written to the results (default: 1).")
+    parser.add_argument("-o", "--output",
+                        help="Results file (.bin/.dbin binary table, .npz or text). \nDefault: <model>_ts.bin")
+    parser.add_argument("--warm", action="store_true",
+                        help="Start every step from the estimate of the previous one (reInit=false). \nOnly valid if the solver still solves the power flow SubModel at every solve.")
+    parser.add_argument("--bad-data", action="store_true",
+                        help="Chi-square and largest normalized residual tests of every step. \nPer step results: <output>_bad.csv")
+    parser.add_argument("--exact-omega", action="store_true",
+                        help="With --bad-data: residual covariance of the normalized residuals at the estimate of every step \n(default: computed at the first solved step and reused for all steps).")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="Cache folder for the symbol index and initial state of the model \n(reused while the model file is unchanged).")
+    args = parser.parse_args()
+
+    output = args.output or re.sub(r"\.dmodl$", "", args.model) + "_ts.bin"
+    start = time.perf_counter()
+    try:
+        results = run(args.model, args.profiles, args.steps, args.dt, warm_start=args.warm, bad_data=args.bad_data,
+                      cache=ModelCache(args.cache) if args.cache else None, exact_omega=args.exact_omega)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"\nError: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    results.save(output)
+
+    n_steps = len(results.t)
+    n_failed = n_steps - int(results.converged.sum())
+    print(f"  > Model: {results.startup.describe()}")
+    print(f"  > Steps: {n_steps}, not converged: {n_failed}")
+    print(f"  > Time: {elapsed:.3f} s ({1e3 * elapsed / max(n_steps, 1):.3f} ms per step)")
+    if args.bad_data:
+        res, ok = results.residuals, results.converged
+        print(f"  > Bad data: chi-square test failed in {int(np.sum(~res.chi2_ok & ok))} steps, "
+              f"largest normalized residual above {results.detector.threshold:g} in {int(np.sum(res.bad & ok))} steps")
+        bad_output = re.sub(r"\.[^.\\/]*$", "", output) + "_bad.csv"
+        save_steps(bad_output, results.t, ok, results.detector, res)
+        print(f"Bad data tests written to: {bad_output}")
+    print(f"Results written to: {output}")
+
+
+if __name__ == "__main__":
+    main()
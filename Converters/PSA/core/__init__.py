@@ -0,0 +1,33 @@
+# Shared core of the MATPOWER to dmodl converters (PF/matp2modl.py, SE/matp2modl.py, SE/matp2modlSE.py):
+#   case        - MATPOWER case parser, bus indexing and dense renumbering (compact names)
+#   config      - config.xml options, limits, budgets and variable names
+#   ybus        - bus admittance matrix and branch two-port admittances
+#   formulation - expressions of the equations per coordinate system (injection sums, branch flows), bulk
+#                 formatting of the Y-bus and injection parameters, the power flow model of PF and SE matp2modl.py
+#                 and the node equations and Q limits of the power flow SubModel of SE/matp2modlSE.py
+#   dmodl       - parser of .dmodl model files into an indexed tree with symbol tables
+#   emission    - statistics of the written model text and budget warnings
+#   symbols     - name -> index registry of an initialized dTwin model (bulk index vectors)
+#   cache       - on-disk cache of the symbol index and initial state of a model, keyed by content hash
+#   update      - parameter-only updates of converted models (diff, <model>_params.json, setParameterValues)
+#   compression - gzip/zstd compressed model files (writing, transparent reading, plain temporary copies)
+#   sampling    - seeded random choices of the SE converters (measurement placement, consumption curve nodes)
+#   structure   - structural analysis of model equations (incidence, rank, blocks, fill-in); run as python -m core.structure,
+#                 so it is not imported here (as compressbench, the benchmark of compressed models)
+# The converters add the PSA folder to sys.path and import from here.
+
+from .case import MatpowerCase, parse_case, load_case, resolve_case_path, save_name_map, load_name_map
+from .config import (load_config, read_variable_names, compact_variable_names, read_options, read_power_limits,
+                     read_zip_limits, read_budgets)
+from .ybus import build_ybus, branch_admittances
+from .sampling import resolve_seed, sample_sorted, place_consumption_curves
+from .formulation import (INJECTION_TERMS, InjectionExpressions, BranchFlows, format_complex, format_values, write_admittances,
+                          PARALLEL_MIN_BUSES, write_node_equations, group_pv_buses, write_q_limits, write_q_postproc,
+                          convert_power_flow)
+from .dmodl import DModlError, ModelFile, Model, parse as parse_dmodl, load as load_dmodl
+from .emission import EmissionStats, report as report_emission
+from .symbols import SymbolIndex
+from .cache import ModelCache, ModelStart, model_key, open_model
+from .update import diff_parameters, finish_update, update_path, params_path, load_parameters, apply_parameters
+from .compression import (COMPRESSIONS, model_file, model_stem, check as check_compression, open_output, open_input,
+                          read_text, decompressed, describe as describe_compression)
@@ -0,0 +1,136 @@
+import os
+import time
+import zipfile
+import hashlib
+import numpy as np
+
+from .symbols import SymbolIndex
+
+# On-disk cache for the start-up of a model. The initialized C++ model cannot be serialized, so
+# initFromString runs on every start. Cached under the SHA-256 of the model text, problem type,
+# domain and dTwin version (one <key>.npz per model) are:
+#   - the symbol index (parameter, variable and output names, output indices), so the name lists
+#     are not fetched from the model again, and
+#   - the variable values after the first converged solve, used as the initial state of later
+#     starts (warm-started studies begin from a converged point).
+# An entry is used only if the variable and parameter counts of the initialized model match it.
+
+CACHE_VERSION = 1
+ENTRY_ARRAYS = ("param_names", "var_names", "out_names", "out_indices")
+
+
+def model_key(text, problem, domain, version=""):
+    """Cache key of a model: SHA-256 of the text, problem type, domain and dTwin version."""
+    digest = hashlib.sha256(f"{CACHE_VERSION}|{problem}|{domain}|{version}|".encode("utf-8"))
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ModelCache:
+    """Cache entries in directory (created on the first store)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def load(self, key):
+        """Arrays of the entry (param_names, var_names, out_names, out_indices and optionally x0) or None."""
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = {name: data[name] for name in data.files}
+        except (OSError, ValueError, zipfile.BadZipFile):
+            return None     # damaged entry is a miss and is written again
+        return entry if all(name in entry for name in ENTRY_ARRAYS) else None
+
+    def store(self, key, symbols, x0=None):
+        """Write the entry (through a temporary file, so parallel processes never read a partial one)."""
+        os.makedirs(self.directory, exist_ok=True)
+        arrays = {
+            "param_names": np.array(symbols.param_names, dtype=str),
+            "var_names": np.array(symbols.var_names, dtype=str),
+            "out_names": np.array(symbols.out_names, dtype=str),
+            "out_indices": np.array(list(symbols.out_indices), dtype=np.uint32),
+        }
+        if x0 is not None:
+            arrays["x0"] = np.asarray(x0)
+        temp = os.path.join(self.directory, f"{key}.{os.getpid()}.tmp.npz")
+        np.savez(temp, **arrays)
+        os.replace(temp, self.path(key))
+
+
+class ModelStart:
+    """
+    Start-up of a model: cache key, hit (symbol index from the cache), timings in seconds
+    (t_init: initFromString, t_symbols: symbol index) and x0 (cached initial state or None).
+    """
+
+    def __init__(self, cache, key, symbols, hit, t_init, t_symbols, x0=None):
+        self.cache, self.key, self.symbols = cache, key, symbols
+        self.hit, self.t_init, self.t_symbols = hit, t_init, t_symbols
+        self.x0 = x0
+
+    @property
+    def pending(self):
+        """The initial state is not cached yet."""
+        return self.cache is not None and self.x0 is None
+
+    def save_state(self, p_model):
+        """Cache the current variable values as initial state (call after the first converged solve)."""
+        if self.pending:
+            self.x0 = np.asarray(p_model.getVariableValues())
+            self.cache.store(self.key, self.symbols, self.x0)
+
+    def describe(self):
+        if self.cache is None:
+            return f"init {self.t_init:.3f} s, symbol index {self.t_symbols:.4f} s"
+        return (f"init {self.t_init:.3f} s, symbol index {self.t_symbols:.4f} s "
+                f"(cache {'hit' if self.hit else 'miss'}{', initial state cached' if self.x0 is not None else ''})")
+
+
+def open_model(text, domain, problem, cache=None, p_log=None, source=None):
+    """
+    Create and initialize a static model from its text; the symbol index (and initial state) is
+    taken from cache when it has a valid entry. source names the model in error messages.
+    Returns (p_model, ModelStart). Raises RuntimeError.
+    """
+    import dTwin
+    if p_log is None:
+        p_log = dTwin.getConsoleLogger()
+    if domain == "cmplx":
+        p_model = dTwin.createComplexStaticModel(problem, p_log)
+    else:
+        p_model = dTwin.createRealStaticModel(problem, p_log)
+    if not p_model:
+        raise RuntimeError("Cannot create model")
+
+    start = time.perf_counter()
+    if not p_model.initFromString(text):
+        p_model.release()
+        raise RuntimeError(f"Cannot init model from {source}" if source else "Cannot init model")
+    t_init = time.perf_counter() - start
+
+    start = time.perf_counter()
+    key = entry = x0 = None
+    if cache is not None:
+        key = model_key(text, problem, domain, getattr(dTwin, "__version__", ""))
+        entry = cache.load(key)
+        if entry is not None and (len(entry["var_names"]) != p_model.getNumberOfVariables() or
+                                  len(entry["param_names"]) != p_model.getNumberOfParameters()):
+            entry = None
+    if entry is not None:
+        symbols = SymbolIndex(entry["param_names"].tolist(), entry["var_names"].tolist(), entry["out_names"].tolist(),
+                              dTwin.UintVector(entry["out_indices"].tolist()), dTwin.UintVector)
+        if "x0" in entry:
+            vector = dTwin.ComplexVector if domain == "cmplx" else dTwin.DoubleVector
+            x0 = vector(entry["x0"].tolist())
+    else:
+        symbols = SymbolIndex.from_model(p_model)
+        if cache is not None:
+            cache.store(key, symbols)
+    t_symbols = time.perf_counter() - start
+    return p_model, ModelStart(cache, key, symbols, entry is not None, t_init, t_symbols, x0)
@@ -0,0 +1,152 @@
+import os
+import re
+import sys
+import json
+
+# MATPOWER case files (mpc.version, mpc.baseMVA, mpc.bus, mpc.gen and mpc.branch) as read by
+# the PF and SE converters, with the bus indexing they share.
+
+NUMBER_PATTERN = re.compile(r'-?\d+\.?\d*(?:[eE][-+]?\d+)?')
+
+
+def parse_matrix_block(lines, start_index):
+    """Rows of the matrix starting at lines[start_index]. Returns (rows, index of the closing line)."""
+    data = []
+    i = start_index + 1 # Skip matrix header line
+    while i < len(lines):
+        line = lines[i].strip()
+        if line.startswith('%') or line == '':
+            i += 1
+            continue
+        if '];' in line:
+            break
+        row = line.split('%')[0].strip()
+        matches = NUMBER_PATTERN.findall(row)
+        if matches:
+            data.append([float(num) for num in matches])
+        i += 1
+    return data, i
+
+
+class MatpowerCase:
+    """
+    MATPOWER case with the bus indexing used by the converters.
+
+    bus, gen, branch : rows of the MATPOWER matrices (lists of floats)
+    bus_id_map, index_to_bus_id : MATPOWER bus id <-> row of bus (and of the Y-bus)
+    pq_nodes, pv_nodes, slack : bus ids by bus type (1, 2, 3), in the order of bus
+    gen_by_bus, branch_by_bus : generator and branch rows connected to a bus id
+    bus_ids : bus id of the case -> MATPOWER bus id of the case file (differ after renumbered())
+    """
+
+    def __init__(self, bus, gen, branch, baseMVA, version=None):
+        self.bus, self.gen, self.branch = bus, gen, branch
+        self.baseMVA = baseMVA
+        self.version = version
+
+        # Map bus indices for easier access
+        self.n = len(bus)
+        self.bus_id_map = {int(bus[i][0]): i for i in range(self.n)}
+        self.index_to_bus_id = {v: k for k, v in self.bus_id_map.items()}
+        self.bus_ids = {bus_id: bus_id for bus_id in self.bus_id_map}
+
+        # Assign node type
+        self.pq_nodes, self.pv_nodes, self.slack = [], [], []
+        for row in bus:
+            bus_type = row[1]
+            bus_id = int(row[0])
+            if bus_type == 1:
+                self.pq_nodes.append(bus_id)
+            elif bus_type == 2:
+                self.pv_nodes.append(bus_id)
+            elif bus_type == 3:
+                self.slack.append(bus_id)
+
+        # Organizing generators and branches by bus_id
+        self.gen_by_bus = {}
+        for g in gen:
+            self.gen_by_bus.setdefault(int(g[0]), []).append(g)
+        self.branch_by_bus = {}
+        for b in branch:
+            self.branch_by_bus.setdefault(int(b[0]), []).append(b)
+            self.branch_by_bus.setdefault(int(b[1]), []).append(b)
+
+    def renumbered(self):
+        """Copy of the case with dense bus ids 1..n in the order of bus (generators and branches follow)."""
+        new_id = {self.index_to_bus_id[i]: i + 1 for i in range(self.n)}
+        bus = [[float(new_id[int(row[0])])] + row[1:] for row in self.bus]
+        gen = [[float(new_id[int(row[0])])] + row[1:] for row in self.gen]
+        branch = [[float(new_id[int(row[0])]), float(new_id[int(row[1])])] + row[2:] for row in self.branch]
+        case = MatpowerCase(bus, gen, branch, self.baseMVA, self.version)
+        case.bus_ids = {k: self.bus_ids[bus_id] for bus_id, k in new_id.items()}
+        return case
+
+
+def parse_case(lines):
+    """Parse the lines of a MATPOWER case file."""
+    bus, gen, branch = [], [], []
+    version = None
+    baseMVA = None
+
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        # Parse version string
+        if line.startswith("mpc.version"):
+            match = re.search(r"'(.*?)'", line)
+            if match:
+                version = match.group(1)
+            i += 1
+        # Parse baseMVA value
+        elif line.startswith("mpc.baseMVA"):
+            match = re.search(r"=\s*([0-9.]+);", line)
+            if match:
+                baseMVA = float(match.group(1))
+            i += 1
+        # Parse bus, gen, and branch matrices
+        elif line.startswith('mpc.bus'):
+            bus, i = parse_matrix_block(lines, i)
+        elif line.startswith('mpc.gen ='):
+            gen, i = parse_matrix_block(lines, i)
+        elif line.startswith('mpc.branch'):
+            branch, i = parse_matrix_block(lines, i)
+        elif bus and gen and branch:
+            break
+        else:
+            i += 1
+    return MatpowerCase(bus, gen, branch, baseMVA, version)
+
+
+def save_name_map(path, case, variables, model=None):
+    """
+    Sidecar of a model with compact names: bus ids of the model -> MATPOWER bus ids and
+    variables (compact name -> configured name).
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"model": model, "buses": {str(k): v for k, v in case.bus_ids.items()}, "variables": variables},
+                  f, indent=1, ensure_ascii=False)
+
+
+def load_name_map(path):
+    """Sidecar of save_name_map as (dict model bus id -> MATPOWER bus id, dict compact -> configured name)."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {int(k): v for k, v in data["buses"].items()}, data["variables"]
+
+
+def resolve_case_path(user_input):
+    """The path given by the user if it exists, otherwise the file name in the default 'cases' folder."""
+    if os.path.exists(user_input):
+        return user_input
+    return os.path.join("cases", user_input)
+
+
+def load_case(path):
+    """Read a MATPOWER case file (exits with an error message if it does not exist)."""
+    try:
+        with open(path, 'r') as file_handle:
+            lines = file_handle.readlines()
+    except FileNotFoundError:
+        print(f"\nError: The MATPOWER input file '{path}' was not found.")
+        sys.exit(1)
+    return parse_case(lines)
@@ -0,0 +1,87 @@
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+from .compression import check, model_file, open_output, read_text
+
+# Benchmark of compressed models: disk size against write and load time (reading with stream
+# decompression, optionally initFromString of dTwin) for the levels of BENCHMARK_LEVELS.
+# Run from the PSA folder as python -m core.compressbench files... [--init]
+
+BENCHMARK_LEVELS = {"gzip": (1, 6, 9), "zstd": (3, 10, 19)}
+
+
+def benchmark(path, folder, init=None):
+    """
+    Write the model text plainly and with each compression of BENCHMARK_LEVELS (where available) to folder
+    and read it back. init(text) (e.g. initFromString of dTwin) is timed after reading if given.
+    Returns rows (compression, level, bytes, write s, load s).
+    """
+    text = read_text(path, newline="")
+    rows = []
+    settings = [(None, None)]
+    for compression, levels in BENCHMARK_LEVELS.items():
+        if compression == "zstd":
+            try:
+                check(compression)
+            except RuntimeError as e:
+                print(f"Warning: {e}")
+                continue
+        settings += [(compression, level) for level in levels]
+    for compression, level in settings:
+        target = os.path.join(folder, os.path.basename(model_file("bench", compression)))
+        start = time.perf_counter()
+        with open_output(target, compression, level) as f:
+            f.write(text)
+        t_write = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = read_text(target, newline="")
+        if init is not None:
+            init(loaded)
+        t_load = time.perf_counter() - start
+        rows.append((compression or "plain", level or "", os.path.getsize(target), t_write, t_load))
+        os.remove(target)
+    return rows
+
+
+def dtwin_loader(text):
+    """init for benchmark: open_model (initFromString) of a dTwin static model of the type and domain of text."""
+    import dTwin
+    from .cache import open_model
+    header = re.search(r"^Model\s*\[([^\]]*)\]", text, re.M)
+    attrs = header.group(1) if header else ""
+    domain = "cmplx" if re.search(r"\bdomain\s*=\s*cmplx\b", attrs) else "real"
+    problem = dTwin.StaticProblem.WLS if re.search(r"\btype\s*=\s*WLS\b", attrs) else dTwin.StaticProblem.NLE
+
+    def init(loaded):
+        p_model, _ = open_model(loaded, domain, problem)
+        p_model.release()
+    return init
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Disk size, write and load time of models with gzip and zstd compression.")
+    parser.add_argument("files", nargs="+", help="Model files (.dmodl, plain or compressed).")
+    parser.add_argument("--init", action="store_true", help="Include initFromString of dTwin in the load time.")
+    args = parser.parse_args()
+
+    for path in args.files:
+        try:
+            init = dtwin_loader(read_text(path)) if args.init else None
+            with tempfile.TemporaryDirectory() as folder:
+                rows = benchmark(path, folder, init)
+        except (OSError, RuntimeError, ImportError) as e:
+            print(f"\nError: {path}: {e}")
+            sys.exit(1)
+        plain = rows[0][2]
+        print(f"\n{path}")
+        print(f"  {'compression':<12}{'level':>6}{'MB':>10}{'ratio':>8}{'write s':>10}{'load s':>10}")
+        for compression, level, size, t_write, t_load in rows:
+            print(f"  {compression:<12}{level:>6}{size / 1e6:>10.2f}{plain / size:>8.1f}{t_write:>10.3f}{t_load:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import gzip
+import io
+import os
+import re
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+# Compressed model files. Models of large grids are repetitive text and compress well; the converters
+# write <model>.dmodl.gz (gzip, standard library) or <model>.dmodl.zst (zstd: compression.zstd of
+# Python 3.14 or the zstandard package) with --compress. Readers detect the format by the magic bytes
+# of the file, so compressed and plain models are opened the same way:
+#   open_input / read_text - text of a model (stream decompression, e.g. for initFromString)
+#   decompressed           - path of a plain copy in the temp folder (for initFromFile)
+# core/compressbench.py compares disk size against write and load time of the compressions.
+
+COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst"}
+LEVELS = {"gzip": 6, "zstd": 3}
+MAGIC = {b"\x1f\x8b": "gzip", b"\x28\xb5\x2f\xfd": "zstd"}
+MODEL_SUFFIX = re.compile(r"\.dmodl(\.gz|\.zst)?$")
+
+
+def model_file(base, compression=None):
+    """File name of a model: <base>.dmodl, with .gz or .zst when compressed."""
+    return base + ".dmodl" + (COMPRESSIONS[compression] if compression else "")
+
+
+def model_stem(path):
+    """Path of a model without .dmodl (and the compression suffix), for its sidecar files."""
+    return MODEL_SUFFIX.sub("", path)
+
+
+def compression_of(path):
+    """Compression of a file by its magic bytes: 'gzip', 'zstd' or None."""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    for prefix, name in MAGIC.items():
+        if magic.startswith(prefix):
+            return name
+    return None
+
+
+def _zstd():
+    """zstd module: compression.zstd (Python 3.14) or zstandard. Raises RuntimeError if neither is installed."""
+    try:
+        from compression import zstd
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        raise RuntimeError("zstd compression needs Python 3.14 or the zstandard package (pip install zstandard)") from None
+
+
+def check(compression):
+    """Raise RuntimeError (ValueError for unknown names) if models cannot be written with compression."""
+    if compression and compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}' (use {', '.join(COMPRESSIONS)})")
+    if compression == "zstd":
+        _zstd()
+
+
+def _binary_writer(raw, compression, level):
+    if compression == "gzip":
+        # No file name and time stamp in the header: equal models give equal files
+        return gzip.GzipFile(filename="", mode="wb", compresslevel=level, fileobj=raw, mtime=0)
+    zstd = _zstd()
+    if hasattr(zstd, "ZstdFile"):
+        return zstd.ZstdFile(raw, "wb", level=level)
+    return zstd.ZstdCompressor(level=level).stream_writer(raw, closefd=False)
+
+
+@contextmanager
+def open_output(path, compression=None, level=None):
+    """Text file (UTF-8) to write a model to, compressed with compression ('gzip', 'zstd' or None)."""
+    if not compression:
+        with open(path, "w", encoding="utf-8") as f:
+            yield f
+        return
+    check(compression)
+    with open(path, "wb") as raw:
+        with io.TextIOWrapper(_binary_writer(raw, compression, level or LEVELS[compression]), encoding="utf-8") as f:
+            yield f
+
+
+def _binary_reader(path, compression):
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    zstd = _zstd()
+    if hasattr(zstd, "ZstdFile"):
+        return zstd.ZstdFile(path, "rb")
+    return zstd.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+
+
+def open_input(path, newline=None):
+    """Text file (UTF-8) of a plain or compressed model (newline as for open)."""
+    compression = compression_of(path)
+    if compression is None:
+        return open(path, encoding="utf-8", newline=newline)
+    return io.TextIOWrapper(_binary_reader(path, compression), encoding="utf-8", newline=newline)
+
+
+def read_text(path, newline=None):
+    """Text of a plain or compressed model."""
+    with open_input(path, newline) as f:
+        return f.read()
+
+
+@contextmanager
+def decompressed(path):
+    """Path of a plain model: path itself, or a temporary copy of a compressed model (removed afterwards)."""
+    compression = compression_of(path)
+    if compression is None:
+        yield path
+        return
+    fd, plain = tempfile.mkstemp(suffix=".dmodl")
+    try:
+        with os.fdopen(fd, "wb") as out, _binary_reader(path, compression) as f:
+            shutil.copyfileobj(f, out, 1 << 20)
+        yield plain
+    finally:
+        os.remove(plain)
+
+
+def describe(path, text_bytes):
+    """Disk size of a written model compared to its text size."""
+    size = os.path.getsize(path)
+    return f"{size / 1e6:.2f} MB on disk ({text_bytes / max(size, 1):.1f}x smaller than the text)"
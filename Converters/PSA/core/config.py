@@ -0,0 +1,186 @@
+import json
+import sys
+import xml.etree.ElementTree as ET
+from types import SimpleNamespace
+
+# Reading of config.xml and greek_symbols.json shared by the converters. PF/config.xml holds the
+# power flow settings in its root element, SE/config.xml in <powerFlow> (next to
+# <stateEstimation> and <common>); the functions below take the element with the settings.
+
+# Variable names of the coordinate systems: attribute -> element of <variables>
+VARIABLES = {
+    # --- Polar Coordinate Variables ---
+    "V_mag": "voltage_magnitude",
+    "V_angle": "voltage_angle",
+    "Y_mag": "line_admittance_magnitude",
+    "Y_angle": "line_admittance_angle",
+    # --- Rectangular Coordinate Variables ---
+    "e_var": "real_voltage_component",
+    "f_var": "imaginary_voltage_component",
+    "G_var": "conductance",
+    "B_var": "susceptance",
+    # --- Complex Coordinate Variables ---
+    "v_cplx": "complex_voltage",
+    "Y_cplx": "complex_admittance",
+}
+
+# Variable names of the compact naming mode: short ASCII names (t and e are avoided, as they are time and
+# Euler's number in model expressions)
+COMPACT_VARIABLES = {"V_mag": "V", "V_angle": "d", "Y_mag": "Y", "Y_angle": "th", "e_var": "e", "f_var": "f",
+                     "G_var": "G", "B_var": "B", "v_cplx": "v", "Y_cplx": "y", "I_var": "I"}
+
+# Boolean options of <options> (all required)
+FLAGS = ("include_limits", "comment_equations", "comment_params", "zero_loads", "zip_coeff", "zip_Kpone",
+         "calcQOfPVGensInEachIteration", "useSumOfCurrentsForZI", "convertLoadsToImpedance")
+
+# Budgets of the generated model (<budgets>, optional) and their defaults; 0 disables a check
+BUDGETS = {"maxFileMB": 256, "maxLineLength": 20000, "maxTerms": 200, "maxSymbols": 2000000}
+
+
+def load_config(config_file_path, greek_symbols_path):
+    """Parse the configuration file and load the map of Greek symbols. Returns (root element, greek_map)."""
+    #   Error handling for file not found
+    try:
+        # Parsing configuration file for user options and variable naming
+        tree = ET.parse(config_file_path)
+        # Loading map of Greek symbols (used for variable name formatting)
+        with open(greek_symbols_path, 'r', encoding='utf-8') as f:
+            greek_map = json.load(f)
+    except FileNotFoundError as e:
+        print(f"\nError: A required file was not found.")
+        print(f"Details: {e}")
+        print("Please make sure the paths for the input, config, and greek symbols files are correct.")
+        sys.exit(1) # Exit with an error code
+    return tree.getroot(), greek_map
+
+
+def resolve_variable(elem, greek_map):
+    """Variable name of elem: its name, or the Greek symbol of the name for format="symbol"."""
+    name = elem.attrib['name']
+    fmt = elem.attrib.get('format', 'name')
+    if fmt == 'symbol':
+        if name in greek_map:
+            return greek_map[name]
+        else:
+            print(f"Error: Symbol '{name}' not found in greek_map.")
+            sys.exit(1)
+    return name
+
+
+def read_variable_names(variables, greek_map):
+    """
+    Variable names of <variables> (attributes as in VARIABLES). I_var (bus currents) is
+    optional in the config and defaults to 'I'.
+    """
+    names = SimpleNamespace(**{key: resolve_variable(variables.find(tag), greek_map) for key, tag in VARIABLES.items()})
+    current_elem = variables.find('current')
+    names.I_var = resolve_variable(current_elem, greek_map) if current_elem is not None else "I"
+    return names
+
+
+def compact_variable_names(names):
+    """Compact variable names (COMPACT_VARIABLES). Returns (names, dict compact name -> configured name)."""
+    compact = SimpleNamespace(**COMPACT_VARIABLES)
+    renamed = {COMPACT_VARIABLES[key]: getattr(names, key) for key in COMPACT_VARIABLES
+               if getattr(names, key) != COMPACT_VARIABLES[key]}
+    return compact, renamed
+
+
+def read_options(options):
+    """
+    Options of the power flow formulation: converter_type, the FLAGS and param_digits (significant digits
+    of the written Params, optional <paramDigits>; 0 keeps the shortest exact text of each value).
+    """
+    converter_type_element = options.find('converter_type')
+    converter_type = converter_type_element.text.strip().lower() if converter_type_element is not None else 'polar'  # default 'polar' ako nije navedeno
+    opts = SimpleNamespace(converter_type=converter_type)
+    for flag in FLAGS:
+        setattr(opts, flag, options.find(flag).text.strip().lower() == 'true')
+    opts.param_digits = 0
+    digits_element = options.find('paramDigits')
+    if digits_element is not None:
+        try:
+            opts.param_digits = max(0, int(digits_element.text))
+        except (TypeError, ValueError):
+            print(f"Warning: Invalid paramDigits: {digits_element.text}")
+    return opts
+
+
+def read_budgets(budgets):
+    """Size budgets of the generated model: values of <budgets> (missing ones from BUDGETS)."""
+    values = dict(BUDGETS)
+    if budgets is not None:
+        for key in BUDGETS:
+            elem = budgets.find(key)
+            if elem is None:
+                continue
+            try:
+                values[key] = float(elem.text)
+            except (TypeError, ValueError):
+                print(f"Warning: Invalid budget {key}: {elem.text}")
+    return SimpleNamespace(**values)
+
+
+def read_power_limits(limits):
+    """Power limits for bus categorization (if any): dict category -> max value."""
+    power_limits = {}
+
+    if limits is not None:
+        last_value = -float('inf')  # Initialize to the smallest possible value
+        for category in limits.findall('category'):
+            group_name = category.attrib.get('name', '').strip()
+            max_value_raw = category.attrib.get('max', 'inf')
+            # Try to convert max value to float (handles 'inf' as well)
+            try:
+                max_value = float('inf') if max_value_raw.strip().lower() == 'inf' else float(max_value_raw)
+            except ValueError:
+                print(f"Warning: Invalid max value in group '{group_name}': {max_value_raw}")
+                continue
+            # Ensure max values are strictly increasing
+            if max_value <= last_value:
+                print(f"Error: Non-increasing max value for category '{group_name}' (value: {max_value})")
+                sys.exit(1)
+            last_value = max_value
+            power_limits[group_name] = max_value  # Store the valid limit
+    return power_limits
+
+
+def read_zip_limits(zip_limits, zip_coeff):
+    """ZIP model parameters: dict category -> {'max', 'Kz', 'Ki', 'Kp'}. With zip_coeff the coefficients must sum to 1."""
+    zip_limits_data = {}
+
+    if zip_limits is not None:
+        last_value = -float('inf')  # Initialize to lowest possible to ensure increasing order
+        for category in zip_limits.findall('category'):
+            group_name = category.attrib.get('name', '').strip()
+            max_raw = category.attrib.get('max', 'inf')
+            # Parse and validate the max value
+            try:
+                max_val = float('inf') if max_raw.strip().lower() == 'inf' else float(max_raw)
+            except ValueError:
+                print(f"Warning: Invalid max value in '{group_name}': {max_raw}")
+                continue
+
+            if max_val <= last_value:
+                print(f"Error: Non-increasing max value for ZIP category '{group_name}' (value: {max_val})")
+                sys.exit(1)
+            last_value = max_val
+            # Extract ZIP coefficients
+            try:
+                Kz = float(category.attrib.get('Kz', 0.0))
+                Ki = float(category.attrib.get('Ki', 0.0))
+                Kp = float(category.attrib.get('Kp', 1.0))
+            except ValueError:
+                print(f"Warning: Invalid ZIP coefficient in group '{group_name}'")
+                continue
+            # Store ZIP category data
+            zip_limits_data[group_name] = {'max': max_val, 'Kz': Kz, 'Ki': Ki, 'Kp': Kp}
+
+    # Checking sum of ZIP coefficients
+    if zip_coeff:
+        for name, vals in zip_limits_data.items():
+            total = vals['Kz'] + vals['Ki'] + vals['Kp']
+            if abs(total - 1.0) > 1e-6:
+                print(f"Error: Kz + Ki + Kp for '{name}' is not 1 (got: {total})")
+                sys.exit(1)
+    return zip_limits_data
@@ -0,0 +1,431 @@
+import re
+from bisect import bisect_right
+
+from .compression import read_text
+
+# Parser of dTwin model files (.dmodl) into an indexed tree:
+#   ModelFile  - Header (key = value declarations) and the main Model
+#   Model      - Model/SubModel attributes, sections, submodels and the symbol tables (vars, params, distribs)
+#   Section    - Vars, Params, NLEs, ODEs, WLSEs, ECs, IterPostP, Limits, PostProc, ... with their items
+#   Block      - if/else, switch/case and group blocks (closed by 'end')
+#   Declaration, Statement - one ';' separated part of a line, with its source offset and line number
+# The structure and the symbol tables are built in one pass over the lines. Attributes and the
+# parts of statements (weight, lhs, operator, rhs, identifiers) are parsed on first use, so loading
+# a large generated model costs little more than splitting it into lines.
+
+# Sections holding declarations (name = value [attrs]); all others hold statements
+DECLARATION_SECTIONS = frozenset(("Vars", "Params", "Distribs"))
+
+# "Name [attrs] rest:" - Model, SubModel, sections, if, else, switch and group lines
+BLOCK_LINE = re.compile(r"^(\w+)\s*(?:\[([^\]]*)\])?\s*(.*?)\s*:$")
+DECLARATION = re.compile(r"^([^\s=\[]+)\s*(?:=\s*(.*?))?\s*(?:\[([^\]]*)\])?$")
+ATTRIBUTE = re.compile(r"(\w+)\s*=\s*(\"[^\"]*\"|[^\s,\]]+)")
+TRAILING_ATTRIBUTES = re.compile(r"^(.*?)\s*\[([^\]]*)\]$")
+# Assignment operator of a statement (=, +=, -=, *=, /=), not part of ==, <=, >= or !=
+ASSIGNMENT = re.compile(r"(?<![<>=!])([-+*/]?=)(?!=)")
+IDENTIFIER = re.compile(r"@?[^\W\d]\w*(?:\.\w+)*")
+
+
+class DModlError(ValueError):
+    """Structural error in a model file (line is 1-based)."""
+
+    def __init__(self, message, line, path=None):
+        super().__init__(f"{path or '<text>'}:{line}: {message}")
+        self.line = line
+        self.path = path
+
+
+def parse_attributes(text):
+    """Attributes "a=1 b="x y", c=2" as dict name -> value (quotes removed)."""
+    if not text:
+        return {}
+    return {name: value.strip('"') for name, value in ATTRIBUTE.findall(text)}
+
+
+def strip_comment(line):
+    """Line without its // comment (// inside a quoted string is kept)."""
+    k = line.find("//")
+    if k < 0:
+        return line
+    if '"' not in line[:k]:
+        return line[:k]
+    quoted = False
+    for k, c in enumerate(line):
+        if c == '"':
+            quoted = not quoted
+        elif not quoted and c == "/" and line.startswith("//", k):
+            return line[:k]
+    return line
+
+
+class Declaration:
+    """Symbol declaration: name [= value] [attrs] in Vars, Params, Distribs or Header."""
+
+    __slots__ = ("name", "value", "attr_text", "section", "offset", "line", "_attrs")
+    kind = "declaration"
+
+    def __init__(self, name, value, attr_text, section, offset, line):
+        self.name, self.value, self.attr_text, self.section = name, value, attr_text, section
+        self.offset, self.line = offset, line
+        self._attrs = None
+
+    @property
+    def attrs(self):
+        if self._attrs is None:
+            self._attrs = parse_attributes(self.attr_text)
+        return self._attrs
+
+    def __repr__(self):
+        return f"Declaration({self.name!r}, {self.value!r}, line={self.line})"
+
+
+class Statement:
+    """
+    Equation or assignment of an equation section: [attrs] lhs op rhs. Statements without an
+    assignment (e.g. 'repeat') have op and rhs None.
+    """
+
+    __slots__ = ("text", "offset", "line", "_parts")
+    kind = "statement"
+
+    def __init__(self, text, offset, line):
+        self.text, self.offset, self.line = text, offset, line
+        self._parts = None
+
+    def _split(self):
+        text, attrs = self.text, {}
+        if text.startswith("["):
+            k = text.find("]")
+            if k > 0:
+                attrs = parse_attributes(text[1:k])
+                text = text[k + 1:].lstrip()
+        match = ASSIGNMENT.search(text)
+        if match is None:
+            self._parts = (attrs, text, None, None)
+        else:
+            self._parts = (attrs, text[:match.start()].rstrip(), match.group(1), text[match.end():].lstrip())
+        return self._parts
+
+    @property
+    def attrs(self):
+        """Leading attributes (e.g. {'w': 'w_inj'} of a WLSE)."""
+        return (self._parts or self._split())[0]
+
+    @property
+    def lhs(self):
+        return (self._parts or self._split())[1]
+
+    @property
+    def op(self):
+        return (self._parts or self._split())[2]
+
+    @property
+    def rhs(self):
+        return (self._parts or self._split())[3]
+
+    def identifiers(self):
+        """Names used in the statement (symbols, functions, @main.x references), without attributes."""
+        parts = self._parts or self._split()
+        return set(IDENTIFIER.findall(parts[1] if parts[3] is None else f"{parts[1]} {parts[3]}"))
+
+    def __repr__(self):
+        return f"Statement({self.text!r}, line={self.line})"
+
+
+class Block:
+    """
+    if/else, switch and group block (case/default entries of a switch are blocks too).
+    condition : condition of if and case (None for switch, group and default)
+    body, orelse : items of the block and of its else part
+    """
+
+    __slots__ = ("kind", "condition", "attr_text", "offset", "line", "body", "orelse", "_attrs")
+
+    def __init__(self, kind, condition, attr_text, offset, line):
+        self.kind, self.condition, self.attr_text = kind, condition, attr_text
+        self.offset, self.line = offset, line
+        self.body, self.orelse = [], []
+        self._attrs = None
+
+    @property
+    def attrs(self):
+        if self._attrs is None:
+            self._attrs = parse_attributes(self.attr_text)
+        return self._attrs
+
+    def __repr__(self):
+        return f"Block({self.kind!r}, {self.condition!r}, line={self.line})"
+
+
+def walk(items):
+    """Declarations and statements of items, including those nested in blocks (in source order)."""
+    for item in items:
+        if isinstance(item, Block):
+            yield from walk(item.body)
+            yield from walk(item.orelse)
+        else:
+            yield item
+
+
+class Section:
+    """Section of a model (or the Header) with its items in source order."""
+
+    __slots__ = ("name", "attr_text", "offset", "line", "items", "_attrs")
+
+    def __init__(self, name, attr_text, offset, line):
+        self.name, self.attr_text, self.offset, self.line = name, attr_text, offset, line
+        self.items = []
+        self._attrs = None
+
+    @property
+    def attrs(self):
+        if self._attrs is None:
+            self._attrs = parse_attributes(self.attr_text)
+        return self._attrs
+
+    def __iter__(self):
+        return walk(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        return f"Section({self.name!r}, items={len(self.items)}, line={self.line})"
+
+
+class Model:
+    """
+    Model or SubModel: attributes, sections (by name, in source order), submodels and symbol
+    tables vars, params, distribs and symbols (all three) as name -> Declaration. A symbol declared
+    again in the same model keeps its first declaration; the later ones are listed in duplicates.
+    """
+
+    def __init__(self, kind, attr_text, offset, line, parent=None):
+        self.kind, self.attr_text, self.offset, self.line = kind, attr_text, offset, line
+        self.parent = parent
+        self.sections = {}
+        self.submodels = []
+        self.vars, self.params, self.distribs = {}, {}, {}
+        self.symbols = {}
+        self.duplicates = []
+        self._attrs = None
+
+    @property
+    def attrs(self):
+        if self._attrs is None:
+            self._attrs = parse_attributes(self.attr_text)
+        return self._attrs
+
+    @property
+    def name(self):
+        return self.attrs.get("name")
+
+    @property
+    def type(self):
+        return self.attrs.get("type")
+
+    @property
+    def domain(self):
+        return self.attrs.get("domain", "real")
+
+    def section(self, name):
+        """Section by name (None if the model has no such section)."""
+        return self.sections.get(name)
+
+    def symbol(self, name):
+        """Declaration of a variable, parameter or distribution of this model (None if not declared)."""
+        return self.symbols.get(name)
+
+    def statements(self, *names):
+        """Statements of the named sections (all statement sections by default), including nested ones."""
+        for name, section in self.sections.items():
+            if (name in names) if names else name not in DECLARATION_SECTIONS:
+                yield from section
+
+    def __repr__(self):
+        return f"Model({self.kind!r}, {self.name!r}, sections={list(self.sections)}, line={self.line})"
+
+
+class ModelFile:
+    """
+    Parsed model file: header (Section of Declarations, None without Header), model (main Model)
+    and models (main model and all submodels, in source order). Offsets are character offsets in text.
+    """
+
+    def __init__(self, text, path=None):
+        self.text = text
+        self.path = path
+        self.header = None
+        self.model = None
+        self.models = []
+        self._line_starts = None
+
+    @property
+    def header_values(self):
+        """Header settings as dict name -> value text (quotes removed)."""
+        if self.header is None:
+            return {}
+        return {decl.name: (decl.value or "").strip('"') for decl in self.header}
+
+    def position(self, offset):
+        """(line, column) of a character offset, both 1-based."""
+        if self._line_starts is None:
+            self._line_starts = [0] + [m.end() for m in re.finditer("\n", self.text)]
+        line = bisect_right(self._line_starts, offset)
+        return line, offset - self._line_starts[line - 1] + 1
+
+    def source(self, item):
+        """Source line of a parsed item (without the line break)."""
+        start = item.offset
+        end = self.text.find("\n", start)
+        return self.text[start:end if end >= 0 else len(self.text)].rstrip("\r")
+
+
+def parse(text, path=None):
+    """Parse the text of a model file. Raises DModlError on structural errors."""
+    result = ModelFile(text, path)
+    model = None            # model or submodel receiving sections
+    section = None
+    declarative = False     # section holds declarations
+    table = None            # symbol table of the declarations (None in Header)
+    blocks = []             # open blocks of the section
+    targets = []            # list receiving the items of each open block (body or orelse)
+    target = None           # list receiving the items
+    closed = False          # main model ended
+
+    def error(message):
+        raise DModlError(message, number, path)
+
+    offset = 0
+    for number, raw in enumerate(text.split("\n"), 1):
+        start = offset
+        offset += len(raw) + 1
+        s = (strip_comment(raw) if "/" in raw else raw).strip()
+        if not s:
+            continue
+
+        if s == "end":
+            if blocks:
+                blocks.pop()
+                targets.pop()
+                target = targets[-1] if targets else section.items
+            elif section is not None and section is result.header:
+                section, target = None, None
+            elif model is not None and model.parent is not None:
+                model, section, target = model.parent, None, None
+            elif model is not None and not closed:
+                closed, section, target = True, None, None
+            else:
+                error("'end' without an open block")
+            continue
+
+        if s[-1] == ":":
+            match = BLOCK_LINE.match(s)
+            keyword = match.group(1) if match else s.split(None, 1)[0]
+            if keyword == "if" and section is not None:
+                condition = s[2:-1].strip()
+                attr_text = None
+                trailing = TRAILING_ATTRIBUTES.match(condition)
+                if trailing:
+                    condition, attr_text = trailing.groups()
+                block = Block("if", condition, attr_text, start, number)
+                target.append(block)
+                blocks.append(block)
+                target = block.body
+                targets.append(target)
+                continue
+            if match is None:
+                error(f"Cannot parse '{s}'")
+            name, attr_text, rest = match.groups()
+            if name == "else" and not rest:
+                if not blocks or blocks[-1].kind != "if" or target is not blocks[-1].body:
+                    error("'else' without 'if'")
+                target = targets[-1] = blocks[-1].orelse
+                continue
+            if name in ("switch", "group") and not rest and section is not None:
+                block = Block(name, None, attr_text, start, number)
+                target.append(block)
+                blocks.append(block)
+                target = block.body
+                targets.append(target)
+                continue
+            if rest:
+                error(f"Cannot parse '{s}'")
+            if blocks:
+                error(f"Block started at line {blocks[-1].line} is not closed")
+            if name == "Header":
+                if result.header is not None or result.model is not None:
+                    error("Header must be given once, before the model")
+                section = result.header = Section(name, attr_text, start, number)
+                declarative, table, target = True, None, section.items
+            elif name == "Model":
+                if result.model is not None:
+                    error("Second Model in the file")
+                model = result.model = Model(name, attr_text, start, number)
+                result.models.append(model)
+                section, target = None, None
+            elif name == "SubModel":
+                if model is None or closed:
+                    error("SubModel outside of a model")
+                model = Model(name, attr_text, start, number, parent=model)
+                model.parent.submodels.append(model)
+                result.models.append(model)
+                section, target = None, None
+            else:
+                if model is None or closed:
+                    error(f"Section '{name}' outside of a model")
+                section = model.sections.get(name)
+                if section is None:
+                    section = model.sections[name] = Section(name, attr_text, start, number)
+                declarative, target = name in DECLARATION_SECTIONS, section.items
+                table = {"Vars": model.vars, "Params": model.params, "Distribs": model.distribs}.get(name)
+            continue
+
+        if target is None:
+            error(f"'{s}' outside of a section")
+
+        if blocks and blocks[-1].kind == "switch" and (s.startswith("case ") or s.startswith("default")):
+            head, arrow, tail = s.partition("->")
+            condition = head[4:].strip() if head.startswith("case ") else None
+            block = Block("case", condition, None, start, number)
+            if arrow and tail.strip():
+                block.body.append(Statement(tail.strip(), start, number))
+            target.append(block)
+            continue
+
+        for part in (s.split(";") if ";" in s else (s,)):
+            part = part.strip()
+            if not part:
+                continue
+            if not declarative:
+                target.append(Statement(part, start, number))
+                continue
+            if "[" in part:
+                match = DECLARATION.match(part)
+                if match is None:
+                    error(f"Cannot parse declaration '{part}'")
+                name, value, attr_text = match.groups()
+            else:
+                # name = value (the common case, without the regular expression)
+                name, assign, value = part.partition("=")
+                name, value, attr_text = name.rstrip(), value.strip() if assign else None, None
+                if not name or " " in name or "\t" in name:
+                    error(f"Cannot parse declaration '{part}'")
+            decl = Declaration(name, value, attr_text, section.name, start, number)
+            target.append(decl)
+            if table is not None:
+                if name in model.symbols:
+                    model.duplicates.append(decl)
+                else:
+                    model.symbols[name] = table[name] = decl
+
+    if blocks:
+        raise DModlError(f"Block started at line {blocks[-1].line} is not closed", blocks[-1].line, path)
+    if model is not None and model.parent is not None:
+        raise DModlError("SubModel is not closed with 'end'", model.line, path)
+    return result
+
+
+def load(path):
+    """Read and parse a model file (UTF-8, plain or compressed)."""
+    return parse(read_text(path, newline=""), path)
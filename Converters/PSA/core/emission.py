@@ -0,0 +1,169 @@
+import json
+import time
+from types import SimpleNamespace
+
+from . import dmodl
+
+# Emission statistics of generated models. EmissionStats wraps the output file of a converter
+# (file.write is all the converters use) and collects while the model is written:
+#   per section  - bytes (UTF-8, one byte per line end), lines, symbols (declarations of Vars, Params
+#                  and Distribs) and statements (equations and assignments of the other sections)
+#   extremes     - the longest line and the statement with most terms (' + ' / ' - ' separated), with
+#                  their line numbers, and the number of lines and statements above the budgets
+# The budgets (config.xml <budgets>, see core/config.py read_budgets) only give warnings, so formulation
+# blow-ups (e.g. injection sums of high-degree buses) are noticed while the model is still usable.
+
+BLOCK_KEYWORDS = frozenset(("if", "else", "switch", "group", "end"))
+
+
+class EmissionStats:
+    """
+    Statistics of the text written through it to file (None: statistics only).
+    budgets : namespace of read_budgets (None: no checks)
+    Use as context manager (or call close()) so the last line is counted.
+    """
+
+    def __init__(self, file, budgets=None):
+        self.file = file
+        self.budgets = budgets
+        self.sections = {}
+        self._enter("Header")
+        self.total_bytes = self.lines = 0
+        self.longest = (0, 0, None)         # (characters, line, section)
+        self.most_terms = (0, 0, None)      # (terms, line, section)
+        self.long_lines = self.large_statements = 0
+        self._pending = []
+        self._start = time.perf_counter()
+        self.t_write = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _enter(self, name):
+        self.name = name
+        self.section = self.sections.get(name)
+        if self.section is None:
+            self.section = self.sections[name] = SimpleNamespace(bytes=0, lines=0, symbols=0, statements=0)
+        self.declarative = name in dmodl.DECLARATION_SECTIONS
+
+    def write(self, text):
+        if self.file is not None:
+            self.file.write(text)
+        if "\n" not in text:
+            self._pending.append(text)
+            return
+        if self._pending:
+            self._pending.append(text)
+            text = "".join(self._pending)
+        lines = text.split("\n")
+        rest = lines.pop()
+        self._pending = [rest] if rest else []
+        for line in lines:
+            self._line(line)
+
+    def _line(self, line, end=1):
+        self.lines += 1
+        size = (len(line) if line.isascii() else len(line.encode("utf-8"))) + end
+        self.total_bytes += size
+        s = line.strip()
+        if s.endswith(":") and not s.startswith("//"):
+            match = dmodl.BLOCK_LINE.match(s)
+            if match and match.group(1) not in BLOCK_KEYWORDS and not match.group(3):
+                self._enter(match.group(1))
+        section = self.section
+        section.bytes += size
+        section.lines += 1
+        if len(line) > self.longest[0]:
+            self.longest = (len(line), self.lines, self.name)
+        budgets = self.budgets
+        if budgets is not None and budgets.maxLineLength and len(line) > budgets.maxLineLength:
+            self.long_lines += 1
+        if not s or s.startswith("//") or s.endswith(":") or s == "end" or self.name == "Header":
+            return
+        k = s.find("//")
+        if k >= 0:
+            s = s[:k]
+        if self.declarative:
+            section.symbols += sum(1 for part in s.split(";") if part.strip())
+            return
+        section.statements += 1
+        terms = 1 + s.count(" + ") + s.count(" - ")
+        if terms > self.most_terms[0]:
+            self.most_terms = (terms, self.lines, self.name)
+        if budgets is not None and budgets.maxTerms and terms > budgets.maxTerms:
+            self.large_statements += 1
+
+    def close(self):
+        """Count the last (unterminated) line and stop the write timer."""
+        if self._pending:
+            self._line("".join(self._pending), 0)
+            self._pending = []
+        if self.t_write is None:
+            self.t_write = time.perf_counter() - self._start
+
+    @property
+    def symbols(self):
+        return sum(s.symbols for s in self.sections.values())
+
+    @property
+    def statements(self):
+        return sum(s.statements for s in self.sections.values())
+
+    def warnings(self):
+        """Budget violations as messages (empty without budgets or within them)."""
+        budgets, messages = self.budgets, []
+        if budgets is None:
+            return messages
+        if budgets.maxFileMB and self.total_bytes > budgets.maxFileMB * 1e6:
+            messages.append(f"model size {self.total_bytes / 1e6:.1f} MB exceeds the budget of {budgets.maxFileMB:g} MB")
+        if self.long_lines:
+            length, line, section = self.longest
+            messages.append(f"{self.long_lines} line(s) longer than {budgets.maxLineLength:g} characters "
+                            f"(longest {length}, line {line} in {section})")
+        if self.large_statements:
+            terms, line, section = self.most_terms
+            messages.append(f"{self.large_statements} statement(s) with more than {budgets.maxTerms:g} terms "
+                            f"(most {terms}, line {line} in {section})")
+        if budgets.maxSymbols and self.symbols > budgets.maxSymbols:
+            messages.append(f"{self.symbols} symbols exceed the budget of {budgets.maxSymbols:g}")
+        return messages
+
+    def describe(self):
+        length, line, section = self.longest
+        terms, t_line, t_section = self.most_terms
+        text = (f"{self.total_bytes / 1e6:.2f} MB, {self.lines} lines, {self.symbols} symbols, {self.statements} statements; "
+                f"longest line {length} characters (line {line}, {section}), most terms {terms} (line {t_line}, {t_section})")
+        return text if self.t_write is None else f"{text}; written in {self.t_write:.3f} s"
+
+    def to_dict(self):
+        """Statistics as JSON serializable dict."""
+        return {
+            "bytes": self.total_bytes, "lines": self.lines, "symbols": self.symbols, "statements": self.statements,
+            "longest_line": dict(zip(("characters", "line", "section"), self.longest)),
+            "most_terms": dict(zip(("terms", "line", "section"), self.most_terms)),
+            "t_write": self.t_write,
+            "sections": {name: vars(s) for name, s in self.sections.items()},
+            "budgets": None if self.budgets is None else vars(self.budgets),
+            "warnings": self.warnings(),
+        }
+
+    def save(self, path, **info):
+        """Write to_dict() (and info, e.g. case and converter settings) as JSON."""
+        data = dict(info)
+        data.update(self.to_dict())
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+
+
+def report(stats, stats_path=None, **info):
+    """Print the statistics and budget warnings of a written model; write them to stats_path (JSON) if given."""
+    print(f"  > Output: {stats.describe()}")
+    for message in stats.warnings():
+        print(f"Warning: {message}")
+    if stats_path:
+        stats.save(stats_path, **info)
+        print(f"  > Statistics written to: {stats_path}")
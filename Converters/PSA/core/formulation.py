@@ -0,0 +1,865 @@
+import io
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+from .case import load_case, save_name_map
+from .config import read_variable_names, compact_variable_names, read_options, read_power_limits, read_zip_limits
+from .ybus import build_ybus, branch_admittances
+from .emission import EmissionStats, report as report_emission
+from .compression import model_file, open_output, describe as describe_compression
+from .update import update_path, finish_update
+
+# Expressions of the dmodl equations per coordinate system (complex, polar, rectangular):
+# per-bus injection sums and branch flows, written by the PF and SE converters, and the
+# power flow model of PF/matp2modl.py and SE/matp2modl.py (convert_power_flow).
+
+# Terms of the per-bus injection sums (i - bus of the injection, j - neighbour bus).
+# Rectangular PV node terms keep their own spacing, so generated models stay unchanged.
+INJECTION_TERMS = {
+    # complex: current injected at bus i
+    "current": "{Yc}_{i}_{j} * {vc}_{j}",
+    # polar: sum of powers (P, Q) and sum of currents (real, imag)
+    "p_polar": "{Ym}_{i}_{j} * {Vm}_{j} * cos({Va}_{i}{th} - {Va}_{j})",
+    "q_polar": "{Ym}_{i}_{j} * {Vm}_{j} * sin({Va}_{i}{th} - {Va}_{j})",
+    "re_polar": "{Ym}_{i}_{j} * {Vm}_{j} * cos({Va}_{j}{th_i})",
+    "im_polar": "{Ym}_{i}_{j} * {Vm}_{j} * sin({Va}_{j}{th_i})",
+    # rectangular: sum of powers at PQ nodes, at PV nodes and in the PV equation of the PF SubModel
+    "p_rect": "{e}_{i} * ({G}_{i}_{j} * {e}_{j} - {B}_{i}_{j} * {f}_{j}) + {f}_{i} * ({B}_{i}_{j} * {e}_{j} + {G}_{i}_{j} * {f}_{j})",
+    "q_rect": "{f}_{i} * ({G}_{i}_{j} * {e}_{j} - {B}_{i}_{j} * {f}_{j}) - {e}_{i} * ({B}_{i}_{j} * {e}_{j} + {G}_{i}_{j} * {f}_{j})",
+    "p_rect_pv": "{e}_{i}*({G}_{i}_{j} * {e}_{j} - {B}_{i}_{j} * {f}_{j}) + {f}_{i}*({B}_{i}_{j} * {e}_{j} + {G}_{i}_{j} * {f}_{j})",
+    "q_rect_pv": "{f}_{i}*({G}_{i}_{j}*{e}_{j} - {B}_{i}_{j}*{f}_{j}) - {e}_{i}*({B}_{i}_{j}*{e}_{j} + {G}_{i}_{j}*{f}_{j})",
+    "p_rect_pf_pv": "{e}_{i}*({G}_{i}_{j} * {e}_{j} - {B}_{i}_{j} * {f}_{j}) + {f}_{i} * ({G}_{i}_{j} * {f}_{j} + {B}_{i}_{j} * {e}_{j})",
+    # rectangular: sum of currents (real, imag)
+    "re_rect": "{G}_{i}_{j} * {e}_{j} - {B}_{i}_{j} * {f}_{j}",
+    "im_rect": "{B}_{i}_{j} * {e}_{j} + {G}_{i}_{j} * {f}_{j}",
+}
+
+
+class InjectionExpressions:
+    """
+    Cache of per-bus injection sums (e.g. Y_i_j * v_j + ...), built once per bus and kind
+    and shared by the PF SubModel, measurement generation, WLSEs, ECs and PostProc.
+
+    current_buses : buses with current variables in the main (WLS) model (option useCurrentVars).
+    For these buses current() and power() reference the variables instead of the inlined sums.
+    """
+
+    def __init__(self, ctx, current_buses=()):
+        self.ctx = ctx
+        self.sums = {}
+        self.neighbours = {}
+        self.current_buses = list(current_buses)
+        self._current_set = set(self.current_buses)
+
+    def _neighbours(self, i_idx):
+        """Matrix indices of the nonzero Y-bus entries in row i_idx (converter specific test)."""
+        cols = self.neighbours.get(i_idx)
+        if cols is None:
+            ctx = self.ctx
+            if ctx.converter_type == "complex":
+                cols = np.nonzero(np.abs(ctx.Y[i_idx]) > ctx.eps)[0]
+            elif ctx.converter_type == "polar":
+                cols = np.nonzero(ctx.Y[i_idx])[0]
+            else:
+                cols = np.nonzero((np.abs(ctx.G[i_idx]) >= ctx.eps) | (np.abs(ctx.B[i_idx]) >= ctx.eps))[0]
+            self.neighbours[i_idx] = cols
+        return cols
+
+    def sum(self, kind, bus_id):
+        """Sum of INJECTION_TERMS[kind] over the neighbours of bus_id (joined with ' + ')."""
+        key = (kind, bus_id)
+        expr = self.sums.get(key)
+        if expr is None:
+            expr = " + ".join(self.terms(kind, bus_id))
+            self.sums[key] = expr
+        return expr
+
+    def terms(self, kind, bus_id):
+        ctx = self.ctx
+        i_idx = ctx.bus_id_map[bus_id]
+        cols = self._neighbours(i_idx)
+        names = dict(Yc=ctx.Y_cplx, vc=ctx.v_cplx, Ym=ctx.Y_mag, Ya=ctx.Y_angle, Vm=ctx.V_mag, Va=ctx.V_angle,
+                     e=ctx.e_var, f=ctx.f_var, G=ctx.G_var, B=ctx.B_var, i=bus_id)
+        template = INJECTION_TERMS[kind]
+        if ctx.converter_type == "polar":
+            # Admittance angle appears only where it is nonzero
+            has_angle = np.angle(ctx.Y[i_idx, cols]) != 0
+        else:
+            has_angle = np.zeros(len(cols), dtype=bool)
+        terms = []
+        for j_idx, angle in zip(cols, has_angle):
+            j = ctx.index_to_bus_id[j_idx]
+            th = f" - {ctx.Y_angle}_{bus_id}_{j}" if angle else ""
+            th_i = f" + {ctx.Y_angle}_{bus_id}_{j}" if angle else ""
+            terms.append(template.format(j=j, th=th, th_i=th_i, **names))
+        return terms
+
+    def current_vars(self, bus_id):
+        """Current variables of bus_id: complex I_k, real domain I_k_re and I_k_im."""
+        I_var = self.ctx.I_var
+        if self.ctx.converter_type == "complex":
+            return [f"{I_var}_{bus_id}"]
+        return [f"{I_var}_{bus_id}_re", f"{I_var}_{bus_id}_im"]
+
+    def current_definitions(self, bus_id):
+        """Equations (lhs, rhs) that define the current variables of bus_id."""
+        names = self.current_vars(bus_id)
+        if self.ctx.converter_type == "complex":
+            current = self.sum("current", bus_id)
+            return [(names[0], current), (f"conj({names[0]})", f"conj({current})")]
+        part = "polar" if self.ctx.converter_type == "polar" else "rect"
+        return [(names[0], self.sum(f"re_{part}", bus_id)), (names[1], self.sum(f"im_{part}", bus_id))]
+
+    def current(self, bus_id):
+        """Complex current injected at bus_id (main model)."""
+        if bus_id in self._current_set:
+            return self.current_vars(bus_id)[0]
+        return self.sum("current", bus_id)
+
+    def power(self, kind, bus_id):
+        """
+        Sum of powers of kind (p_* or q_*) at bus_id (main model). With current variables:
+        polar P = V_i * (cos(delta_i) * I_re + sin(delta_i) * I_im), Q = V_i * (sin(delta_i) * I_re - cos(delta_i) * I_im)
+        (the factor of V_i is returned, as for the sum), rectangular P = e_i * I_re + f_i * I_im, Q = f_i * I_re - e_i * I_im.
+        """
+        if bus_id not in self._current_set:
+            return self.sum(kind, bus_id)
+        ctx = self.ctx
+        i_re, i_im = self.current_vars(bus_id)
+        if ctx.converter_type == "polar":
+            angle = f"{ctx.V_angle}_{bus_id}"
+            if kind.startswith("p"):
+                return f"cos({angle}) * {i_re} + sin({angle}) * {i_im}"
+            return f"sin({angle}) * {i_re} - cos({angle}) * {i_im}"
+        e, f = f"{ctx.e_var}_{bus_id}", f"{ctx.f_var}_{bus_id}"
+        if kind.startswith("p"):
+            return f"{e} * {i_re} + {f} * {i_im}"
+        return f"{f} * {i_re} - {e} * {i_im}"
+
+
+def format_complex(z):
+    return f"{float(z.real)}{'-' if z.imag < 0 else '+'}{abs(float(z.imag))}i"
+
+
+def format_values(values, digits=0):
+    """
+    Texts of an array of values, converted at once. digits=0 gives the shortest text that reads back
+    to the same double (the text of f"{x}"), otherwise the value rounded to digits significant digits.
+    """
+    values = np.asarray(values, dtype=float).ravel().tolist()
+    if not digits:
+        return list(map(repr, values))
+    spec = f".{digits}g"
+    return [format(v, spec) for v in values]
+
+
+def write_admittances(file, ctx, transformer_set, comment_params, digits=0):
+    """
+    Nonzero Y-bus entries as Params, in row order: magnitude and nonzero angle (polar), G and B (rectangular,
+    below ctx.eps written as 0) or the complex value. Parts of all entries are computed and formatted at once
+    (see format_values) instead of per matrix element; ctx is the one of InjectionExpressions.
+    """
+    rows, cols = np.nonzero(ctx.Y)
+    y = ctx.Y[rows, cols]
+    ids = ctx.index_to_bus_id
+    pairs = [(ids[i], ids[j]) for i, j in zip(rows.tolist(), cols.tolist())]
+    if ctx.converter_type == "polar":
+        # np.hypot gives the values of abs() on single elements (np.abs of complex arrays may differ in the last bit)
+        angle = np.angle(y)
+        values = zip(format_values(np.hypot(y.real, y.imag), digits), format_values(angle, digits), (angle != 0).tolist())
+        entries = [f"\t{ctx.Y_mag}_{i}_{j} = {m}; " + (f"{ctx.Y_angle}_{i}_{j} = {a} " if nonzero else "")
+                   for (i, j), (m, a, nonzero) in zip(pairs, values)]
+    elif ctx.converter_type == "rectangular":
+        g = ["0" if small else text for text, small in zip(format_values(y.real, digits), (np.abs(y.real) < ctx.eps).tolist())]
+        b = ["0" if small else text for text, small in zip(format_values(y.imag, digits), (np.abs(y.imag) < ctx.eps).tolist())]
+        entries = [f"\t{ctx.G_var}_{i}_{j} = {g_val}; {ctx.B_var}_{i}_{j} = {b_val} " for (i, j), g_val, b_val in zip(pairs, g, b)]
+    else:
+        values = zip(format_values(y.real, digits), format_values(y.imag, digits),
+                     (y.real != 0).tolist(), (y.imag != 0).tolist(), (y.imag > 0).tolist())
+        entries = [f"\t{ctx.Y_cplx}_{i}_{j} = " + (f"{re} " + ("+ " if positive else "") if has_re else "")
+                   + (f"{im}i " if has_im else "")
+                   for (i, j), (re, im, has_re, has_im, positive) in zip(pairs, values)]
+    # Comments of lines and transformers
+    if comment_params:
+        ends = [("\n" if i == j else f"// transformer {bus_i}-{bus_j}\n" if (i, j) in transformer_set else f"// line {bus_i}-{bus_j}\n")
+                for i, j, (bus_i, bus_j) in zip(rows.tolist(), cols.tolist(), pairs)]
+    else:
+        ends = ["\n"] * len(entries)
+    file.write("".join(entry + end for entry, end in zip(entries, ends)))
+
+
+class BranchFlows:
+    """
+    Branch flow measurements. A measurement of branch k at end m (other end o) is
+        S_m = v_m * conj(Y_mm * v_m + Y_mo * v_o)
+    where (Y_mm, Y_mo) is (Yff, Yft) at the from end and (Ytt, Ytf) at the to end of the branch.
+    The admittances are model parameters of the measurement (e.g. y_4_5_mm, y_4_5_mo).
+    Measurements are (m, o, k) tuples; parallel branches get the branch number in their names.
+    """
+
+    def __init__(self, branch):
+        self.ends = [(int(row[0]), int(row[1])) for row in branch]
+        self.yff, self.yft, self.ytf, self.ytt = branch_admittances(branch)
+        pairs = {}
+        for f, t in self.ends:
+            key = (min(f, t), max(f, t))
+            pairs[key] = pairs.get(key, 0) + 1
+        self.parallel = [pairs[(min(f, t), max(f, t))] > 1 for f, t in self.ends]
+
+    def label(self, m, o, k):
+        return f"{m}_{o}_{k + 1}" if self.parallel[k] else f"{m}_{o}"
+
+    def admittances(self, measurements):
+        """Arrays (Y_mm, Y_mo) of the measurements."""
+        k = np.array([b[2] for b in measurements], dtype=int)
+        at_from = np.array([b[0] == self.ends[b[2]][0] for b in measurements], dtype=bool)
+        return np.where(at_from, self.yff[k], self.ytt[k]), np.where(at_from, self.yft[k], self.ytf[k])
+
+    def write_params(self, file, ctx, measurements):
+        """Params: Y_mm and Y_mo of every measurement in the names of the coordinate system."""
+        if not measurements:
+            return
+        y_mm, y_mo = self.admittances(measurements)
+        for (m, o, k), a, b in zip(measurements, y_mm, y_mo):
+            lbl = self.label(m, o, k)
+            if ctx.converter_type == "complex":
+                file.write(f"\t{ctx.Y_cplx}_{lbl}_mm = {format_complex(a)}; {ctx.Y_cplx}_{lbl}_mo = {format_complex(b)}\n")
+            elif ctx.converter_type == "polar":
+                file.write(f"\t{ctx.Y_mag}_{lbl}_mm = {abs(a)}; {ctx.Y_angle}_{lbl}_mm = {np.angle(a)}; "
+                           f"{ctx.Y_mag}_{lbl}_mo = {abs(b)}; {ctx.Y_angle}_{lbl}_mo = {np.angle(b)}\n")
+            else:
+                file.write(f"\t{ctx.G_var}_{lbl}_mm = {a.real}; {ctx.B_var}_{lbl}_mm = {a.imag}; "
+                           f"{ctx.G_var}_{lbl}_mo = {b.real}; {ctx.B_var}_{lbl}_mo = {b.imag}\n")
+
+    def current(self, ctx, m, o, k):
+        """Complex current at the measured end (complex domain)."""
+        lbl = self.label(m, o, k)
+        return f"{ctx.Y_cplx}_{lbl}_mm * {ctx.v_cplx}_{m} + {ctx.Y_cplx}_{lbl}_mo * {ctx.v_cplx}_{o}"
+
+    def powers(self, ctx, m, o, k):
+        """Active and reactive power flow at the measured end (real domain)."""
+        lbl = self.label(m, o, k)
+        if ctx.converter_type == "polar":
+            V, d, Ym, Ya = ctx.V_mag, ctx.V_angle, ctx.Y_mag, ctx.Y_angle
+            angle = f"{d}_{m} - {d}_{o} - {Ya}_{lbl}_mo"
+            p = f"{V}_{m}^2 * {Ym}_{lbl}_mm * cos({Ya}_{lbl}_mm) + {V}_{m} * {V}_{o} * {Ym}_{lbl}_mo * cos({angle})"
+            q = f"{V}_{m} * {V}_{o} * {Ym}_{lbl}_mo * sin({angle}) - {V}_{m}^2 * {Ym}_{lbl}_mm * sin({Ya}_{lbl}_mm)"
+            return p, q
+        e, f, G, B = ctx.e_var, ctx.f_var, ctx.G_var, ctx.B_var
+        i_re = f"{G}_{lbl}_mo * {e}_{o} - {B}_{lbl}_mo * {f}_{o}"
+        i_im = f"{B}_{lbl}_mo * {e}_{o} + {G}_{lbl}_mo * {f}_{o}"
+        v2 = f"({e}_{m}^2 + {f}_{m}^2)"
+        p = f"{v2} * {G}_{lbl}_mm + {e}_{m} * ({i_re}) + {f}_{m} * ({i_im})"
+        q = f"{f}_{m} * ({i_re}) - {e}_{m} * ({i_im}) - {v2} * {B}_{lbl}_mm"
+        return p, q
+
+
+# Block-parallel emission: the NLEs of a PQ or PV node depend only on its bus. With --jobs > 1 (and at least
+# PARALLEL_MIN_BUSES buses) chunks of buses are written to text by worker processes, which get the equation
+# context once, and the texts are joined in bus order, so the model does not depend on the number of jobs.
+# The writers are shared by the PF model and the power flow SubModel of SE/matp2modlSE.py; ctx.indent is the
+# indentation of the equation lines ("\t" in the PF model, "\t\t" in the SubModel).
+PARALLEL_MIN_BUSES = 1000
+CHUNKS_PER_JOB = 4
+_blocks = {}
+
+def _init_block_worker(ctx):
+    _blocks["ctx"] = ctx
+
+def _write_block(writer, buses):
+    text = io.StringIO()
+    ctx = _blocks["ctx"]
+    for bus_id in buses:
+        writer(text, ctx, bus_id)
+    return text.getvalue()
+
+def write_equations(file, ctx, writer, buses, pool=None, jobs=1):
+    """Write writer(file, ctx, bus) for all buses, in chunks by the worker processes of pool if given."""
+    if pool is None:
+        for bus_id in buses:
+            writer(file, ctx, bus_id)
+        return
+    size = max(1, -(-len(buses) // (jobs * CHUNKS_PER_JOB)))
+    chunks = [buses[k:k + size] for k in range(0, len(buses), size)]
+    for text in pool.map(_write_block, [writer] * len(chunks), chunks):
+        file.write(text)
+
+
+def write_pq_equations(file, ctx, bus_id):
+    """NLEs of PQ node bus_id: balance of active and reactive power (or of currents at ZI nodes)."""
+    converter_type, injections, bus_id_map, bus = ctx.converter_type, ctx.injections, ctx.bus_id_map, ctx.bus
+    P_inj, Q_inj, baseMVA = ctx.P_inj, ctx.Q_inj, ctx.baseMVA
+    V_mag, V_angle, e_var, f_var, v_cplx = ctx.V_mag, ctx.V_angle, ctx.e_var, ctx.f_var, ctx.v_cplx
+    comment_equations, useSumOfCurrentsForZI = ctx.comment_equations, ctx.useSumOfCurrentsForZI
+    zip_coeff, zip_limits_data, ind = ctx.zip_coeff, ctx.zip_limits_data, ctx.indent
+    k_load = f" * k{bus_id}_load" if bus_id in ctx.load_curves else ""
+
+    if comment_equations:
+        file.write(f"{ind}// node {bus_id} - PQ\n")
+    i_idx = bus_id_map[bus_id]
+
+    # Calculate real and reactive power in system units (MW, MVar)
+    p_val = P_inj[i_idx]*baseMVA
+    q_val = Q_inj[i_idx]*baseMVA
+    s_magnitude = np.sqrt(p_val**2 + q_val**2)  # Apparent power magnitude
+
+    # Write real power balance equation for PQ node
+    if converter_type == "polar":
+        file.write(ind) # Start the line             
+        if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0:
+            # This formulation comes from P_i = Re(V_i * I_i_conj), where I_i is the sum of currents
+            # P_i = V_mag_i * (cos(V_angle_i) * Real(I_i) + sin(V_angle_i) * Imag(I_i))
+            # Real(I_i) = Sum_j [Y_mag_ij * V_mag_j * cos(V_angle_j + Y_angle_ij)]
+            # Imag(I_i) = Sum_j [Y_mag_ij * V_mag_j * sin(V_angle_j + Y_angle_ij)]
+            real_sum = injections.sum("re_polar", bus_id)
+            if ctx.zi_current_parts:
+                file.write(f"{real_sum} ")
+            else:
+                imag_sum = injections.sum("im_polar", bus_id)
+                file.write(f"cos({V_angle}_{bus_id}) * ({real_sum}) + sin({V_angle}_{bus_id}) * ({imag_sum}) ")
+        else:
+            # Sum of Powers formulation
+            file.write(f"{V_mag}_{bus_id} * (")
+            file.write(injections.sum("p_polar", bus_id))
+            file.write(") ")
+    elif converter_type == "rectangular":
+        if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0: # sum of currents
+            file.write(ind)
+            file.write(injections.sum("re_rect", bus_id))
+        else: # powers
+            file.write(ind)  
+            file.write(injections.sum("p_rect", bus_id))
+    elif converter_type == "complex": 
+        if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0: #sum of currents
+            current_summation = injections.sum("current", bus_id)
+            file.write(f"{ind}conj({current_summation}")
+        else: # power
+            file.write(f"{ind}{v_cplx}_{bus_id} * conj(")
+            file.write(injections.sum("current", bus_id))
+        if P_inj[i_idx] == 0 and Q_inj[i_idx] == 0:
+            file.write(") = 0\n")
+        else:
+            # Writing complex ZIP if included
+            if zip_coeff:
+                for group_name, data in zip_limits_data.items():
+                        if s_magnitude < data['max']:
+                            Vm = np.array([row[7] for row in bus])
+                            if Vm[i_idx] != 1:
+                                file.write(f") = S{bus_id}_inj*(Kz_{group_name}*({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})/{Vm[i_idx]}^2) + Ki_{group_name}*(sqrt({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id}))/{Vm[i_idx]}) + Kp_{group_name}) \n")
+                            else:
+                                file.write(f") = S{bus_id}_inj*(Kz_{group_name}*({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})) + Ki_{group_name}*sqrt({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})) + Kp_{group_name}) \n")
+                            break
+            else:
+                file.write(f") = S{bus_id}_inj{k_load}\n")
+    # Handle optional ZIP load model or default power injection form
+    if converter_type != "complex":
+        if P_inj[i_idx] == 0:
+            file.write(" = 0\n")
+        else:
+            if zip_coeff:
+                if converter_type == "polar":
+                    for group_name, data in zip_limits_data.items():
+                        if s_magnitude < data['max']:
+                            Vm = np.array([row[7] for row in bus])
+                            if Vm[i_idx] != 1:
+                                file.write(f" = P{bus_id}_inj*(Kz_{group_name}*({V_mag}_{bus_id}/{Vm[i_idx]})^2 + Ki_{group_name}*({V_mag}_{bus_id}/{Vm[i_idx]}) + Kp_{group_name}) \n")
+                            else:
+                                file.write(f" = P{bus_id}_inj*(Kz_{group_name}*({V_mag}_{bus_id})^2 + Ki_{group_name}*{V_mag}_{bus_id} + Kp_{group_name}) \n")
+                            break
+                elif converter_type == "rectangular":
+                    for group_name, data in zip_limits_data.items():
+                        if s_magnitude < data['max']:
+                            Vm = np.array([row[7] for row in bus])
+                            if Vm[i_idx] != 1:
+                                file.write(f" = P{bus_id}_inj*(Kz_{group_name}*(({e_var}_{bus_id}^2+{f_var}_{bus_id}^2)/{Vm[i_idx]}^2) + Ki_{group_name}*(sqrt({e_var}_{bus_id}^2+{f_var}_{bus_id}^2)/{Vm[i_idx]}) + Kp_{group_name}) \n")
+                            else:
+                                file.write(f" = P{bus_id}_inj*(Kz_{group_name}*({e_var}_{bus_id}^2+{f_var}_{bus_id}^2) + Ki_{group_name}*sqrt({e_var}_{bus_id}^2+{f_var}_{bus_id}^2) + Kp_{group_name}) \n")
+                            break
+            else:
+                file.write(f" = P{bus_id}_inj{k_load}\n")
+
+    # Write reactive power balance equation for PQ node or KL1 if injected power is zero
+    if converter_type == "polar":
+        if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0:
+            # This formulation comes from Q_i = Im(V_i * I_i_conj)
+            # Q_i = V_mag_i * (sin(V_angle_i) * Real(I_i) - cos(V_angle_i) * Imag(I_i))                    
+            imag_sum = injections.sum("im_polar", bus_id)
+            if ctx.zi_current_parts:
+                file.write(f"{ind}{imag_sum} ")
+            else:
+                real_sum = injections.sum("re_polar", bus_id)
+                file.write(f"{ind}sin({V_angle}_{bus_id}) * ({real_sum}) - cos({V_angle}_{bus_id}) * ({imag_sum}) ")
+        else:
+            file.write(f"{ind}{V_mag}_{bus_id} * (")
+            file.write(injections.sum("q_polar", bus_id))
+            file.write(") ")
+    elif converter_type == "rectangular":
+        if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0:                   
+            file.write(ind)
+            file.write(injections.sum("im_rect", bus_id))
+        else:
+            file.write(ind) 
+            file.write(injections.sum("q_rect", bus_id))
+    elif converter_type == "complex": 
+        if useSumOfCurrentsForZI and P_inj[i_idx]==0 and Q_inj[i_idx]==0:
+            current_summation = injections.sum("current", bus_id)
+            file.write(f"{ind}({current_summation}")
+        else:                 
+            v_i = f"{v_cplx}_{bus_id}"
+            conj_vi = f"conj({v_i})"
+            rhs = f"conj(S{bus_id}_inj)"
+            file.write(f"{ind}{conj_vi} * (")
+            file.write(injections.sum("current", bus_id))
+        if P_inj[i_idx] == 0 and Q_inj[i_idx] == 0:
+            rhs = f"0"
+        else:
+            if zip_coeff:
+                for group_name, data in zip_limits_data.items():
+                        if s_magnitude < data['max']:
+                            Vm = np.array([row[7] for row in bus])
+                            if Vm[i_idx] != 1:
+                                rhs = f" conj(S{bus_id}_inj)*(Kz_{group_name}*({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})/{Vm[i_idx]}^2) + Ki_{group_name}*(sqrt({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id}))/{Vm[i_idx]}) + Kp_{group_name}) \n"
+                            else:
+                                rhs = f" conj(S{bus_id}_inj)*(Kz_{group_name}*({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})) + Ki_{group_name}*sqrt({v_cplx}_{bus_id} * conj({v_cplx}_{bus_id})) + Kp_{group_name}) \n"
+                            break
+            else:
+                rhs = f"conj(S{bus_id}_inj{k_load})"
+        file.write(f") = {rhs}\n")
+    # Add Q if not complex domain
+    if converter_type != "complex":
+        if Q_inj[i_idx] == 0:
+            file.write(" = 0\n")
+        else:
+            if zip_coeff:
+                if converter_type == "polar":
+                    for group_name, data in zip_limits_data.items():
+                        if s_magnitude < data['max']:
+                            Vm = np.array([row[7] for row in bus])
+                            if Vm[i_idx] != 1:
+                                file.write(f" = Q{bus_id}_inj*(Kz_{group_name}*({V_mag}_{bus_id}/{Vm[i_idx]})^2 + Ki_{group_name}*({V_mag}_{bus_id}/{Vm[i_idx]}) + Kp_{group_name}) \n")
+                            else:
+                                file.write(f" = Q{bus_id}_inj*(Kz_{group_name}*({V_mag}_{bus_id})^2 + Ki_{group_name}*{V_mag}_{bus_id} + Kp_{group_name}) \n")
+                            break
+                elif converter_type == "rectangular":
+                    for group_name, data in zip_limits_data.items():
+                        if s_magnitude < data['max']:
+                            Vm = np.array([row[7] for row in bus])
+                            if Vm[i_idx] != 1:
+                                file.write(f" = Q{bus_id}_inj*(Kz_{group_name}*(({e_var}_{bus_id}^2+{f_var}_{bus_id}^2)/{Vm[i_idx]}^2) + Ki_{group_name}*(sqrt({e_var}_{bus_id}^2+{f_var}_{bus_id}^2)/{Vm[i_idx]}) + Kp_{group_name}) \n")
+                            else:
+                                file.write(f" = Q{bus_id}_inj*(Kz_{group_name}*({e_var}_{bus_id}^2+{f_var}_{bus_id}^2) + Ki_{group_name}*sqrt({e_var}_{bus_id}^2+{f_var}_{bus_id}^2) + Kp_{group_name}) \n")
+                            break
+            else:
+                file.write(f" = Q{bus_id}_inj{k_load}\n")
+
+
+def write_pv_equations(file, ctx, i):
+    """NLEs of PV node i: active power balance and voltage setpoint (reactive power under limits if enabled)."""
+    converter_type, injections, bus_id_map, P_inj = ctx.converter_type, ctx.injections, ctx.bus_id_map, ctx.P_inj
+    V_mag, e_var, f_var, v_cplx = ctx.V_mag, ctx.e_var, ctx.f_var, ctx.v_cplx
+    comment_equations, include_limits, ind = ctx.comment_equations, ctx.include_limits, ctx.indent
+
+    if comment_equations:
+        file.write(f"{ind}// node {i} - PV\n{ind}")
+    i_idx = bus_id_map[i]
+    k_gen = i in ctx.gen_curves
+
+    # Write real power balance equation for PV node
+    if converter_type == "polar":
+        file.write(f"{V_mag}_{i} * (")
+        file.write(injections.sum("p_polar", i))
+        file.write(f") ")
+    elif converter_type == "rectangular":
+        file.write(injections.sum("p_rect_pf_pv", i))
+    elif converter_type == "complex":
+        current_expr = injections.sum("current", i)
+        file.write(f"{v_cplx}_{i} * conj({current_expr}) + conj({v_cplx}_{i}) * ({current_expr}) ")
+        if P_inj[i_idx] == 0:
+            file.write(" = 0\n")
+        else:
+            file.write(f" = 2*P{i}_inj * k{i}_gen\n" if k_gen else f" = 2*P{i}_inj \n")
+    if converter_type != "complex":
+        if P_inj[i_idx] == 0:
+            file.write(" = 0\n")
+        else:
+            file.write(f" = P{i}_inj * k{i}_gen\n" if k_gen else f" = P{i}_inj \n")
+
+    # Voltage control for PV node (setpoint enforcement or reactive control under limits)
+    if include_limits:
+        file.write(f"{ind}if cGen{i}Reg:\n\t")
+
+    # Voltage equation
+    if converter_type == "polar":
+        file.write(f"{ind}{V_mag}_{i} = {V_mag}_{i}_sp \n")
+    elif converter_type == "rectangular":
+        file.write(f"{ind}{e_var}_{i}^2 + {f_var}_{i}^2 = V_{i}_sp^2 \n")
+    elif converter_type == "complex":
+        file.write(f"{ind}{v_cplx}_{i} * conj({v_cplx}_{i}) = V_{i}_sp^2 \n")
+
+    # Q equation
+    if include_limits:
+        file.write(f"{ind}else:\n")
+        if converter_type == "polar":
+            file.write(f"{ind}\t{V_mag}_{i} * (")
+            file.write(injections.sum("q_polar", i))
+        elif converter_type == "rectangular":
+            file.write(f"{ind}\t(")
+            file.write(injections.sum("q_rect_pv", i))
+        elif converter_type == "complex":
+            inner_expr = "+ " + injections.sum("current", i)
+            file.write(f"{ind}\t{v_cplx}_{i} * conj({inner_expr}) - conj({v_cplx}_{i}) * ({inner_expr}) ")
+            if P_inj[i_idx] == 0:
+                file.write(f" = 0\n{ind}end\n")
+            else:
+                file.write(f" = 2i*Q{i}_inj \n{ind}end\n")
+        if converter_type != "complex":
+            file.write(f") = Q{i}_inj \n")
+            file.write(f"{ind}end\n")
+
+
+def write_node_equations(file, ctx, pq_nodes, pv_nodes, jobs=1):
+    """NLEs of all PQ nodes, then of all PV nodes (block-parallel with jobs > 1 for PARALLEL_MIN_BUSES buses or more)."""
+    if jobs > 1 and len(ctx.bus) >= PARALLEL_MIN_BUSES:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_block_worker, initargs=(ctx,)) as pool:
+            write_equations(file, ctx, write_pq_equations, pq_nodes, pool, jobs)
+            write_equations(file, ctx, write_pv_equations, pv_nodes, pool, jobs)
+    else:
+        write_equations(file, ctx, write_pq_equations, pq_nodes)
+        write_equations(file, ctx, write_pv_equations, pv_nodes)
+
+
+def group_pv_buses(gen, pv_nodes, power_limits):
+    """PV buses with generation grouped by the power limits of config.xml (limit groups of the Q limits)."""
+    # Compute apparent power magnitude for each PV bus bu Qmax and Pmax in MATPOWER
+    pmax_by_bus = {}
+    for g in gen:
+        bus_id = int(g[0])
+        pmax = g[8]  # Column 9 (index 8) is Pmax in MW
+        qmax=g[3]
+        if bus_id in pmax_by_bus:
+            pmax_by_bus[bus_id] += (np.sqrt(pmax**2+qmax**2))
+        else:
+            pmax_by_bus[bus_id] = (np.sqrt(pmax**2+qmax**2))
+
+    # Group buses by their total Pmax and Qmax
+    group_to_buses = {name: [] for name in power_limits.keys()}
+    group_names_sorted = sorted(power_limits.items(), key=lambda x: x[1])
+
+    # Only iterate over PV nodes that have generation attached
+    for bus_id in pv_nodes:
+        if bus_id in pmax_by_bus:
+            pmax_val = pmax_by_bus[bus_id]
+            
+            # Find the correct group for this bus based on its Pmax
+            for name, max_val_config in group_names_sorted:
+                if pmax_val <= max_val_config:
+                    group_to_buses[name].append(bus_id)
+                    break
+    return group_to_buses
+
+
+def write_q_limits(file, ctx, group_to_buses):
+    """IterPostP and Limits sections of the PV node reactive powers (if limits are enabled); sections one level above ctx.indent."""
+    converter_type, injections, V_mag, v_cplx, ind = ctx.converter_type, ctx.injections, ctx.V_mag, ctx.v_cplx, ctx.indent
+    calcQOfPVGensInEachIteration, section = ctx.calcQOfPVGensInEachIteration, ctx.indent[:-1]
+    if not ctx.include_limits:
+        return
+    if calcQOfPVGensInEachIteration:
+        # IterPostP for default reactive power calculation with limits
+        file.write(f"{section}IterPostP:\n")
+        for group_name, bus_list in group_to_buses.items():
+            if not bus_list:
+                continue
+            for i in bus_list:
+                file.write(f"{ind}Q{i}_inj = ")
+                if converter_type == "polar":
+                    file.write(f"{V_mag}_{i} * (")
+                    file.write(injections.sum("q_polar", i))
+                    file.write(")\n")
+                elif converter_type == "rectangular":
+                    file.write(injections.sum("q_rect_pv", i))
+                    file.write("\n")
+                elif converter_type == "complex":
+                    inner_expr = injections.sum("current", i)
+                    file.write(f"imag({v_cplx}_{i} * conj({inner_expr}))\n")
+
+    # Write constraints for limits in the model file
+    file.write(f"{section}Limits:\n")
+    for group_name, bus_list in group_to_buses.items():
+        if not bus_list:
+            continue
+
+        file.write(f"{ind}group [name=\"{group_name}\" enabled=true]:\n")
+        for i in bus_list:
+            file.write(f"{ind}\tif cGen{i}Reg:\n")
+
+            # Write reactive power in limits, not the default setting
+            if not calcQOfPVGensInEachIteration:
+                file.write(f"{ind}\t\tQ{i}_inj = ")
+                if converter_type == "polar":
+                    file.write(f"{V_mag}_{i} * (")
+                    file.write(injections.sum("q_polar", i))
+                    file.write(")\n")
+                elif converter_type == "rectangular":
+                    file.write(injections.sum("q_rect_pv", i))
+                    file.write("\n")
+                elif converter_type == "complex":
+                    inner_expr = injections.sum("current", i)
+                    file.write(f"imag({v_cplx}_{i} * conj({inner_expr}))\n")
+            # Check and enforce lower limit
+            file.write(f"{ind}\t\tif Q{i}_inj<=Q{i}_inj_min [signal=TooLow]:\n")
+            file.write(f"{ind}\t\t\t cGen{i}Reg=false\n")
+            file.write(f"{ind}\t\t\t Q{i}_inj=Q{i}_inj_min\n")
+
+            # Check and enforce upper limit
+            file.write(f"{ind}\t\telse:\n")
+            file.write(f"{ind}\t\t\tif Q{i}_inj>=Q{i}_inj_max [signal=TooHigh]:\n")
+            file.write(f"{ind}\t\t\t\t cGen{i}Reg=false\n")
+            file.write(f"{ind}\t\t\t\t Q{i}_inj=Q{i}_inj_max\n")
+
+            file.write(f"{ind}\t\t\tend\n")
+            file.write(f"{ind}\t\tend\n")
+            file.write(f"{ind}\tend\n")
+        file.write(f"{ind}end\n")
+
+
+def write_q_postproc(file, ctx, group_to_buses):
+    """PostProc lines of the complex domain: reactive powers of the grouped PV nodes."""
+    if ctx.converter_type != "complex":
+        return
+    for group_name, bus_list in group_to_buses.items():
+        if not bus_list:
+            continue
+
+        for i in bus_list:
+            inner_expr = ctx.injections.sum("current", i)
+            file.write(f"{ctx.indent}Q{i}_inj = imag({ctx.v_cplx}_{i} * conj({inner_expr}))\n")
+
+
+def convert_power_flow(case_path, output_base, root, greek_map, budgets, compact=False, update=False, stats=False,
+                       compression=None, jobs=1, select_curves=None, header_comment="", zi_current_parts=False):
+    """
+    Write the power flow model (NLEs) of a MATPOWER case to <output_base>.dmodl: header, Vars, Params,
+    PQ and PV node equations, Q limit groups and PostProc, with the update, --stats, --compress and
+    --compact handling of the converters.
+    root : powerFlow section of config.xml (variables, options, limits, zip_limits); budgets : read_budgets
+    select_curves(case, P_inj, Q_inj) : nodes (load, gen) with consumption curves k<bus>_load, k<bus>_gen
+    header_comment : comment lines written after the generator line
+    zi_current_parts : polar ZI nodes with useSumOfCurrentsForZI get real and imaginary part of the current
+    sum = 0 (as SE) instead of the sums rotated by the voltage angle (as PF)
+    """
+    names = read_variable_names(root.find('variables'), greek_map)
+    if compact:
+        names, renamed = compact_variable_names(names)
+    V_mag, V_angle, e_var, f_var, v_cplx = names.V_mag, names.V_angle, names.e_var, names.f_var, names.v_cplx
+
+    # Reading configuration options from XML
+    opts = read_options(root.find('options'))
+    converter_type = opts.converter_type
+    include_limits, comment_equations, comment_params = opts.include_limits, opts.comment_equations, opts.comment_params
+    zero_loads, zip_coeff, zip_Kpone = opts.zero_loads, opts.zip_coeff, opts.zip_Kpone
+    calcQOfPVGensInEachIteration = opts.calcQOfPVGensInEachIteration
+    useSumOfCurrentsForZI = opts.useSumOfCurrentsForZI
+    convertLoadsToImpedance = opts.convertLoadsToImpedance
+    param_digits = opts.param_digits
+
+    # Power limits for bus categorization and ZIP model parameters
+    power_limits = read_power_limits(root.find('limits'))
+    zip_limits_data = read_zip_limits(root.find('zip_limits'), zip_coeff)
+
+    eps=1e-14
+    # MATPOWER case (buses renumbered 1..n with compact names)
+    case = load_case(case_path)
+    if compact:
+        case = case.renumbered()
+    bus, gen, baseMVA = case.bus, case.gen, case.baseMVA
+    n, bus_id_map, index_to_bus_id = case.n, case.bus_id_map, case.index_to_bus_id
+    pq_nodes, pv_nodes, slack = case.pq_nodes, case.pv_nodes, case.slack
+    gen_by_bus = case.gen_by_bus
+
+    # Bus admittance matrix (G and B are views of the real and imaginary part of Y)
+    Y, G, B, transformer_set = build_ybus(case)
+
+    # Per-bus injection sums of the equations (Y rows are read when a sum is first written,
+    # i.e. after loads are converted to impedances)
+    injections = InjectionExpressions(SimpleNamespace(converter_type=converter_type, eps=eps, Y=Y, G=G, B=B, bus_id_map=bus_id_map,
+                                                      index_to_bus_id=index_to_bus_id, **vars(names)))
+
+    # Compute power injections from generators (Pg, Qg)
+    P_inj = np.zeros(n)
+    Q_inj = np.zeros(n)
+    for bus_id, gens in gen_by_bus.items():
+        for g in gens:
+            bus_idx = bus_id_map[bus_id]
+            Pg = g[1] / baseMVA
+            Qg = g[2] / baseMVA
+            P_inj[bus_idx] += Pg
+            Q_inj[bus_idx] += Qg # should not change anything --> always zero
+
+    # Compute power demands and subtract from injections
+    Pd = np.array([row[2] for row in bus]) / baseMVA
+    Qd = np.array([row[3] for row in bus]) / baseMVA
+    if zero_loads:          # If enabled, set load values to zero for testing
+        Pd = np.zeros(n)
+        Qd = np.zeros(n)
+
+    # Apply the loads based on the chosen model
+    if convertLoadsToImpedance:
+        Vm = np.array([row[7] for row in bus])
+        # Add the equivalent admittance (P - jQ) to the Ybus diagonal
+        for i_idx in range(n):
+             if Vm[i_idx] > 1e-6:
+                shunt_admittance = (Pd[i_idx] - 1j * Qd[i_idx]) / (Vm[i_idx]**2)
+                Y[i_idx, i_idx] += shunt_admittance
+    else: 
+        # Subtract the power demands from the generator injections to get net power
+        for i_idx in range(n):
+            P_inj[i_idx] -= Pd[i_idx]
+            Q_inj[i_idx] -= Qd[i_idx]
+
+    # Nodes with consumption curves (k<bus>_load, k<bus>_gen scale their injections)
+    load_curves, gen_curves = select_curves(case, P_inj, Q_inj) if select_curves else ((), ())
+
+    # Begin writing the dTwin .dmodl file (next to the previous one when updating)
+    model_path = model_file(output_base, compression)
+    write_path = update_path(model_path, update)
+    with open_output(write_path, compression) as out, EmissionStats(out, budgets) as file:
+        # Write model header
+        file.write("""Header:\n\tmaxIter=1000\n\treport=AllDetails\t//Solved - only final solved solution, All - shows solved and nonSolved with iterations, AllDetails - All + debug information\n\tmaxReps = -1\n\toutToTxt = false\nend\n""")
+        file.write("//Generated by MATPOWER to dmodl coverter\n")
+        file.write(header_comment)
+        if converter_type=="complex":
+            file.write(f"Model [type=NL domain=cmplx eps=1e-6 name=\"PF in {converter_type} coordinates\"]:\n")
+        else:
+            file.write(f"Model [type=NL domain=real eps=1e-6 name=\"PF in {converter_type} coordinates\"]:\n")
+
+        # Declare variables for voltage angles and magnitudes (except slack bus)
+        file.write("Vars [out=true]:\n")
+        for bus_id in range(1, n + 1):
+            real_bus_id = index_to_bus_id[bus_id - 1]
+            if real_bus_id not in slack:
+                # Setting voltage angles and magnitudes according to slack values
+                for real_bus_id1 in slack:
+                    if converter_type == "polar":
+                        file.write(f"\t{V_angle}_{real_bus_id} = {V_angle}_{real_bus_id1}; ")
+                        file.write(f"{V_mag}_{real_bus_id} = {V_mag}_{real_bus_id1}\n")
+                    elif converter_type == "rectangular":
+                        file.write(f"\t{e_var}_{real_bus_id} = {e_var}_{real_bus_id1}; ")
+                        file.write(f"{f_var}_{real_bus_id} = {f_var}_{real_bus_id1}\n")
+                    elif converter_type == "complex":
+                        file.write(f"\t{v_cplx}_{real_bus_id} = {v_cplx}_{real_bus_id1}\n")
+
+
+        # Write ZIP model coefficients as parameters if enabled
+        file.write("Params:\n")
+        if zip_coeff:
+            if zip_Kpone:
+                # If enabled, override all ZIP coefficients to make model purely constant power
+                for data in zip_limits_data.values():
+                    data['Kz'] = 0.0
+                    data['Ki'] = 0.0
+                    data['Kp'] = 1.0
+
+            for group_name, data in zip_limits_data.items():
+                file.write(f"\tKz_{group_name} = {data['Kz']}; Ki_{group_name} = {data['Ki']}; Kp_{group_name} = {data['Kp']} \n")
+
+        # Declare slack bus variables 
+        for real_bus_id in slack:
+            row = bus[bus_id_map[real_bus_id]]
+            v_slack = gen_by_bus[real_bus_id][0][5] if real_bus_id in gen_by_bus else row[7]
+            Va_deg = row[8]
+            v_angle = np.deg2rad(Va_deg)
+            if converter_type == "polar":
+                file.write(f"\t{V_angle}_{real_bus_id} = {v_angle} [out=true]; ")
+                file.write(f"\t{V_mag}_{real_bus_id} = {v_slack} [out=true]\n")
+            elif converter_type == "rectangular":
+                file.write(f"\t{e_var}_{real_bus_id} = {v_slack*np.cos(v_angle)} [out=true]; ")
+                file.write(f"\t{f_var}_{real_bus_id} = {v_slack*np.sin(v_angle)} [out=true]\n")
+            elif converter_type == "complex":
+                file.write(f"\t{v_cplx}_{real_bus_id} = {v_slack}*e^(1i*{v_angle}) [out=true]\n")
+        
+        # Write admittance matrix entries as parameters (nonzeros only, formatted at once)
+        write_admittances(file, injections.ctx, transformer_set, comment_params, param_digits)
+
+        # Write active and reactive injections (P_inj, Q_inj) to file
+        P_text, Q_text = format_values(P_inj, param_digits), format_values(Q_inj, param_digits)
+        for i_idx in range(n):
+            bus_id = index_to_bus_id[i_idx]
+            if converter_type == "complex":
+                # Write S for PQ nodes
+                if bus_id in pq_nodes:
+                    if P_inj[i_idx] != 0:
+                        file.write(f"\tS{bus_id}_inj = {P_text[i_idx]}")
+                        if Q_inj[i_idx] > 0:
+                            file.write(f" + {Q_text[i_idx]}i")
+                        elif Q_inj[i_idx] < 0:
+                            file.write(f" {Q_text[i_idx]}i")
+                    if P_inj[i_idx] == 0 and Q_inj[i_idx] != 0:
+                        file.write(f"\tS{bus_id}_inj = {Q_text[i_idx]}i\n")
+                    elif P_inj[i_idx] != 0:
+                        file.write(f" \n")
+                # Write P and Q for PV nodes
+                if bus_id in pv_nodes:
+                    if P_inj[i_idx] != 0:
+                        file.write(f"\tP{bus_id}_inj = {P_text[i_idx]}\n")
+                    if not calcQOfPVGensInEachIteration:
+                        file.write(f"\tQ{bus_id}_inj [out = true]\n")
+                    else: 
+                        file.write(f"\tQ{bus_id}_inj = {Q_text[i_idx]} [out = true]\n")      
+            elif converter_type == "polar" or converter_type == "rectangular":
+                if P_inj[i_idx] != 0:
+                    file.write(f"\tP{bus_id}_inj = {P_text[i_idx]}\n")
+                if Q_inj[i_idx] != 0 and bus_id not in pv_nodes:
+                    file.write(f"\tQ{bus_id}_inj = {Q_text[i_idx]}\n")
+                if bus_id in pv_nodes:
+                    if not calcQOfPVGensInEachIteration:
+                        file.write(f"\tQ{bus_id}_inj [out = true]\n")
+                    else: 
+                        file.write(f"\tQ{bus_id}_inj = {Q_text[i_idx]} [out = true]\n")
+
+        # If enabled, write PV node controls (voltage magnitude setpoint, limits) to file
+        for pv_bus in pv_nodes:
+            if pv_bus in gen_by_bus:
+                g = gen_by_bus[pv_bus][0]
+                if include_limits:
+                    file.write(f"\tcGen{pv_bus}Reg=true\n")
+                    file.write(f"\tQ{pv_bus}_inj_min = {g[4]/baseMVA}\n")
+                    file.write(f"\tQ{pv_bus}_inj_max = {g[3]/baseMVA}\n")
+                file.write(f"\tV_{pv_bus}_sp = {g[5]}\n")
+        for bus_id in load_curves:
+            file.write(f"\tk{bus_id}_load = 1 [type=real]\n" if converter_type == "complex" else f"\tk{bus_id}_load = 1\n")
+        for bus_id in gen_curves:
+            file.write(f"\tk{bus_id}_gen = 1 [type=real]\n" if converter_type == "complex" else f"\tk{bus_id}_gen = 1\n")
+
+        # Begin writing the nonlinear equations (NLEs) section
+        file.write("NLEs:\n")
+
+        # Loop over all PQ nodes to write power balance equations, then over all PV nodes to write
+        # real power balance and voltage control (block-parallel with --jobs)
+        ctx = SimpleNamespace(converter_type=converter_type, injections=injections, bus_id_map=bus_id_map, bus=bus,
+                              P_inj=P_inj, Q_inj=Q_inj, baseMVA=baseMVA, V_mag=V_mag, V_angle=V_angle, e_var=e_var,
+                              f_var=f_var, v_cplx=v_cplx, comment_equations=comment_equations, include_limits=include_limits,
+                              useSumOfCurrentsForZI=useSumOfCurrentsForZI, zip_coeff=zip_coeff, zip_limits_data=zip_limits_data,
+                              zi_current_parts=zi_current_parts, load_curves=set(load_curves), gen_curves=set(gen_curves),
+                              calcQOfPVGensInEachIteration=calcQOfPVGensInEachIteration, indent="\t")
+        write_node_equations(file, ctx, pq_nodes, pv_nodes, jobs)
+
+        # Group the PV buses by their generation, then Q limits (if enabled) and PostProc
+        group_to_buses = group_pv_buses(gen, pv_nodes, power_limits)
+        write_q_limits(file, ctx, group_to_buses)
+        if converter_type == "complex":
+            file.write("PostProc:\n")
+            write_q_postproc(file, ctx, group_to_buses)
+
+        file.write("end\n")
+
+    report_emission(file, output_base + "_stats.json" if stats else None, case=case_path, converter_type=converter_type)
+    if compression:
+        print(f"  > Compressed ({compression}): {describe_compression(write_path, file.total_bytes)}")
+    if write_path != model_path:
+        print(f"  > {finish_update(model_path, write_path).summary}")
+    if compact:
+        save_name_map(output_base + "_names.json", case, renamed, os.path.basename(model_path))
+        print(f"  > Name map written to: {output_base}_names.json")
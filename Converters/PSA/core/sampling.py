@@ -0,0 +1,35 @@
+import sys
+import numpy as np
+
+# Seeded random choices of the SE converters (measurement placement, consumption curve nodes):
+# the same seed gives the same choices, so identical inputs give identical models.
+
+
+def resolve_seed(cli_seed, config_seed):
+    """
+    Seed of the measurement placement: command line (--seed) overrides config (<randomSeed>).
+    Default is 0, so identical inputs give identical models. 'random' draws a fresh seed.
+    """
+    value = cli_seed if cli_seed is not None else config_seed
+    if value is None or value.strip() == "":
+        return 0
+    if value.strip().lower() == "random":
+        return int(np.random.SeedSequence().entropy % 2**32)
+    try:
+        return int(value)
+    except ValueError:
+        print(f"\nError: invalid random seed '{value}' (expected an integer or 'random').")
+        sys.exit(1)
+
+
+def sample_sorted(rng, items, count):
+    """Select count distinct items (in their original order) using generator rng."""
+    idx = np.sort(rng.choice(len(items), size=count, replace=False))
+    return [items[k] for k in idx]
+
+
+def place_consumption_curves(rng, pq_nodes_with_load, pv_nodes, n_load_curves, n_gen_curves):
+    """Random selection of load and generator nodes with consumption curves."""
+    selected_pq_nodes = sorted(sample_sorted(rng, pq_nodes_with_load, int(n_load_curves)))
+    selected_pv_nodes = sorted(sample_sorted(rng, pv_nodes, int(n_gen_curves)))
+    return selected_pq_nodes, selected_pv_nodes
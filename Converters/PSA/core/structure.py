@@ -0,0 +1,324 @@
+import re
+import sys
+import heapq
+import argparse
+from itertools import zip_longest
+from types import SimpleNamespace
+
+# Structural analysis of the equations of a model (.dmodl), without solving it:
+#   incidence   - equation x variable incidence matrix of the equation sections (NLEs, WLSEs, ECs)
+#                 (in the complex domain x and conj(x) are separate columns, as the solver treats them;
+#                 the branches of an if/else and the cases of a switch are alternatives of one
+#                 equation and share its row)
+#   degrees     - nonzeros, row degrees (dense equations) and column degrees
+#   matching    - structural rank (maximum matching of equations to variables)
+#   blocks      - square systems: strongly connected components of the matched system, i.e. the
+#                 blocks of its block triangular form; overdetermined (WLS) systems: connected components
+#   fill-in     - nonzeros added by a symbolic factorization under a minimum degree ordering, of the
+#                 symmetric pattern of the matched matrix (LU, NL models) or of the gain matrix J^T J
+#                 (Cholesky, WLS models)
+# Run from the PSA folder to compare the formulations of the converters:
+#   python -m core.structure PF/caseX_polar.dmodl PF/caseX_complex.dmodl
+
+from . import dmodl
+
+EQUATION_SECTIONS = ("NLEs", "WLSEs", "ECs")
+CONJ_TOKEN = re.compile(r"\bconj\s*\(|[()]|" + dmodl.IDENTIFIER.pattern)
+
+
+def statement_columns(item, columns, n_conj=0):
+    """
+    Columns of the variables used in a statement. In the complex domain (n_conj: number of
+    variables) a variable used inside conj() has column n_conj + its column.
+    """
+    if not n_conj:
+        return {columns[name] for name in item.identifiers() if name in columns}
+    used, brackets = set(), []    # brackets: open brackets, True for conj(
+    for token in CONJ_TOKEN.findall(item.lhs if item.rhs is None else f"{item.lhs} {item.rhs}"):
+        if token == "(" or token == ")":
+            if token == "(":
+                brackets.append(False)
+            elif brackets:
+                brackets.pop()
+        elif token.startswith("conj") and token.endswith("("):
+            brackets.append(True)
+        elif token in columns:
+            used.add(columns[token] + n_conj * (brackets.count(True) % 2))
+    return used
+
+
+def _merge(alternatives):
+    """Rows of alternative branches: k-th equations of all branches share one row."""
+    rows = []
+    for group in zip_longest(*alternatives):
+        group = [row for row in group if row is not None]
+        rows.append((group[0][0], set().union(*(row[1] for row in group))))
+    return rows
+
+
+def equation_rows(items, columns, n_conj=0):
+    """Rows (statement, set of columns) of the equations in items; columns: dict variable -> column."""
+    rows = []
+    for item in items:
+        if isinstance(item, dmodl.Block):
+            if item.kind == "if":
+                rows.extend(_merge([equation_rows(item.body, columns, n_conj), equation_rows(item.orelse, columns, n_conj)]))
+            elif item.kind == "switch":
+                rows.extend(_merge([equation_rows(case.body, columns, n_conj) for case in item.body if isinstance(case, dmodl.Block)]))
+            else:
+                rows.extend(equation_rows(item.body, columns, n_conj))
+        elif isinstance(item, dmodl.Statement) and item.op is not None:
+            rows.append((item, statement_columns(item, columns, n_conj)))
+    return rows
+
+
+def maximum_matching(rows, n_cols):
+    """Maximum matching of rows (lists of columns) to columns. Returns col_match (column -> row or -1)."""
+    row_match = [-1] * len(rows)
+    col_match = [-1] * n_cols
+    # Cheap assignment first, augmenting paths only for the remaining rows
+    for i, row in enumerate(rows):
+        for j in row:
+            if col_match[j] < 0:
+                row_match[i], col_match[j] = j, i
+                break
+    visited = [-1] * n_cols
+    for root in range(len(rows)):
+        if row_match[root] >= 0:
+            continue
+        stack, path = [(root, iter(rows[root]))], []
+        while stack:
+            i, candidates = stack[-1]
+            for j in candidates:
+                if visited[j] == root:
+                    continue
+                visited[j] = root
+                if col_match[j] < 0:
+                    # Augment along the path
+                    for (i_path, _), j_path in zip(stack, path + [j]):
+                        row_match[i_path], col_match[j_path] = j_path, i_path
+                    stack = []
+                    break
+                path.append(j)
+                stack.append((col_match[j], iter(rows[col_match[j]])))
+                break
+            else:
+                stack.pop()
+                if path:
+                    path.pop()
+    return col_match
+
+
+def strong_components(adjacency):
+    """Strongly connected components of a directed graph (list of successor lists), iterative Tarjan."""
+    n = len(adjacency)
+    index, low = [-1] * n, [0] * n
+    on_stack = [False] * n
+    stack, components, counter = [], [], 0
+    for root in range(n):
+        if index[root] >= 0:
+            continue
+        work = [(root, iter(adjacency[root]))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        while work:
+            v, successors = work[-1]
+            for w in successors:
+                if index[w] < 0:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, iter(adjacency[w])))
+                    break
+                if on_stack[w]:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[v])
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(component)
+    return components
+
+
+def connected_components(rows, n_cols):
+    """Number of connected components of the columns linked by the rows (union-find)."""
+    parent = list(range(n_cols))
+
+    def find(j):
+        while parent[j] != j:
+            parent[j] = parent[parent[j]]
+            j = parent[j]
+        return j
+
+    for row in rows:
+        row = list(row)
+        for j in row[1:]:
+            a, b = find(row[0]), find(j)
+            if a != b:
+                parent[a] = b
+    return len({find(j) for j in range(n_cols)})
+
+
+def minimum_degree_fill(adjacency):
+    """
+    Symbolic elimination of a symmetric pattern (list of neighbour sets, no diagonal, modified)
+    in minimum degree order. Returns (fill, edges): added and original off-diagonal pairs.
+    """
+    edges = sum(len(neighbours) for neighbours in adjacency) // 2
+    heap = [(len(neighbours), v) for v, neighbours in enumerate(adjacency)]
+    heapq.heapify(heap)
+    eliminated = [False] * len(adjacency)
+    fill = 0
+    while heap:
+        degree, v = heapq.heappop(heap)
+        if eliminated[v] or degree != len(adjacency[v]):
+            continue    # stale entry
+        eliminated[v] = True
+        neighbours = adjacency[v]
+        for u in neighbours:
+            adjacency[u].discard(v)
+        # The remaining neighbours of v become a clique
+        for u in neighbours:
+            missing = neighbours - adjacency[u]
+            missing.discard(u)
+            if missing:
+                fill += len(missing)
+                adjacency[u] |= missing
+        for u in neighbours:
+            heapq.heappush(heap, (len(adjacency[u]), u))
+        adjacency[v] = set()
+    return fill // 2, edges
+
+
+def analyze(model, top=5):
+    """
+    Structure of the equations of a parsed Model (dmodl). Returns a namespace with the counts,
+    degrees, densest equations (top list of (variables, statement)), unused variables, empty equations,
+    structural rank, blocks (sizes of the strongly connected or connected components) and the
+    fill-in estimate (fill, factor_nnz, factor).
+    """
+    names = list(model.vars)
+    columns = {name: k for k, name in enumerate(names)}
+    n_conj = len(names) if model.domain == "cmplx" else 0
+    if n_conj:
+        names += [f"conj({name})" for name in names]
+    rows = []
+    for name in EQUATION_SECTIONS:
+        section = model.section(name)
+        if section is not None:
+            rows.extend(equation_rows(section.items, columns, n_conj))
+    statements = [item for item, _ in rows]
+    rows = [sorted(row) for _, row in rows]
+    n_eq, n_var = len(rows), len(names)
+    degrees = [len(row) for row in rows]
+    col_degrees = [0] * n_var
+    for row in rows:
+        for j in row:
+            col_degrees[j] += 1
+    nnz = sum(degrees)
+
+    col_match = maximum_matching(rows, n_var)
+    rank = sum(1 for i in col_match if i >= 0)
+    square = model.type != "WLS"
+    if square and n_eq == n_var == rank:
+        # Variable j is solved from its matched equation; j depends on the other variables of that equation
+        blocks = sorted((len(c) for c in strong_components([[k for k in rows[col_match[j]] if k != j] for j in range(n_var)])), reverse=True)
+        adjacency = [set() for _ in range(n_var)]
+        for j in range(n_var):
+            for k in rows[col_match[j]]:
+                if k != j:
+                    adjacency[j].add(k)
+                    adjacency[k].add(j)
+        fill, edges = minimum_degree_fill(adjacency)
+        factor, factor_nnz = "LU", n_var + 2 * (edges + fill)
+    else:
+        blocks = [connected_components(rows, n_var)] if n_var else []
+        adjacency = [set() for _ in range(n_var)]
+        for row in rows:
+            for j in row:
+                adjacency[j].update(row)
+        for j in range(n_var):
+            adjacency[j].discard(j)
+        fill, edges = minimum_degree_fill(adjacency)
+        factor, factor_nnz = "Cholesky of J^T J", n_var + edges + fill
+
+    return SimpleNamespace(
+        name=model.name, type=model.type, domain=model.domain, line=model.line, submodel=model.parent is not None,
+        n_eq=n_eq, n_var=n_var, nnz=nnz, density=nnz / (n_eq * n_var) if n_eq and n_var else 0.0,
+        max_row=max(degrees, default=0), mean_row=nnz / n_eq if n_eq else 0.0, max_col=max(col_degrees, default=0),
+        densest=sorted(zip(degrees, statements), key=lambda d: (-d[0], d[1].line))[:top],
+        unused=[names[j] for j in range(n_var) if col_degrees[j] == 0],
+        empty=[item.line for item, d in zip(statements, degrees) if d == 0],
+        rank=rank, square=square, blocks=blocks, fill=fill, factor=factor, factor_nnz=factor_nnz)
+
+
+def report(info):
+    """Print the analysis of one model."""
+    print(f"{'SubModel' if info.submodel else 'Model'} \"{info.name}\" [type={info.type} domain={info.domain}] (line {info.line})")
+    print(f"  > Equations: {info.n_eq}, variables: {info.n_var}, nonzeros: {info.nnz} (density {100 * info.density:.3g}%)")
+    print(f"  > Row degree: max {info.max_row}, mean {info.mean_row:.2f}; column degree: max {info.max_col}")
+    for degree, item in info.densest:
+        print(f"      line {item.line:<7} {degree:>5} variables  {item.text[:60]}{'...' if len(item.text) > 60 else ''}")
+    full = info.rank == info.n_var
+    print(f"  > Structural rank: {info.rank} of {info.n_var}{'' if full else ' (structurally singular)'}")
+    if info.square and info.n_eq != info.n_var:
+        print(f"Warning: {info.n_eq} equations for {info.n_var} variables")
+    if info.square and full and info.n_eq == info.n_var:
+        print(f"  > Block triangular form: {len(info.blocks)} block(s), largest {info.blocks[0] if info.blocks else 0}")
+    elif info.blocks:
+        print(f"  > Connected components: {info.blocks[0]}")
+    print(f"  > Minimum degree ordering ({info.factor}): fill-in {info.fill}, factor nonzeros {info.factor_nnz}")
+    if info.unused:
+        print(f"Warning: {len(info.unused)} variable(s) in no equation: {', '.join(info.unused[:10])}{' ...' if len(info.unused) > 10 else ''}")
+    if info.empty:
+        print(f"Warning: {len(info.empty)} equation(s) without variables (lines {', '.join(map(str, info.empty[:10]))})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Structural analysis of .dmodl models: incidence matrix, dense equations, structural rank,\nblock triangular form and fill-in under a minimum degree ordering.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("models", nargs="+", help="Model files (.dmodl). With several files a comparison table is printed.")
+    parser.add_argument("-k", "--top", type=int, default=5, help="Number of densest equations to list (default: 5).")
+    parser.add_argument("--submodels", action="store_true", help="Also analyze the SubModels.")
+    args = parser.parse_args()
+
+    summary = []
+    for path in args.models:
+        try:
+            source = dmodl.load(path)
+        except (OSError, ValueError) as e:
+            print(f"\nError: {e}")
+            sys.exit(1)
+        if source.model is None:
+            print(f"\nError: {path} has no Model")
+            sys.exit(1)
+        print(f"{path}:")
+        for model in source.models if args.submodels else [source.model]:
+            info = analyze(model, args.top)
+            report(info)
+            if model is source.model:
+                summary.append((path, info))
+        print()
+
+    if len(summary) > 1:
+        width = max(len(path) for path, _ in summary)
+        print(f"{'model':<{width}}  {'eqs':>8} {'vars':>8} {'nnz':>10} {'max row':>8} {'fill-in':>10} {'factor nnz':>11}")
+        for path, info in summary:
+            print(f"{path:<{width}}  {info.n_eq:>8} {info.n_var:>8} {info.nnz:>10} {info.max_row:>8} {info.fill:>10} {info.factor_nnz:>11}")
+
+
+if __name__ == "__main__":
+    main()
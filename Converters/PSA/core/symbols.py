@@ -0,0 +1,80 @@
+import re
+from fnmatch import translate
+
+# Name -> index registry of an initialized dTwin model. The names of all parameters, variables and
+# output symbols are fetched once (getParameterNames, getVariableNames, getOutputSymbolNames), so
+# scripts resolve names with dict lookups instead of one getParameterIndex call per name, and get
+# UintVectors for the bulk getParameterValues/setParameterValues calls. The index of a parameter
+# (variable) is its position in getParameterNames (getVariableNames).
+
+KINDS = ("params", "vars", "outputs")
+
+
+class SymbolIndex:
+    """
+    Symbol registry of a model.
+
+    params, vars : dict name -> model index
+    outputs : dict name -> column of the output values (getOutputSymbolValues(out_indices))
+    out_indices : output symbol indices of the model (as returned by getOutputSymbolIndices)
+    vector : type of the index vectors (dTwin.UintVector for a model, list by default)
+    """
+
+    def __init__(self, param_names, var_names=(), out_names=(), out_indices=None, vector=list):
+        self.param_names = list(param_names)
+        self.var_names = list(var_names)
+        self.out_names = list(out_names)
+        self.out_indices = out_indices
+        self.vector = vector
+        self.params = {name: k for k, name in enumerate(self.param_names)}
+        self.vars = {name: k for k, name in enumerate(self.var_names)}
+        self.outputs = {name: k for k, name in enumerate(self.out_names)}
+
+    @classmethod
+    def from_model(cls, p_model):
+        """Registry of an initialized model (one call per name list)."""
+        import dTwin
+        out_indices = p_model.getOutputSymbolIndices()
+        return cls(p_model.getParameterNames(), p_model.getVariableNames(),
+                   p_model.getOutputSymbolNames(out_indices), out_indices, dTwin.UintVector)
+
+    def _table(self, kind):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown symbol kind '{kind}' (use one of {', '.join(KINDS)})")
+        return getattr(self, kind)
+
+    def find(self, pattern, kind="params", regex=False):
+        """
+        Names matching a glob pattern (e.g. 'P_load*', 'k?_gen') or, with regex, a regular
+        expression (full match), in index order.
+        """
+        match = re.compile(pattern if regex else translate(pattern)).fullmatch
+        return [name for name in self._table(kind) if match(name)]
+
+    def missing(self, names, kind="params"):
+        """Names that are not symbols of the given kind."""
+        table = self._table(kind)
+        return [name for name in names if name not in table]
+
+    def indices(self, names, kind="params"):
+        """
+        Indices of names as vector (for outputs: list of columns of the output values).
+        Raises ValueError for unknown names.
+        """
+        table = self._table(kind)
+        vector = list if kind == "outputs" else self.vector
+        try:
+            return vector([table[name] for name in names])
+        except KeyError as e:
+            raise ValueError(f"'{e.args[0]}' is not in {kind} of the model") from None
+
+    def select(self, pattern, kind="params", regex=False):
+        """(names, indices) of the symbols matching pattern (see find)."""
+        names = self.find(pattern, kind, regex)
+        return names, self.indices(names, kind)
+
+    def __contains__(self, name):
+        return name in self.params or name in self.vars or name in self.outputs
+
+    def __repr__(self):
+        return f"SymbolIndex(params={len(self.params)}, vars={len(self.vars)}, outputs={len(self.outputs)})"
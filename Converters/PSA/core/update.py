@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import cmath
+from types import SimpleNamespace
+
+from . import dmodl
+from .compression import model_stem
+
+# Parameter-only updates of converted models. When a case changes only in loads or setpoints,
+# the new conversion differs from the previous one only in values of main model Params. The
+# previous model is then kept and the new values are written to <model>_params.json, which is
+# applied to a live (or freshly initialized) model with one setParameterValues call instead of
+# regenerating and reloading the model. Any other difference (sections, equations, declarations,
+# attributes, SubModel parameters, values that are not constants or that other parameters depend
+# on) is structural and the model file is replaced.
+
+CONSTANT_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)(i?)|(pi|π|e)\b|([-+*/^()]))")
+CONSTANTS = {"pi": "pi", "π": "pi", "e": "e"}
+
+
+def constant_value(text):
+    """Value of a constant expression (numbers, 1i, e, pi, + - * / ^ and brackets) or None."""
+    if text is None:
+        return None
+    parts, k = [], 0
+    text = text.strip()
+    while k < len(text):
+        match = CONSTANT_TOKEN.match(text, k)
+        if match is None or match.end() == k:
+            return None
+        number, imag, constant, op = match.groups()
+        if number is not None:
+            parts.append(f"{number}j" if imag else number)
+        elif constant is not None:
+            parts.append(CONSTANTS[constant])
+        else:
+            parts.append("**" if op == "^" else op)
+        k = match.end()
+    if not parts:
+        return None
+    try:
+        # Only whitelisted tokens reach eval
+        value = eval(" ".join(parts), {"__builtins__": {}}, {"pi": cmath.pi, "e": cmath.e})
+    except (SyntaxError, ZeroDivisionError, TypeError, OverflowError):
+        return None
+    return value if isinstance(value, complex) and value.imag != 0 else complex(value).real
+
+
+def _signature(items):
+    """Comparable form of section items (declarations without the values of parameters)."""
+    signature = []
+    for item in items:
+        if isinstance(item, dmodl.Block):
+            signature.append((item.kind, item.condition, item.attr_text, _signature(item.body), _signature(item.orelse)))
+        elif isinstance(item, dmodl.Declaration):
+            signature.append((item.name, item.attr_text))
+        else:
+            signature.append(item.text)
+    return signature
+
+
+def diff_parameters(old, new):
+    """
+    Compare two parsed conversions (dmodl.ModelFile). Returns (changes, reasons): changes maps
+    main model parameters to their new value text, reasons lists structural differences
+    (empty if the models differ only in changes).
+    """
+    reasons = []
+    if old.header_values != new.header_values:
+        reasons.append("header changed")
+    if len(old.models) != len(new.models):
+        reasons.append("number of SubModels changed")
+        return {}, reasons
+    changes = {}
+    for m_old, m_new in zip(old.models, new.models):
+        where = "Model" if m_old.parent is None else f"SubModel '{m_old.name}'"
+        if m_old.kind != m_new.kind or m_old.attr_text != m_new.attr_text:
+            reasons.append(f"attributes of {where} changed")
+        if list(m_old.sections) != list(m_new.sections):
+            reasons.append(f"sections of {where} changed")
+            continue
+        for name, s_old in m_old.sections.items():
+            s_new = m_new.sections[name]
+            if s_old.attr_text != s_new.attr_text or _signature(s_old.items) != _signature(s_new.items):
+                reasons.append(f"{where}: {name} changed")
+                continue
+            if name not in dmodl.DECLARATION_SECTIONS:
+                continue
+            for d_old, d_new in zip(s_old, s_new):
+                if d_old.value == d_new.value:
+                    continue
+                if name != "Params" or m_old.parent is not None:
+                    reasons.append(f"{where}: value of {d_old.name} in {name} changed")
+                elif constant_value(d_new.value) is None:
+                    reasons.append(f"value of parameter {d_old.name} is not a constant")
+                else:
+                    changes[d_new.name] = d_new.value
+    # Parameters computed from changed ones would keep their values in a live model
+    if changes and new.model is not None:
+        for decl in new.model.params.values():
+            if decl.value is not None and decl.name not in changes and constant_value(decl.value) is None:
+                used = set(dmodl.IDENTIFIER.findall(decl.value)) & changes.keys()
+                if used:
+                    reasons.append(f"parameter {decl.name} depends on changed {sorted(used)[0]}")
+    return changes, reasons
+
+
+def params_path(model_path):
+    """Parameter file of a model: <model>_params.json."""
+    return model_stem(model_path) + "_params.json"
+
+
+def update_path(model_path, update):
+    """File the converter writes to: next to an existing model in update mode, else the model itself."""
+    return model_path + ".new" if update and os.path.exists(model_path) else model_path
+
+
+def finish_update(model_path, new_path):
+    """
+    Compare the new conversion (new_path) with the model. With parameter changes only, the model
+    is kept, new_path removed and the values written to params_path(model_path); otherwise new_path
+    replaces the model (and a stale parameter file is removed). Returns a namespace with changes,
+    reasons, params_file (None if the model was replaced) and summary (text for the converter).
+    """
+    try:
+        old = dmodl.load(model_path)
+    except dmodl.DModlError as e:
+        changes, reasons = {}, [f"previous model cannot be parsed: {e}"]
+    else:
+        changes, reasons = diff_parameters(old, dmodl.load(new_path))
+    parameter_file = params_path(model_path)
+    if reasons:
+        os.replace(new_path, model_path)
+        if os.path.exists(parameter_file):
+            os.remove(parameter_file)
+        more = f" and {len(reasons) - 1} more" if len(reasons) > 1 else ""
+        return SimpleNamespace(changes=changes, reasons=reasons, params_file=None,
+                               summary=f"Model structure changed ({reasons[0]}{more}): model rewritten")
+    os.remove(new_path)
+    with open(parameter_file, "w", encoding="utf-8") as f:
+        json.dump({"model": os.path.basename(model_path), "parameters": changes}, f, indent=1, ensure_ascii=False)
+    return SimpleNamespace(changes=changes, reasons=reasons, params_file=parameter_file,
+                           summary=f"Only parameter values changed ({len(changes)}): model kept, values written to {parameter_file}")
+
+
+def load_parameters(path):
+    """Parameter values of a parameter file as dict name -> float or complex."""
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    values = {}
+    for name, text in spec["parameters"].items():
+        value = constant_value(text)
+        if value is None:
+            raise ValueError(f"{path}: value of '{name}' is not a constant")
+        values[name] = value
+    return values
+
+
+def apply_parameters(p_model, values, domain, symbols=None):
+    """Set parameter values (dict name -> value) of an initialized model with one setParameterValues call."""
+    import dTwin
+    from .symbols import SymbolIndex
+    if not values:
+        return True
+    if symbols is None:
+        symbols = SymbolIndex.from_model(p_model)
+    names = list(values)
+    missing = symbols.missing(names)
+    if missing:
+        raise ValueError(f"Parameter '{missing[0]}' is not a parameter of the model")
+    if domain == "cmplx":
+        vector = dTwin.ComplexVector([complex(values[name]) for name in names])
+    else:
+        if any(isinstance(values[name], complex) for name in names):
+            raise ValueError("Complex parameter values for a real domain model")
+        vector = dTwin.DoubleVector([float(values[name]) for name in names])
+    return p_model.setParameterValues(symbols.indices(names), vector)
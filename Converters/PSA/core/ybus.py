@@ -0,0 +1,78 @@
+import numpy as np
+
+# Bus admittance matrix and two-port branch admittances (pi model with off-nominal tap ratio
+# and phase shift), shared by the PF and SE converters.
+
+
+def build_ybus(case):
+    """
+    Dense bus admittance matrix of a MatpowerCase.
+    Returns (Y, G, B, transformer_set): G and B are views of the real and imaginary part of Y
+    (later changes of Y, e.g. loads converted to impedances, show in them as well),
+    transformer_set holds the index pairs (both directions) of branches with a tap ratio or a phase shift.
+    """
+    n = case.n
+    bus_id_map = case.bus_id_map
+
+    # Initialize the admittance matrix Y with zeros, shape (n x n), complex type
+    Y = np.zeros((n, n), dtype=complex)
+
+    # Create a set to track transformer connections
+    transformer_set = set()
+
+    # Loop over each row in the branch data to construct the admittance matrix
+    for row in case.branch:
+        f_bus = int(row[0])  # From bus
+        t_bus = int(row[1])  # To bus
+        r, x, b = row[2], row[3], row[4]  # Line resistance, reactance, and shunt susceptance
+        ratio = row[8] if row[8] != 0 else 1.0  # Tap ratio; default to 1 if zero
+        angle_deg = row[9]  # Phase shift angle in degrees
+        angle_rad = np.deg2rad(angle_deg)
+        a = ratio * np.exp(1j * angle_rad)  # Complex tap ratio for transformer
+
+        # Calculate series admittance and shunt admittance
+        y = 1 / complex(r, x) if r != 0 or x != 0 else 0
+        b_shunt = complex(0, b / 2)
+
+        # Map from bus IDs to matrix indices
+        f_idx = bus_id_map[f_bus]
+        t_idx = bus_id_map[t_bus]
+
+        # Identify transformer branches (with tap or phase shift)
+        if ratio != 0 and ratio != 1.0 or angle_deg != 0.0:
+            transformer_set.add((f_idx, t_idx))
+            transformer_set.add((t_idx, f_idx))
+
+        # Update admittance matrix using transformer model
+        Y[f_idx][f_idx] += (y + b_shunt) / (a * np.conj(a))
+        Y[t_idx][t_idx] += y + b_shunt
+        Y[f_idx][t_idx] -= y / np.conj(a)
+        Y[t_idx][f_idx] -= y / a
+
+    G = Y.real  # Conductance matrix
+    B = Y.imag  # Susceptance matrix
+
+    # Add shunt conductance (gs) and susceptance (bs) from the bus data to diagonal elements of Y
+    for row in case.bus:
+        i_idx = bus_id_map[int(row[0])]
+        gs = row[4] / case.baseMVA
+        bs = row[5] / case.baseMVA
+        Y[i_idx][i_idx] += complex(gs, bs)
+
+    return Y, G, B, transformer_set
+
+
+def branch_admittances(branch):
+    """
+    Two-port admittances of all branches (pi model with tap ratio and phase shift), vectorized:
+        I_f = Yff * V_f + Yft * V_t,  I_t = Ytf * V_f + Ytt * V_t
+    Returns arrays (Yff, Yft, Ytf, Ytt) in branch order.
+    """
+    br = np.asarray(branch, dtype=float)
+    z = br[:, 2] + 1j * br[:, 3]
+    ys = np.zeros(len(br), dtype=complex)
+    np.divide(1, z, out=ys, where=z != 0)
+    ratio = np.where(br[:, 8] != 0, br[:, 8], 1.0)
+    tap = ratio * np.exp(1j * np.deg2rad(br[:, 9]))
+    ytt = ys + 1j * br[:, 4] / 2
+    return ytt / (tap * np.conj(tap)), -ys / np.conj(tap), -ys / tap, ytt
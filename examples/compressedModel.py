@@ -0,0 +1,52 @@
+# Compressed models for the examples.
+# The converters write <model>.dmodl.gz (gzip) or <model>.dmodl.zst (zstd) with --compress.
+# decompressed gives initFromFile a plain copy of such a model in the temp folder; the format is
+# detected by the magic bytes of the file. zstd needs Python 3.14 (compression.zstd) or
+# pip3 install zstandard
+
+import gzip
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+MAGIC = {b"\x1f\x8b": "gzip", b"\x28\xb5\x2f\xfd": "zstd"}
+
+
+def compression_of(path):
+    """Compression of a file by its magic bytes: 'gzip', 'zstd' or None."""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    for prefix, name in MAGIC.items():
+        if magic.startswith(prefix):
+            return name
+    return None
+
+
+def _open_zstd(path):
+    try:
+        from compression import zstd
+        return zstd.ZstdFile(path, "rb")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd models need Python 3.14 or the zstandard package (pip3 install zstandard)") from None
+    return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+
+
+@contextmanager
+def decompressed(path):
+    """Path of a plain model: path itself, or a temporary copy of a compressed model (removed afterwards)."""
+    compression = compression_of(path)
+    if compression is None:
+        yield path
+        return
+    fd, plain = tempfile.mkstemp(suffix=".dmodl")
+    try:
+        with os.fdopen(fd, "wb") as out, (gzip.open(path, "rb") if compression == "gzip" else _open_zstd(path)) as f:
+            shutil.copyfileobj(f, out, 1 << 20)
+        yield plain
+    finally:
+        os.remove(plain)
@@ -11,10 +11,11 @@ from pathlib import Path
 import time
 import dTwin
 from dTwin import modelSolver
+# Compressed models (.dmodl.gz, .dmodl.zst) are passed to initFromFile as a temporary plain copy
+from compressedModel import decompressed
 
 # Import the entire module
 import plotTable
-import matplotlib.pyplot as plt
 
 def get_in_out_file_names(in_file_name: str, out_folder: str) -> tuple[str, str]:
     if not out_folder:
@@ -117,9 +118,10 @@ def testIEE9Dynamics(problem: dTwin.DynamicProblem, in_fn: str, out_folder: str,
         return None
 
     start_time = time.perf_counter()
-    if not p_model.initFromFile(in_file_name):
-        print("ERROR! Cannot init from file!")
-        return None
+    with decompressed(in_file_name) as plain_file_name:
+        if not p_model.initFromFile(plain_file_name):
+            print("ERROR! Cannot init from file!")
+            return None
     
     end_time = time.perf_counter()
 
@@ -297,4 +299,4 @@ if __name__ == "__main__":
         fig2.savefig(img2Name)
     
     # Show all plots together
-    plt.show()
+    plotTable.show()
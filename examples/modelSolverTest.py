@@ -10,10 +10,11 @@ import platform
 from pathlib import Path
 import dTwin
 from dTwin import modelSolver
+# Compressed models (.dmodl.gz, .dmodl.zst) are passed to initFromFile as a temporary plain copy
+from compressedModel import decompressed
 
 # Import the entire module
 import plotTable
-import matplotlib.pyplot as plt
 
 print(dTwin.__doc__)        #Just to test 
 
@@ -118,9 +119,10 @@ def testRealDynamic(problem: dTwin.DynamicProblem, in_fn: str, out_folder: str,
         print("ERROR! Wrong input or output location!")
         return None
 
-    if not p_model.initFromFile(in_file_name):
-        print("ERROR! Cannot init from file!")
-        return None
+    with decompressed(in_file_name) as plain_file_name:
+        if not p_model.initFromFile(plain_file_name):
+            print("ERROR! Cannot init from file!")
+            return None
 
     p_dyn_solver = p_model.getSolverInterface()
     if not p_dyn_solver:
@@ -202,9 +204,10 @@ def testRealStatic(problem: dTwin.StaticProblem, in_fn: str, out_folder: str, pa
         print("ERROR! Wrong input or output location!")
         return None
 
-    if not p_model.initFromFile(in_file_name):
-        print("ERROR! Cannot init from file!")
-        return None
+    with decompressed(in_file_name) as plain_file_name:
+        if not p_model.initFromFile(plain_file_name):
+            print("ERROR! Cannot init from file!")
+            return None
 
     out_indices = p_model.getOutputSymbolIndices()
     if len(out_indices) == 0:
@@ -356,4 +359,4 @@ if __name__ == "__main__":
         print(f"Created image: {img3Name}")
     
     # Show all plots together
-    plt.show()
+    plotTable.show()
@@ -4,56 +4,217 @@ Simple table plotting module that can be imported or used from command line.
 Usage: 
   - From command line: python plot_utils.py file col1 col2 ... --wrt xcol
   - Programmatically: plot(["col1", "col2"], "xcol", file="filename.txt")
+  - Many runs: python plot_utils.py "runs/*.txt" col1 --wrt t [--envelope]
+  - Running simulation: python plot_utils.py file col1 --follow --window 10
+  - Statistics only: python plot_utils.py stats file [cols] --threshold 1.0 -o stats.csv
+  - Column selection: exact names, ranges P_gm_g[1..3], globs "V_*", regex "re:^P_\d+$"
 """
 
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
 import argparse
+import fnmatch
+import glob
 import re
 import sys
 import os
+import time
 from pathlib import Path
 
+# matplotlib is imported on first figure (see _pyplot), so loading data,
+# statistics and the stats subcommand do not pay its import time.
+_plt = None
+
 # Detect if we're in an interactive environment
 if sys.platform.startswith("linux"):
-    if 'DISPLAY' not in os.environ:
-        matplotlib.use("Agg")
-        INTERACTIVE = False
-    else:
-        INTERACTIVE = True
+    INTERACTIVE = 'DISPLAY' in os.environ
 else:
     # Windows + macOS
     INTERACTIVE = True
 
 
+def _pyplot():
+    """Import matplotlib.pyplot on first use (selecting Agg backend when there is no display)."""
+    global _plt
+    if _plt is None:
+        import matplotlib
+        if not INTERACTIVE:
+            matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        _plt = plt
+    return _plt
+
+
+def show():
+    """Show all created figures (no-op if no figure was created, matplotlib is not imported)."""
+    if _plt is not None and INTERACTIVE:
+        _plt.show()
+
+
+def is_interactive():
+    """Check if running inside an interactive Python session (REPL, IPython, Jupyter)."""
+    return hasattr(sys, 'ps1') or 'IPython' in sys.modules
+
+
+def header_index(header):
+    """Map column name -> column index (built once per table)."""
+    if isinstance(header, dict):
+        return header
+    return {name: i for i, name in enumerate(header)}
+
+
+RANGE_PATTERN = re.compile(r"(\w+)\[(\d+)\.\.(\d+)\]$")
+
+
 def expand_columns(spec, header):
-    """Expand column specifications like w[1..8] to individual column names."""
-    cols = []
+    """
+    Expand column specifications to individual column names.
+
+    Supported specifications:
+      - plain name: P_gm
+      - index range: w[1..8], P_gm_g[1..3]
+      - glob pattern: V_*, Pe_g?
+      - regular expression (prefix re:): re:^P_\d+_\d+_est$
+
+    Names are looked up in a header index (dict), and all glob/regex
+    patterns are resolved in a single pass over the header.
+    """
+    if isinstance(spec, str):
+        spec = [spec]
+    index = header_index(header)
+
+    # First pass over specifications: resolve names and ranges, compile patterns
+    resolved = []   # per spec: list of names, or index into patterns
+    patterns = []
     for s in spec:
-        m = re.match(r"(\w+)\[(\d+)\.\.(\d+)\]", s)
+        m = RANGE_PATTERN.match(s)
         if m:
             base, a, b = m.groups()
-            for i in range(int(a), int(b) + 1):
-                name = f"{base}{i}"
-                if name not in header:
+            names = [f"{base}{i}" for i in range(int(a), int(b) + 1)]
+            for name in names:
+                if name not in index:
                     sys.exit(f"Column '{name}' not found")
-                cols.append(name)
+            resolved.append(names)
+        elif s.startswith("re:"):
+            resolved.append(len(patterns))
+            patterns.append(re.compile(s[3:]))
+        elif any(c in s for c in "*?["):
+            resolved.append(len(patterns))
+            patterns.append(re.compile(fnmatch.translate(s)))
         else:
-            if s not in header:
+            if s not in index:
                 sys.exit(f"Column '{s}' not found")
-            cols.append(s)
+            resolved.append([s])
+
+    # Single pass over the header for all patterns
+    matches = [[] for _ in patterns]
+    if patterns:
+        for name in index:
+            for k, pattern in enumerate(patterns):
+                if pattern.match(name):
+                    matches[k].append(name)
+        for k, names in enumerate(matches):
+            if not names:
+                sys.exit(f"No column matches '{patterns[k].pattern}'")
+
+    cols = []
+    seen = set()
+    for item in resolved:
+        for name in (matches[item] if isinstance(item, int) else item):
+            if name not in seen:
+                seen.add(name)
+                cols.append(name)
     return cols
 
 
+# Binary result tables: one UTF-8 header line with space separated column names
+# (same as in text tables) followed by raw little-endian float64 rows.
+BINARY_EXTENSIONS = (".bin", ".dbin")
+BINARY_DTYPE = np.dtype("<f8")
+
+
+def is_binary_table(file):
+    """Check if the table file is stored in the binary format (by extension)."""
+    return str(file).lower().endswith(BINARY_EXTENSIONS)
+
+
+def read_header(file):
+    """
+    Read table header without loading data.
+
+    Returns:
+    --------
+    header : list of str
+        Column names.
+    offset : int
+        Byte offset of the first data row (binary tables) or number of
+        lines to skip before the first data row (text tables).
+    """
+    if is_binary_table(file):
+        with open(file, "rb") as f:
+            header_line = f.readline()
+            return header_line.decode("utf-8").split(), len(header_line)
+
+    skip = 1
+    with open(file) as f:
+        header_line = f.readline()
+        # Handle potential comment lines
+        while header_line.startswith('#'):
+            header_line = f.readline()
+            skip += 1
+    return header_line.split(), skip
+
+
+def open_table(file, columns=None):
+    """
+    Open a result table without keeping more of it in memory than needed.
+
+    Binary tables are memory-mapped (rows are paged in by the OS on access),
+    text tables are streamed and only requested columns are kept.
+
+    Parameters:
+    -----------
+    file : str
+        Text (space separated) or binary (.bin, .dbin) table.
+    columns : list of str, optional
+        Columns to load from text tables. If None, all columns are loaded.
+
+    Returns:
+    --------
+    header : list of str
+        Names of the columns in data.
+    data : numpy.ndarray or numpy.memmap
+        2D array with one row per time step.
+    """
+    header, offset = read_header(file)
+    if is_binary_table(file):
+        n_bytes = os.path.getsize(file) - offset
+        n_rows = n_bytes // (BINARY_DTYPE.itemsize * len(header))
+        if n_rows == 0:
+            return header, np.empty((0, len(header)))
+        data = np.memmap(file, dtype=BINARY_DTYPE, mode="r", offset=offset,
+                         shape=(n_rows, len(header)))
+        return header, data
+
+    if columns is None:
+        return header, np.loadtxt(file, skiprows=offset, ndmin=2)
+    index = header_index(header)
+    for col in columns:
+        if col not in index:
+            sys.exit(f"Column '{col}' not found in {file}")
+    usecols = [index[col] for col in columns]
+    return list(columns), np.loadtxt(file, skiprows=offset, usecols=usecols, ndmin=2)
+
+
 def evaluate_x(expr, data, header):
     """Evaluate the x-axis expression."""
     if expr is None or expr == "row":
         return np.arange(len(data))
 
-    # Replace column names with data[:,index] references
-    for i, name in enumerate(header):
-        expr = re.sub(rf"\b{name}\b", f"data[:,{i}]", expr)
+    # Replace column names with data[:,index] references (single scan of the expression)
+    index = header_index(header)
+    expr = re.sub(r"\b[^\W\d]\w*\b",
+                  lambda m: f"data[:,{index[m.group(0)]}]" if m.group(0) in index else m.group(0),
+                  expr)
 
     return eval(expr)
 
@@ -100,29 +261,19 @@ def plot(columns, wrt=None, file=None, show=None, **plot_kwargs):
         show = (__name__ == "__main__" or is_interactive())
     
     # Load data
-    with open(file) as f:
-        header_line = f.readline()
-        # Handle potential comment lines
-        while header_line.startswith('#'):
-            header_line = f.readline()
-        header = header_line.split()
-    
-    # Count comment lines for proper skipping
-    with open(file) as f:
-        content = f.read()
-    comment_lines = len(re.findall(r'^#.*', content, re.MULTILINE))
-    
-    data = np.loadtxt(file, skiprows=1 + comment_lines)
+    header, data = open_table(file)
     
     # Expand column specifications
-    y_cols = expand_columns(columns, header)
-    x = evaluate_x(wrt, data, header)
+    index = header_index(header)
+    y_cols = expand_columns(columns, index)
+    x = evaluate_x(wrt, data, index)
     
     # Create plot
+    plt = _pyplot()
     fig, ax = plt.subplots(figsize=plot_kwargs.get('figsize', (8, 5)))
     
     for col in y_cols:
-        idx = header.index(col)
+        idx = index[col]
         ax.plot(x, data[:, idx], label=col, 
                 linewidth=plot_kwargs.get('linewidth', 1.5),
                 marker=plot_kwargs.get('marker', None),
@@ -139,6 +290,14 @@ def plot(columns, wrt=None, file=None, show=None, **plot_kwargs):
     
     plt.tight_layout()
     
+    _finish_plot(show, plot_kwargs)
+    
+    return fig, ax
+
+
+def _finish_plot(show, plot_kwargs):
+    """Display and/or save the current figure."""
+    plt = _pyplot()
     # Handle plot display/saving
     if show:
         if INTERACTIVE:
@@ -163,30 +322,611 @@ def plot(columns, wrt=None, file=None, show=None, **plot_kwargs):
         if 'output' in plot_kwargs:
             plt.savefig(plot_kwargs['output'], dpi=150, bbox_inches='tight')
             print(f"Plot saved to {plot_kwargs['output']}")
+
+
+def expand_files(files):
+    """Expand glob patterns (e.g. "res/run_*.txt") into a sorted list of files."""
+    if isinstance(files, (str, Path)):
+        files = [files]
+    result = []
+    for pattern in files:
+        matches = sorted(glob.glob(str(pattern)))
+        if not matches and not glob.has_magic(str(pattern)):
+            matches = [str(pattern)]
+        result.extend(matches)
+    if not result:
+        raise ValueError(f"No result files match {files}")
+    return result
+
+
+def iter_runs(columns, files, wrt="t"):
+    """
+    Yield (file, x_ref, y) for each run with columns aligned on the wrt column of the first run
+    (x_ref: wrt values of the first run, y: one column per requested column).
+
+    Only one run is held in memory at a time. Runs with a different time grid
+    are linearly interpolated onto the reference grid.
+    """
+    x_ref = None
+    for file in files:
+        header, data = open_table(file, [wrt] + list(columns))
+        index = header_index(header)
+        x = np.asarray(data[:, index[wrt]])
+        if x_ref is None:
+            x_ref = x.copy()
+        y = np.empty((len(x_ref), len(columns)))
+        same_grid = len(x) == len(x_ref) and np.array_equal(x, x_ref)
+        for k, col in enumerate(columns):
+            values = data[:, index[col]]
+            y[:, k] = values if same_grid else np.interp(x_ref, x, values)
+        del data
+        yield file, x_ref, y
+
+
+def plot_runs(columns, files, wrt="t", envelope=False, show=None, **plot_kwargs):
+    """
+    Plot the same columns from many result files (e.g. parameter-sweep runs).
+    
+    Parameters:
+    -----------
+    columns : list or str
+        Column names to plot (e.g., ["V_t_g1"] or "w[1..3]")
+    files : list or str
+        Result files (text or binary) or glob patterns (e.g., "res/run_*.txt")
+    wrt : str, optional
+        Column all runs are aligned on (x-axis). Default is "t".
+    envelope : bool, optional
+        If True, plot min/max band and mean over runs instead of every run.
+    show : bool, optional
+        Whether to display the plot immediately. If None, auto-detects.
+    **plot_kwargs : 
+        Same keyword arguments as for plot()
+    
+    Returns:
+    --------
+    fig, ax : matplotlib figure and axes
+    
+    Example:
+    --------
+    plot_runs("P_gm_g1", "sweep/run_*.txt", "t", envelope=True)
+    """
+    if isinstance(columns, str):
+        columns = [columns]
+    files = expand_files(files)
+    if show is None:
+        show = (__name__ == "__main__" or is_interactive())
+
+    header, _ = read_header(files[0])
+    y_cols = expand_columns(columns, header_index(header))
+
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=plot_kwargs.get('figsize', (8, 5)))
+    linewidth = plot_kwargs.get('linewidth', 1.5)
+
+    if envelope:
+        # Running min/max/sum so that only one run is kept in memory
+        y_min = y_max = y_sum = None
+        for _, x, y in iter_runs(y_cols, files, wrt):
+            if y_sum is None:
+                y_min, y_max, y_sum = y.copy(), y.copy(), y.copy()
+            else:
+                np.minimum(y_min, y, out=y_min)
+                np.maximum(y_max, y, out=y_max)
+                y_sum += y
+        y_mean = y_sum / len(files)
+        for k, col in enumerate(y_cols):
+            line, = ax.plot(x, y_mean[:, k], label=f"{col} (mean)", linewidth=linewidth)
+            ax.fill_between(x, y_min[:, k], y_max[:, k], color=line.get_color(),
+                            alpha=0.25, label=f"{col} (min..max)")
+    else:
+        for file, x, y in iter_runs(y_cols, files, wrt):
+            run_name = Path(file).stem
+            for k, col in enumerate(y_cols):
+                label = run_name if len(y_cols) == 1 else f"{run_name}: {col}"
+                ax.plot(x, y[:, k], label=label, linewidth=linewidth,
+                        marker=plot_kwargs.get('marker', None),
+                        markersize=plot_kwargs.get('markersize', 4))
+
+    ax.set_xlabel(wrt)
+    ax.set_ylabel(", ".join(y_cols))
+    if envelope or len(files) <= 20:
+        ax.legend()
+    ax.grid(True, alpha=0.3)
+    ax.set_title(plot_kwargs.get('title') or f"{len(files)} runs")
+
+    plt.tight_layout()
+    _finish_plot(show, plot_kwargs)
+
+    return fig, ax
+
+
+class TableTail:
+    """
+    Incremental reader of a result table that is still being written.
+
+    Each read_new() call returns only rows appended since the previous call
+    (text or binary table). Partially written rows are kept for the next call.
+    """
+
+    def __init__(self, file):
+        self.file = str(file)
+        self.binary = is_binary_table(file)
+        self.header = None
+        self._pos = 0
+        self._pending = b""
+
+    def _read_header(self):
+        if not os.path.exists(self.file):
+            return False
+        with open(self.file, "rb") as f:
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    return False  # header not completely written yet
+                if self.binary or not line.startswith(b"#"):
+                    break
+            self._pos = f.tell()
+        self.header = line.decode("utf-8").split()
+        return True
+
+    def read_new(self):
+        """Return 2D array with rows appended since the last call (may be empty)."""
+        if self.header is None and not self._read_header():
+            return None
+        n_cols = len(self.header)
+        with open(self.file, "rb") as f:
+            f.seek(self._pos)
+            chunk = f.read()
+        self._pos += len(chunk)
+        chunk = self._pending + chunk
+
+        if self.binary:
+            row_size = BINARY_DTYPE.itemsize * n_cols
+            n_complete = len(chunk) // row_size * row_size
+            self._pending = chunk[n_complete:]
+            return np.frombuffer(chunk[:n_complete], dtype=BINARY_DTYPE).reshape(-1, n_cols)
+
+        n_complete = chunk.rfind(b"\n") + 1
+        self._pending = chunk[n_complete:]
+        lines = [line for line in chunk[:n_complete].decode("utf-8").splitlines()
+                 if line.strip() and not line.startswith("#")]
+        if not lines:
+            return np.empty((0, n_cols))
+        return np.array(" ".join(lines).split(), dtype=float).reshape(-1, n_cols)
+
+
+class WindowBuffer:
+    """Ring-like buffer keeping only the rows within the last 'window' units of the x column."""
+
+    def __init__(self, n_cols, window, x_col=0, capacity=1024):
+        self.window = window
+        self.x_col = x_col
+        self._buf = np.empty((capacity, n_cols))
+        self._start = 0
+        self._end = 0
+
+    def append(self, rows):
+        if len(rows) == 0:
+            return
+        if self._end + len(rows) > len(self._buf):
+            # Drop rows that left the window and compact; grow only if still full
+            x_min = rows[-1, self.x_col] - self.window
+            x = self._buf[self._start:self._end, self.x_col]
+            self._start += int(np.searchsorted(x, x_min))
+            n_kept = self._end - self._start
+            capacity = len(self._buf)
+            while n_kept + len(rows) > capacity:
+                capacity *= 2
+            buf = self._buf if capacity == len(self._buf) else np.empty((capacity, self._buf.shape[1]))
+            buf[:n_kept] = self._buf[self._start:self._end]
+            self._buf, self._start, self._end = buf, 0, n_kept
+        self._buf[self._end:self._end + len(rows)] = rows
+        self._end += len(rows)
+
+    def view(self):
+        """Rows within the window (contiguous view, no copy)."""
+        data = self._buf[self._start:self._end]
+        if len(data):
+            x_min = data[-1, self.x_col] - self.window
+            data = data[int(np.searchsorted(data[:, self.x_col], x_min)):]
+        return data
+
+
+def follow(columns, file, wrt="t", window=10.0, fps=10.0, idle_timeout=None, **plot_kwargs):
+    """
+    Live plot of a table that is still being written by a running simulation.
+    
+    Only newly appended rows are read on each poll; the last 'window' seconds
+    are kept in memory and the figure is redrawn at most 'fps' times per second.
+    
+    Parameters:
+    -----------
+    columns : list or str
+        Column names to plot (e.g., ["P_gm_g1", "Pe_g1"])
+    file : str
+        Text or binary table being written.
+    wrt : str, optional
+        Time column (x-axis). Default is "t".
+    window : float, optional
+        Length of the displayed time window in units of wrt.
+    fps : float, optional
+        Maximal number of redraws per second.
+    idle_timeout : float, optional
+        Stop after this many seconds without new rows. If None, runs until
+        the figure window is closed (or Ctrl+C).
     
+    Returns:
+    --------
+    fig, ax : matplotlib figure and axes
+    """
+    if isinstance(columns, str):
+        columns = [columns]
+    period = 1.0 / fps
+    tail = TableTail(file)
+
+    rows = tail.read_new()
+    last_data_time = time.monotonic()
+    while rows is None:
+        if idle_timeout is not None and time.monotonic() - last_data_time > idle_timeout:
+            raise TimeoutError(f"No table header appeared in {file}")
+        time.sleep(period)
+        rows = tail.read_new()
+
+    header = tail.header
+    index = header_index(header)
+    y_cols = expand_columns(columns, index)
+    if wrt not in index:
+        sys.exit(f"Column '{wrt}' not found")
+    x_idx = index[wrt]
+    y_idx = [index[col] for col in y_cols]
+    buffer = WindowBuffer(len(header), window, x_col=x_idx)
+
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=plot_kwargs.get('figsize', (8, 5)))
+    lines = [ax.plot([], [], label=col, linewidth=plot_kwargs.get('linewidth', 1.5))[0]
+             for col in y_cols]
+    ax.set_xlabel(wrt)
+    ax.set_ylabel(", ".join(y_cols))
+    if len(y_cols) > 1:
+        ax.legend(loc="upper left")
+    ax.grid(True, alpha=0.3)
+    ax.set_title(plot_kwargs.get('title') or Path(file).name)
+    if INTERACTIVE:
+        plt.ion()
+        plt.show()
+
+    try:
+        while True:
+            frame_start = time.monotonic()
+            if len(rows):
+                last_data_time = frame_start
+                buffer.append(rows)
+                data = buffer.view()
+                for line, idx in zip(lines, y_idx):
+                    line.set_data(data[:, x_idx], data[:, idx])
+                ax.relim()
+                ax.autoscale_view()
+            elif idle_timeout is not None and frame_start - last_data_time > idle_timeout:
+                break
+            if INTERACTIVE:
+                if not plt.fignum_exists(fig.number):
+                    break
+                plt.pause(max(period - (time.monotonic() - frame_start), 1e-3))
+            else:
+                time.sleep(max(period - (time.monotonic() - frame_start), 0))
+            rows = tail.read_new()
+    except KeyboardInterrupt:
+        pass
+
+    if 'output' in plot_kwargs and plot_kwargs['output']:
+        fig.savefig(plot_kwargs['output'], dpi=150, bbox_inches='tight')
+        print(f"Plot saved to {plot_kwargs['output']}")
     return fig, ax
 
 
+# Summary statistics (no plotting)
+STATS_FIELDS = ("column", "min", "max", "mean", "last", "threshold",
+                "crossings", "first_crossing", "last_crossing", "settling_time")
+
+
+def iter_chunks(file, chunk_rows=65536):
+    """
+    Stream a result table in chunks of at most chunk_rows rows.
+
+    Yields:
+    -------
+    header : list of str
+        Column names (same for all chunks).
+    chunk : numpy.ndarray
+        2D array with up to chunk_rows rows.
+    """
+    header, offset = read_header(file)
+    if is_binary_table(file):
+        _, data = open_table(file)
+        for start in range(0, len(data), chunk_rows):
+            yield header, np.asarray(data[start:start + chunk_rows])
+        return
+
+    with open(file) as f:
+        for _ in range(offset):
+            f.readline()
+        lines = []
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            lines.append(line)
+            if len(lines) == chunk_rows:
+                yield header, np.loadtxt(lines, ndmin=2)
+                lines = []
+        if lines:
+            yield header, np.loadtxt(lines, ndmin=2)
+
+
+def _thresholds_for(columns, threshold):
+    """Threshold per column from a number (all columns) or a dict {column: value}."""
+    if threshold is None:
+        return {}
+    if isinstance(threshold, dict):
+        return {col: float(threshold[col]) for col in columns if col in threshold}
+    return {col: float(threshold) for col in columns}
+
+
+def table_stats(file, columns=None, wrt="t", threshold=None, settle=None, chunk_rows=65536):
+    """
+    Compute per-column statistics of a result table without plotting it.
+
+    The table is streamed in chunks, so memory use does not depend on the
+    number of rows.
+
+    Parameters:
+    -----------
+    file : str
+        Text or binary result table.
+    columns : list of str, optional
+        Column specifications (names, ranges, globs, re: patterns).
+        Default: all columns except the x column.
+    wrt : str
+        Column used as time for crossing and settling times ("row" for row number).
+    threshold : float or dict, optional
+        Threshold for crossing detection, for all columns or per column.
+    settle : float, optional
+        Relative tolerance band around the last value for settling time.
+        Requires a second pass over the table.
+    chunk_rows : int
+        Number of rows processed at once.
+
+    Returns:
+    --------
+    list of dict
+        One dict per column with keys from STATS_FIELDS.
+    """
+    header, _ = read_header(file)
+    index = header_index(header)
+    if wrt not in (None, "row") and wrt not in index:
+        sys.exit(f"Column '{wrt}' not found")
+    if columns:
+        cols = expand_columns(columns, index)
+    else:
+        cols = [name for name in header if name != wrt]
+    col_idx = np.array([index[col] for col in cols], dtype=int)
+    thresholds = _thresholds_for(cols, threshold)
+    thr = np.array([thresholds.get(col, np.nan) for col in cols])
+    has_thr = ~np.isnan(thr)
+
+    n = len(cols)
+    y_min = np.full(n, np.inf)
+    y_max = np.full(n, -np.inf)
+    y_sum = np.zeros(n)
+    n_rows = 0
+    crossings = np.zeros(n, dtype=int)
+    first_cross = np.full(n, np.nan)
+    last_cross = np.full(n, np.nan)
+    prev_x = prev_y = None
+
+    for _, chunk in iter_chunks(file, chunk_rows):
+        if len(chunk) == 0:
+            continue
+        y = chunk[:, col_idx]
+        if wrt in (None, "row"):
+            x = np.arange(n_rows, n_rows + len(chunk), dtype=float)
+        else:
+            x = chunk[:, index[wrt]]
+        y_min = np.minimum(y_min, y.min(axis=0))
+        y_max = np.maximum(y_max, y.max(axis=0))
+        y_sum += y.sum(axis=0)
+        if n_rows == 0:
+            x_first = x[0]
+        n_rows += len(chunk)
+
+        if has_thr.any():
+            # Include the last row of the previous chunk to catch crossings at chunk borders
+            if prev_y is not None:
+                xx = np.concatenate(([prev_x], x))
+                yy = np.vstack((prev_y, y))
+            else:
+                xx, yy = x, y
+            d = yy[:, has_thr] - thr[has_thr]
+            r, c = np.nonzero(np.signbit(d[:-1]) != np.signbit(d[1:]))
+            if len(r):
+                # Linear interpolation of the crossing time
+                d0, d1 = d[r, c], d[r + 1, c]
+                tc = xx[r] + (xx[r + 1] - xx[r]) * d0 / (d0 - d1)
+                cols_thr = np.flatnonzero(has_thr)[c]
+                np.add.at(crossings, cols_thr, 1)
+                # Rows are ordered, so the first occurrence per column is the earliest
+                cols_u, first = np.unique(cols_thr, return_index=True)
+                new = np.isnan(first_cross[cols_u])
+                first_cross[cols_u[new]] = tc[first[new]]
+                last = len(cols_thr) - 1 - np.unique(cols_thr[::-1], return_index=True)[1]
+                last_cross[cols_u] = tc[last]
+        prev_x, prev_y = x[-1], y[-1]
+
+    if n_rows == 0:
+        sys.exit(f"No data rows in {file}")
+
+    settling = np.full(n, np.nan)
+    if settle is not None:
+        # Second pass: last time each column was outside the band around its final value
+        band = settle * np.maximum(np.abs(prev_y), np.finfo(float).tiny)
+        row = 0
+        for _, chunk in iter_chunks(file, chunk_rows):
+            if len(chunk) == 0:
+                continue
+            if wrt in (None, "row"):
+                x = np.arange(row, row + len(chunk), dtype=float)
+            else:
+                x = chunk[:, index[wrt]]
+            row += len(chunk)
+            outside = np.abs(chunk[:, col_idx] - prev_y) > band
+            any_out = outside.any(axis=0)
+            last_out = len(chunk) - 1 - np.argmax(outside[::-1], axis=0)
+            settling[any_out] = x[last_out[any_out]]
+        # Columns never outside the band are settled from the start
+        settling[np.isnan(settling)] = x_first
+
+    stats = []
+    for k, col in enumerate(cols):
+        stats.append({
+            "column": col,
+            "min": float(y_min[k]),
+            "max": float(y_max[k]),
+            "mean": float(y_sum[k] / n_rows),
+            "last": float(prev_y[k]),
+            "threshold": float(thr[k]) if has_thr[k] else None,
+            "crossings": int(crossings[k]) if has_thr[k] else None,
+            "first_crossing": float(first_cross[k]) if has_thr[k] and crossings[k] else None,
+            "last_crossing": float(last_cross[k]) if has_thr[k] and crossings[k] else None,
+            "settling_time": None if np.isnan(settling[k]) else float(settling[k]),
+        })
+    return stats
+
+
+def write_stats(stats, output=None):
+    """Write statistics as CSV or JSON (by extension of output), or print them."""
+    if output is None:
+        widths = [max(len(f), 12) for f in STATS_FIELDS]
+        widths[0] = max([len("column")] + [len(s["column"]) for s in stats])
+        print(" ".join(f.ljust(w) for f, w in zip(STATS_FIELDS, widths)))
+        for s in stats:
+            cells = ["-" if s[f] is None else (f"{s[f]:.6g}" if isinstance(s[f], float) else str(s[f]))
+                     for f in STATS_FIELDS]
+            print(" ".join(c.ljust(w) for c, w in zip(cells, widths)))
+        return
+
+    if Path(output).suffix.lower() == ".json":
+        import json
+        with open(output, "w") as f:
+            json.dump(stats, f, indent=2)
+    else:
+        import csv
+        with open(output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=STATS_FIELDS)
+            writer.writeheader()
+            writer.writerows(stats)
+    print(f"Statistics saved to {output}")
+
+
+def parse_threshold(values):
+    """Parse --threshold arguments: 'value' (all columns) or 'column=value'."""
+    if not values:
+        return None
+    per_column = {}
+    for value in values:
+        if "=" in value:
+            col, v = value.split("=", 1)
+            per_column[col] = float(v)
+        else:
+            if per_column or len(values) > 1:
+                sys.exit("Use either a single threshold or column=value pairs")
+            return float(value)
+    return per_column
+
+
+def stats_main(argv):
+    """Command line interface of the stats subcommand."""
+    parser = argparse.ArgumentParser(prog="plotTable.py stats",
+                                     description="Summary statistics of table columns (no plotting)")
+    parser.add_argument("file", help="Input file (space separated text or binary .bin)")
+    parser.add_argument("columns", nargs="*",
+                        help="Columns (default: all except --wrt column)")
+    parser.add_argument("--wrt", default="t",
+                        help="Time column for crossing/settling times (default t, or row)")
+    parser.add_argument("--threshold", action="append",
+                        help="Crossing threshold: value for all columns, or column=value (repeatable)")
+    parser.add_argument("--settle", type=float, default=None,
+                        help="Settling time: relative band around the last value (e.g. 0.02)")
+    parser.add_argument("--chunk-rows", type=int, default=65536,
+                        help="Rows processed at once (default 65536)")
+    parser.add_argument("--output", "-o", help="Export to .csv or .json (default: print)")
+    args = parser.parse_args(argv)
+
+    stats = table_stats(args.file, args.columns, wrt=args.wrt,
+                        threshold=parse_threshold(args.threshold),
+                        settle=args.settle, chunk_rows=args.chunk_rows)
+    write_stats(stats, args.output)
+
+
 def main():
     """Command line interface."""
+    if len(sys.argv) > 1 and sys.argv[1] == "stats":
+        stats_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="Plot table columns")
-    parser.add_argument("file", help="Input file (space separated)")
+    parser.add_argument("file", help="Input file (space separated text or binary .bin). "
+                        "Glob pattern (e.g. 'res/run_*.txt') plots the same columns from many runs")
     parser.add_argument("columns", nargs="+",
-                        help="Columns to plot (e.g. w1 w2 or w[1..8])")
+                        help="Columns to plot (e.g. w1 w2, w[1..8], 'V_*' or 're:^P_\\d+_est$')")
     parser.add_argument("--wrt", default=None,
                         help="X axis (e.g. Ep, Ep+1, row)")
     parser.add_argument("--output", "-o", help="Save plot to file")
     parser.add_argument("--title", help="Plot title")
     parser.add_argument("--no-show", action="store_true", 
                         help="Don't display plot (just save if --output is given)")
+    parser.add_argument("--envelope", action="store_true",
+                        help="For many runs: plot min/mean/max band instead of every run")
+    parser.add_argument("--follow", "-f", action="store_true",
+                        help="Live plot of a table that is still being written")
+    parser.add_argument("--window", type=float, default=10.0,
+                        help="Follow mode: displayed time window (default 10)")
+    parser.add_argument("--fps", type=float, default=10.0,
+                        help="Follow mode: maximal redraws per second (default 10)")
+    parser.add_argument("--idle-timeout", type=float, default=None,
+                        help="Follow mode: stop after this many seconds without new rows")
     
     args = parser.parse_args()
     
-    # Call the plot function
+    if args.follow:
+        follow(
+            columns=args.columns,
+            file=args.file,
+            wrt=args.wrt or "t",
+            window=args.window,
+            fps=args.fps,
+            idle_timeout=args.idle_timeout,
+            title=args.title,
+            output=args.output
+        )
+        return
+
+    files = expand_files(args.file)
+    if len(files) > 1 or args.envelope:
+        plot_runs(
+            columns=args.columns,
+            files=files,
+            wrt=args.wrt or "t",
+            envelope=args.envelope,
+            show=not args.no_show,
+            title=args.title,
+            output=args.output
+        )
+        return
+
+    # Call the plot function (with the matched file if the argument was a pattern)
     fig, ax = plot(
         columns=args.columns,
         wrt=args.wrt,
-        file=args.file,
+        file=files[0],
         show=not args.no_show,  # Invert for clarity
         title=args.title,
         output=args.output